@@ -1,2 +1,4 @@
 # This file lists files which should be ignored by pytest
-collect_ignore = ["setup.py", "willie.py", "willie/modules/ipython.py"]
+# sopel/irc_asyncio.py needs Python 3.5+, and has no tests of its own.
+collect_ignore = ["setup.py", "willie.py", "willie/modules/ipython.py",
+                  "sopel/irc_asyncio.py"]
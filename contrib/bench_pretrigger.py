@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""bench_pretrigger.py - Measure how fast Sopel parses lines from the server.
+
+Usage: ./bench_pretrigger.py [corpus] [repeat]
+
+The corpus is a file of raw IRC lines, one per line. It may be a ``raw.log``
+written by Sopel with ``log_raw`` enabled, in which case only the lines received
+from the server are used, without their direction markers and timestamps;
+``raw.log.sample`` is a short example of one. Without a corpus, a small built-in
+sample of typical traffic is used.
+
+Two numbers are printed, in lines per second: parsing only, which is what
+happens to most lines, and parsing then reading every attribute, which is
+what happens to lines which match a rule. To compare two versions of Sopel,
+run the script with each of them on the ``PYTHONPATH``."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import io
+import re
+import sys
+import timeit
+
+from sopel.trigger import PreTrigger
+
+SAMPLE = [
+    'PING :irc.example.net',
+    ':irc.example.net 372 Sopel :- Welcome to the example network',
+    ':irc.example.net 353 Sopel = #sopel :Sopel @Foo +Bar Baz',
+    ':Foo!foo@example.com PRIVMSG #sopel :Hello, world',
+    ':Foo!foo@example.com PRIVMSG #sopel :.seen Bar',
+    ':Bar!~bar@user/bar PRIVMSG #sopel :\x01ACTION waves\x01',
+    '@time=2016-01-09T03:15:42.000Z;account=bar :Bar!~bar@user/bar PRIVMSG '
+    '#sopel :Look at https://example.com/page',
+    ':Baz!baz@192.0.2.1 JOIN #sopel baz :Real Name',
+    ':Baz!baz@192.0.2.1 PART #sopel :Bye',
+    ':Qux!qux@example.org QUIT :Ping timeout: 240 seconds',
+    ':ChanServ!ChanServ@services. MODE #sopel +o Foo',
+    ':Foo!foo@example.com NOTICE Sopel :hi there',
+]
+
+# The direction and time.time() written by sopel.tools.rawlog.RawLog.log
+LOG_PREFIX = re.compile(r'^(<<|>>)[0-9.]+\t')
+
+
+def load(filename):
+    lines = []
+    with io.open(filename, encoding='utf-8', errors='replace') as corpus:
+        for line in corpus:
+            line = line.rstrip('\r\n')
+            match = LOG_PREFIX.match(line)
+            if match:
+                if match.group(1) == '>>':
+                    # Sent by the bot, so never parsed
+                    continue
+                line = line[match.end():]
+            if line:
+                lines.append(line)
+    return lines
+
+
+def parse(lines):
+    for line in lines:
+        PreTrigger('Sopel', line)
+
+
+def parse_all(lines):
+    for line in lines:
+        pretrigger = PreTrigger('Sopel', line)
+        (pretrigger.tags, pretrigger.time, pretrigger.nick, pretrigger.user,
+         pretrigger.host, pretrigger.sender)
+
+
+def main():
+    lines = load(sys.argv[1]) if len(sys.argv) > 1 else SAMPLE * 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    for name, func in (('parse', parse), ('parse + attributes', parse_all)):
+        best = min(timeit.repeat(lambda: func(lines), number=1,
+                                 repeat=repeat))
+        print('{:<20} {:>12,.0f} lines/s'.format(name, len(lines) / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# coding=utf-8
+"""bench_target_memory.py - Measure how much memory Sopel uses per user.
+
+Usage: ./bench_target_memory.py [channels] [users]
+
+Fills a bot's user and channel tracking the way joining ``channels`` channels
+of ``users`` users each would, through the same NAMES and WHO handlers, with
+each user in two channels. The memory allocated for it is then printed, in
+bytes per tracked user. Needs Python 3.4 or later, for ``tracemalloc``. To
+compare two versions of Sopel, run the script with each of them on the
+``PYTHONPATH``."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import sys
+import tracemalloc
+
+from sopel import coretasks, tools
+from sopel.bot import Sopel
+
+
+class FakeTrigger(object):
+    """Just enough of a trigger for ``handle_names``."""
+    def __init__(self, channel, names):
+        self.names = names
+        self.raw = ':irc.example.net 353 Sopel = {} :{}'.format(
+            channel, names)
+
+    def split(self):
+        return self.names.split()
+
+
+def make_bot():
+    bot = Sopel.__new__(Sopel)
+    bot.users = tools.SopelMemory()
+    bot.channels = tools.SopelMemory()
+    if not isinstance(getattr(Sopel, 'privileges', None), property):
+        bot.privileges = dict()
+    return bot
+
+
+def populate(bot, channels, users):
+    prefixes = ['', '', '', '+', '@']
+    for number in range(channels):
+        channel = '#channel{}'.format(number)
+        # Half of each channel's users are also in the previous one.
+        first = number * users // 2
+        nicks = ['User{}'.format(user) for user in range(first, first + users)]
+        for start in range(0, len(nicks), 50):
+            batch = nicks[start:start + 50]
+            names = ' '.join(prefixes[index % len(prefixes)] + nick
+                             for index, nick in enumerate(batch))
+            coretasks.handle_names(bot, FakeTrigger(channel, names))
+        for nick in nicks:
+            coretasks._record_who(bot, channel, '~' + nick.lower(),
+                                  'user/' + nick.lower(), nick, nick, False)
+
+
+def main():
+    channels = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    # Built here, so that only what's tracked is measured.
+    bot = make_bot()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    populate(bot, channels, users)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    used = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    print('{:,} users in {:,} channels'.format(len(bot.users), len(bot.channels)))
+    print('{:,} bytes, {:,.0f} bytes per user'.format(
+        used, used / len(bot.users)))
+
+
+if __name__ == '__main__':
+    main()
@@ -11,14 +11,21 @@ import collections
 import os
 import re
 import sys
-import threading
 import time
 
 from sopel import tools
 from sopel import irc
 from sopel.db import SopelDB
 from sopel.tools import stderr, Identifier
+from sopel.tools.blocklist import BlockList
+from sopel.tools.cache import LRUCache
+from sopel.tools.ratelimit import RateLimiter
+from sopel.tools.history import LineHistory
+from sopel.tools.target import PrivilegeMap
 import sopel.tools.jobs
+from sopel.tools.outbound import OutboundQueue
+from sopel.tools.workers import WorkerPool
+from sopel.tools.dispatch import RuleIndex
 from sopel.trigger import Trigger
 from sopel.module import NOLIMIT
 from sopel.logger import get_logger
@@ -48,6 +55,15 @@ class _CapReq(object):
 
 
 class Sopel(irc.Bot):
+    times_size = 10000
+    """How many nicks and channels the deprecated :attr:`times` are kept for.
+    The least recently active are forgotten first."""
+
+    rate_limit_size = 10000
+    """How many rate limit buckets are kept, one for each rate-limited
+    callable used by each nick, in each channel and by the bot as a whole.
+    The least recently used are forgotten first."""
+
     def __init__(self, config, daemon=False):
         irc.Bot.__init__(self, config)
         self._daemon = daemon  # Used for iPython. TODO something saner here
@@ -59,6 +75,8 @@ class Sopel(irc.Bot):
             'medium': collections.defaultdict(list),
             'low': collections.defaultdict(list)
         }
+        self._rule_index = None
+        self._blocks = None
         self.config = config
         """The :class:`sopel.config.Config` for the current Sopel instance."""
         self.doc = {}
@@ -71,11 +89,14 @@ class Sopel(irc.Bot):
         self._command_groups = collections.defaultdict(list)
         """A mapping of module names to a list of commands in it."""
         self.stats = {}  # deprecated, remove in 7.0
-        self._times = {}
-        """
-        A dictionary mapping lower-case'd nicks to dictionaries which map
-        funtion names to the time which they were last used by that nick.
-        """
+        self._times = LRUCache(maxsize=self.times_size)
+        """An LRU cache mapping nicks and channels to dictionaries which map
+        rate-limited callables to the time which they were last used there.
+        Only kept up for the deprecated :attr:`times`."""
+        self.rate_limiter = RateLimiter(maxsize=self.rate_limit_size)
+        """The :class:`sopel.tools.ratelimit.RateLimiter` enforcing the
+        :func:`sopel.module.rate` limits of callables. Its ``stats()`` count
+        the calls it rejected."""
 
         self.server_capabilities = {}
         """A dict mapping supported IRCv3 capabilities to their options.
@@ -90,18 +111,6 @@ class Sopel(irc.Bot):
         self._cap_reqs = dict()
         """A dictionary of capability names to a list of requests"""
 
-        self.privileges = dict()
-        """A dictionary of channels to their users and privilege levels
-
-        The value associated with each channel is a dictionary of
-        :class:`sopel.tools.Identifier`\s to
-        a bitwise integer value, determined by combining the appropriate
-        constants from :mod:`sopel.module`.
-
-        .. deprecated:: 6.2.0
-            Use :attr:`channels` instead.
-        """
-
         self.channels = tools.SopelMemory()  # name to chan obj
         """A map of the channels that Sopel is in.
 
@@ -127,6 +136,38 @@ class Sopel(irc.Bot):
         modules. See :class:`sopel.tools.Sopel.SopelMemory`
         """
 
+        self.history = LineHistory(
+            depth=self.config.core.history_depth,
+            idle_time=self.config.core.history_idle_time,
+            # Substitutions and commands aren't worth looking back at.
+            ignore=re.compile('s/|' + self.config.core.prefix),
+        )
+        """The :class:`sopel.tools.history.LineHistory` of recent lines said
+        in channels and private messages, shared by modules which look back
+        at them."""
+
+        self.workers = WorkerPool(
+            workers=self.config.core.worker_threads,
+            queue_size=self.config.core.worker_queue_size,
+            overflow=self.config.core.worker_overflow,
+        )
+        """The :class:`sopel.tools.workers.WorkerPool` running threaded
+        callables and jobs. Its ``stats()`` give the current queue depth and
+        how long calls wait for a worker."""
+        self.workers.start()
+
+        self.outbound = OutboundQueue(
+            self,
+            burst=self.config.core.flood_burst_lines,
+            rate=self.config.core.flood_refill_rate,
+            server_burst=self.config.core.flood_server_burst_lines,
+            server_rate=self.config.core.flood_server_refill_rate,
+        )
+        """The :class:`sopel.tools.outbound.OutboundQueue` through which
+        :meth:`say` sends messages. Its ``stats()`` give the number of queued
+        messages and how long they waited to be sent."""
+        self.outbound.start()
+
         self.scheduler = sopel.tools.jobs.JobScheduler(self)
         self.scheduler.start()
 
@@ -143,6 +184,21 @@ class Sopel(irc.Bot):
     times = property(lambda self: getattr(self, '_times'))
     command_groups = property(lambda self: getattr(self, '_command_groups'))
 
+    @property
+    def privileges(self):
+        """A dictionary of channels to their users and privilege levels
+
+        The value associated with each channel is a dictionary of
+        :class:`sopel.tools.Identifier`\s to
+        a bitwise integer value, determined by combining the appropriate
+        constants from :mod:`sopel.module`. It is a view of the privileges
+        kept in :attr:`channels`; changes made through it go there.
+
+        .. deprecated:: 6.2.0
+            Use :attr:`channels` instead.
+        """
+        return PrivilegeMap(self.channels, self.users)
+
     def write(self, args, text=None):  # Shim this in here for autodocs
         """Send a command to the server.
 
@@ -159,6 +215,10 @@ class Sopel(irc.Bot):
         Newlines and carriage returns ('\\n' and '\\r') are removed before
         sending. Additionally, if the message (after joining) is longer than
         than 510 characters, any remaining characters will not be sent.
+
+        Lines are written right away, rather than through the throttled queue
+        used by :meth:`say` and :meth:`notice`; they may therefore overtake
+        messages still waiting in it for the same target.
         """
         irc.Bot.write(self, args, text=text)
 
@@ -213,10 +273,9 @@ class Sopel(irc.Bot):
                 callb_list = self._callables[obj.priority][rule]
                 if obj in callb_list:
                     callb_list.remove(obj)
+            self._rebuild_rule_index()
         if hasattr(obj, 'interval'):
-            # TODO this should somehow find the right job to remove, rather than
-            # clearing the entire queue. Issue #831
-            self.scheduler.clear_jobs()
+            self.scheduler.remove_jobs(obj)
         if (getattr(obj, '__name__', None) == 'shutdown'
                 and obj in self.shutdown_methods):
             self.shutdown_methods.remove(obj)
@@ -234,6 +293,7 @@ class Sopel(irc.Bot):
                 self._command_groups[category].append(callbl.commands[0])
             for command, docs in callbl._docs.items():
                 self.doc[command] = docs
+        self._rebuild_rule_index()
         for func in jobs:
             for interval in func.interval:
                 job = sopel.tools.jobs.Job(interval, func)
@@ -244,10 +304,33 @@ class Sopel(irc.Bot):
         for func in urls:
             self.memory['url_callbacks'][func.url_regex] = func
 
+    def _rebuild_rule_index(self):
+        self._rule_index = RuleIndex(self._callables, self.config.core.prefix)
+
+    def _current_rule_index(self):
+        # The index is rebuilt on (un)registration, but modules may also
+        # replace _callables wholesale, as reload does.
+        if (self._rule_index is None or
+                self._rule_index.source is not self._callables):
+            self._rebuild_rule_index()
+        return self._rule_index
+
+    def _handles_event(self, event):
+        return self._current_rule_index().handles(event)
+
     def part(self, channel, msg=None):
         """Part a channel."""
         self.write(['PART', channel], msg)
 
+    def quit(self, message):
+        """Disconnect from IRC and close the bot.
+
+        Messages queued by :meth:`say` are sent first, so they aren't lost,
+        waiting up to ``quit_drain_timeout`` seconds for them."""
+        if self.connected:
+            self.outbound.drain(self.config.core.quit_drain_timeout)
+        irc.Bot.quit(self, message)
+
     def join(self, channel, password=None):
         """Join a channel
 
@@ -306,23 +389,18 @@ class Sopel(irc.Bot):
         try:
             self.sending.acquire()
 
-            # No messages within the last 3 seconds? Go ahead!
-            # Otherwise, wait so it's been at least 0.8 seconds + penalty
-
+            # Throttling is left to the outbound queue, so nothing here
+            # blocks other threads for long.
             recipient_id = Identifier(recipient)
 
-            if recipient_id not in self.stack:
-                self.stack[recipient_id] = []
-            elif self.stack[recipient_id]:
-                elapsed = time.time() - self.stack[recipient_id][-1][0]
-                if elapsed < 3:
-                    penalty = float(max(0, len(text) - 40)) / 70
-                    wait = 0.8 + penalty
-                    if elapsed < wait:
-                        time.sleep(wait - elapsed)
+            stack = self.stack.get(recipient_id)
+            if stack is None:
+                stack = collections.deque(maxlen=10)
+            elif stack:
+                elapsed = time.time() - stack[-1][0]
 
                 # Loop detection
-                messages = [m[1] for m in self.stack[recipient_id][-8:]]
+                messages = [m[1] for m in list(stack)[-8:]]
 
                 # If what we about to send repeated at least 5 times in the
                 # last 2 minutes, replace with '...'
@@ -332,9 +410,10 @@ class Sopel(irc.Bot):
                         # If we said '...' 3 times, discard message
                         return
 
-            self.write(('PRIVMSG', recipient), text)
-            self.stack[recipient_id].append((time.time(), self.safe(text)))
-            self.stack[recipient_id] = self.stack[recipient_id][-10:]
+            self.outbound.put(recipient_id, ('PRIVMSG', recipient), text)
+            stack.append((time.time(), self.safe(text)))
+            # Setting it again pushes back its expiry.
+            self.stack.set(recipient_id, stack)
         finally:
             self.sending.release()
         # Now that we've sent the first part, we need to send the rest. Doing
@@ -348,8 +427,11 @@ class Sopel(irc.Bot):
         Within the context of a triggered callable, ``dest`` will default to
         the channel (or nickname, if a private message), in which the trigger
         happened.
+
+        Like :meth:`say`, the notice is queued behind anything else waiting to
+        be sent to ``dest``, so the two are sent in the order they were made.
         """
-        self.write(('NOTICE', dest), text)
+        self.outbound.put(Identifier(dest), ('NOTICE', dest), text)
 
     def action(self, text, dest):
         """Send ``text`` as a CTCP ACTION PRIVMSG to ``dest``.
@@ -424,104 +506,80 @@ class Sopel(irc.Bot):
             self._bot.reply(message, destination, reply_to, notice)
 
     def call(self, func, sopel, trigger):
-        nick = trigger.nick
-        current_time = time.time()
-        if nick not in self._times:
-            self._times[nick] = dict()
-        if self.nick not in self._times:
-            self._times[self.nick] = dict()
-        if not trigger.is_privmsg and trigger.sender not in self._times:
-            self._times[trigger.sender] = dict()
-
-        if not trigger.admin and not func.unblockable:
-            if func in self._times[nick]:
-                usertimediff = current_time - self._times[nick][func]
-                if func.rate > 0 and usertimediff < func.rate:
-                    #self._times[nick][func] = current_time
-                    LOGGER.info(
-                        "%s prevented from using %s in %s due to user limit: %d < %d",
-                        trigger.nick, func.__name__, trigger.sender, usertimediff,
-                        func.rate
-                    )
-                    return
-            if func in self._times[self.nick]:
-                globaltimediff = current_time - self._times[self.nick][func]
-                if func.global_rate > 0 and globaltimediff < func.global_rate:
-                    #self._times[self.nick][func] = current_time
-                    LOGGER.info(
-                        "%s prevented from using %s in %s due to global limit: %d < %d",
-                        trigger.nick, func.__name__, trigger.sender, globaltimediff,
-                        func.global_rate
-                    )
-                    return
-
-            if not trigger.is_privmsg and func in self._times[trigger.sender]:
-                chantimediff = current_time - self._times[trigger.sender][func]
-                if func.channel_rate > 0 and chantimediff < func.channel_rate:
-                    #self._times[trigger.sender][func] = current_time
-                    LOGGER.info(
-                        "%s prevented from using %s in %s due to channel limit: %d < %d",
-                        trigger.nick, func.__name__, trigger.sender, chantimediff,
-                        func.channel_rate
-                    )
-                    return
+        channel = None if trigger.is_privmsg else trigger.sender
+        reservation = self.rate_limiter.acquire(
+            func, trigger.nick, channel, self.nick,
+            exempt=trigger.admin or func.unblockable)
+        if reservation.limited:
+            # As in "used 3s ago, but the limit is 10s". With a burst, it's
+            # since the oldest use in the burst.
+            LOGGER.info(
+                "%s prevented from using %s in %s due to %s limit: %d < %d",
+                trigger.nick, func.__name__, trigger.sender,
+                reservation.limited, reservation.period - reservation.wait,
+                reservation.period
+            )
+            return
 
+        current_time = time.time()
         try:
             exit_code = func(sopel, trigger)
         except Exception:
             exit_code = None
             self.error(trigger)
 
-        if exit_code != NOLIMIT:
-            self._times[nick][func] = current_time
-            self._times[self.nick][func] = current_time
-            if not trigger.is_privmsg:
-                self._times[trigger.sender][func] = current_time
+        if exit_code == NOLIMIT:
+            self.rate_limiter.release(reservation)
+        elif reservation.tokens:
+            for key in (trigger.nick, self.nick, channel):
+                if key is None:
+                    continue
+                times = self._times.setdefault(key, {})
+                times[func] = current_time
 
     def dispatch(self, pretrigger):
         args = pretrigger.args
         event, args, text = pretrigger.event, args, args[-1] if args else ''
 
-        if self.config.core.nick_blocks or self.config.core.host_blocks:
-            nick_blocked = self._nick_blocked(pretrigger.nick)
-            host_blocked = self._host_blocked(pretrigger.host)
-        else:
-            nick_blocked = host_blocked = None
+        nick_blocks, host_blocks = self._block_lists()
+        # Checking the lists only when they aren't empty saves parsing the
+        # hostmask of lines which don't need it.
+        nick_blocked = bool(nick_blocks) and pretrigger.nick in nick_blocks
+        host_blocked = bool(host_blocks) and pretrigger.host in host_blocks
+
+        # Recorded before any rule runs, so they all see the same history.
+        if event == 'PRIVMSG' and not (nick_blocked or host_blocked):
+            if pretrigger.sender:
+                self.history.add(pretrigger.sender, pretrigger.nick, text)
 
         list_of_blocked_functions = []
-        for priority in ('high', 'medium', 'low'):
-            items = self._callables[priority].items()
+        rule_index = self._current_rule_index()
+        for regexp, funcs in rule_index.candidates(event, text):
+            match = regexp.match(text)
+            if not match:
+                continue
+            user_obj = self.users.get(pretrigger.nick)
+            account = user_obj.account if user_obj else None
+            trigger = Trigger(self.config, pretrigger, match, account)
+            wrapper = self.SopelWrapper(self, trigger)
+
+            for func in funcs:
+                if (not trigger.admin and
+                        not func.unblockable and
+                        (nick_blocked or host_blocked)):
+                    function_name = "%s.%s" % (
+                        func.__module__, func.__name__
+                    )
+                    list_of_blocked_functions.append(function_name)
+                    continue
 
-            for regexp, funcs in items:
-                match = regexp.match(text)
-                if not match:
+                if (hasattr(func, 'intents') and
+                        trigger.tags.get('intent') not in func.intents):
                     continue
-                user_obj = self.users.get(pretrigger.nick)
-                account = user_obj.account if user_obj else None
-                trigger = Trigger(self.config, pretrigger, match, account)
-                wrapper = self.SopelWrapper(self, trigger)
-
-                for func in funcs:
-                    if (not trigger.admin and
-                            not func.unblockable and
-                            (nick_blocked or host_blocked)):
-                        function_name = "%s.%s" % (
-                            func.__module__, func.__name__
-                        )
-                        list_of_blocked_functions.append(function_name)
-                        continue
-
-                    if event not in func.event:
-                        continue
-                    if (hasattr(func, 'intents') and
-                            trigger.tags.get('intent') not in func.intents):
-                        continue
-                    if func.thread:
-                        targs = (func, wrapper, trigger)
-                        t = threading.Thread(target=self.call, args=targs)
-                        t.start()
-                    else:
-                        self.call(func, wrapper, trigger)
+                if func.thread:
+                    self.workers.submit(self.call, func, wrapper, trigger)
+                else:
+                    self.call(func, wrapper, trigger)
 
         if list_of_blocked_functions:
             if nick_blocked and host_blocked:
@@ -537,27 +595,30 @@ class Sopel(irc.Bot):
                 ', '.join(list_of_blocked_functions)
             )
 
+    def _block_lists(self):
+        """Return the compiled nick and host block lists.
+
+        They are rebuilt whenever the ``nick_blocks`` or ``host_blocks``
+        settings change, e.g. through the ``.blocks`` command."""
+        parser = self.config.parser
+        key = tuple(parser.get('core', name)
+                    if parser.has_option('core', name) else None
+                    for name in ('nick_blocks', 'host_blocks'))
+        blocks = self._blocks
+        if blocks is None or blocks[0] != key:
+            blocks = (key,
+                      BlockList(self.config.core.nick_blocks, identifiers=True),
+                      BlockList(self.config.core.host_blocks))
+            # A single assignment, so other threads see either the old lists
+            # or the new ones.
+            self._blocks = blocks
+        return blocks[1:]
+
     def _host_blocked(self, host):
-        bad_masks = self.config.core.host_blocks
-        for bad_mask in bad_masks:
-            bad_mask = bad_mask.strip()
-            if not bad_mask:
-                continue
-            if (re.match(bad_mask + '$', host, re.IGNORECASE) or
-                    bad_mask == host):
-                return True
-        return False
+        return host in self._block_lists()[1]
 
     def _nick_blocked(self, nick):
-        bad_nicks = self.config.core.nick_blocks
-        for bad_nick in bad_nicks:
-            bad_nick = bad_nick.strip()
-            if not bad_nick:
-                continue
-            if (re.match(bad_nick + '$', nick, re.IGNORECASE) or
-                    Identifier(bad_nick) == nick):
-                return True
-        return False
+        return nick in self._block_lists()[0]
 
     def _shutdown(self):
         stderr(
@@ -579,6 +640,11 @@ class Sopel(irc.Bot):
                     )
                 )
 
+        try:
+            self.db.flush()
+        except Exception as e:
+            stderr("Error writing buffered database values: %s" % e)
+
     def cap_req(self, module_name, capability, arg=None, failure_callback=None,
                 success_callback=None):
         """Tell Sopel to request a capability when it starts.
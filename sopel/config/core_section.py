@@ -3,12 +3,17 @@
 from __future__ import unicode_literals, absolute_import, print_function, division
 
 import os.path
+import sys
 
 from sopel.config.types import (
     StaticSection, ValidatedAttribute, ListAttribute, ChoiceAttribute,
     FilenameAttribute, NO_DEFAULT
 )
 from sopel.tools import Identifier
+from sopel.tools.workers import OVERFLOW_POLICIES
+
+# The asyncio backend uses async/await syntax.
+_HAS_ASYNCIO = sys.version_info >= (3, 5)
 
 
 def _find_certs():
@@ -20,6 +25,15 @@ def _find_certs():
     return certs
 
 
+class _ConnectionBackendAttribute(ChoiceAttribute):
+    def parse(self, value):
+        value = super(_ConnectionBackendAttribute, self).parse(value)
+        if value == 'asyncio' and not _HAS_ASYNCIO:
+            raise ValueError('The asyncio backend requires Python 3.5 or '
+                             'later; use asyncore instead')
+        return value
+
+
 def configure(config):
     config.core.configure_setting('nick', 'Enter the nickname for your bot.')
     config.core.configure_setting('host', 'Enter the server to connect to.')
@@ -78,9 +92,55 @@ class CoreSection(StaticSection):
     channels = ListAttribute('channels')
     """List of channels for the bot to join when it connects"""
 
+    connection_backend = _ConnectionBackendAttribute(
+        'connection_backend', ['asyncore', 'asyncio'], 'asyncore')
+    """The implementation used for the connection to the server.
+
+    ``asyncio`` requires Python 3.5 or later. It uses fewer threads than the
+    default ``asyncore``, which is deprecated in recent versions of Python."""
+
+    db_cache_size = ValidatedAttribute('db_cache_size', int, default=-8000)
+    """SQLite's page cache size for each database connection.
+
+    A positive value is a number of pages, and a negative one a number of
+    KiB, as for SQLite's ``cache_size`` pragma."""
+
     db_filename = ValidatedAttribute('db_filename')
     """The filename for Sopel's database."""
 
+    db_flush_interval = ValidatedAttribute('db_flush_interval', float,
+                                           default=5.0)
+    """How often, in seconds, buffered database writes are flushed.
+
+    Only applies to the values which modules choose to buffer."""
+
+    db_flush_size = ValidatedAttribute('db_flush_size', int, default=1000)
+    """How many buffered database writes may be pending before they are
+    flushed early."""
+
+    db_journal_mode = ChoiceAttribute('db_journal_mode',
+                                      ['DELETE', 'TRUNCATE', 'PERSIST',
+                                       'MEMORY', 'WAL'],
+                                      'WAL')
+    """The journal mode of Sopel's database.
+
+    ``WAL`` lets the database be read while it is being written to. It does
+    not work with databases on network filesystems."""
+
+    db_lru_size = ValidatedAttribute('db_lru_size', int, default=10000)
+    """How many nick IDs, and how many nick and channel values, are cached in
+    memory.
+
+    Set to 0 to always read them from the database."""
+
+    db_synchronous = ChoiceAttribute('db_synchronous',
+                                     ['OFF', 'NORMAL', 'FULL', 'EXTRA'],
+                                     'NORMAL')
+    """How carefully SQLite waits for data to reach the disk.
+
+    ``NORMAL`` is safe with the ``WAL`` journal mode, and ``FULL`` is SQLite's
+    own default."""
+
     default_time_format = ValidatedAttribute('default_time_format',
                                              default='%Y-%m-%d - %T%Z')
     """The default format to use for time in messages."""
@@ -91,15 +151,52 @@ class CoreSection(StaticSection):
     enable = ListAttribute('enable')
     """A whitelist of the only modules you want to enable."""
 
+    encodings = ListAttribute('encodings',
+                              default=['utf-8', 'cp1252', 'iso8859-1'])
+    """The encodings to decode lines from the server with.
+
+    They are tried in order for each line, and lines which can't be decoded
+    with any of them are ignored."""
+
     exclude = ListAttribute('exclude')
     """A list of modules which should not be loaded."""
 
     extra = ListAttribute('extra')
     """A list of other directories you'd like to include modules from."""
 
+    flood_burst_lines = ValidatedAttribute('flood_burst_lines', int, default=4)
+    """How many messages can be sent to a channel or nick in a quick burst."""
+
+    flood_refill_rate = ValidatedAttribute('flood_refill_rate', float,
+                                           default=1.25)
+    """How many messages per second can be sent to a channel or nick once
+    the burst is used up. 0 turns this limit off.
+
+    Messages longer than 40 bytes count for a bit more than one message."""
+
+    flood_server_burst_lines = ValidatedAttribute('flood_server_burst_lines',
+                                                  int, default=20)
+    """How many messages can be sent to the server, across all targets, in a
+    quick burst."""
+
+    flood_server_refill_rate = ValidatedAttribute('flood_server_refill_rate',
+                                                  float, default=5.0)
+    """How many messages per second can be sent to the server, across all
+    targets, once the burst is used up. 0 turns this limit off."""
+
     help_prefix = ValidatedAttribute('help_prefix', default='.')
     """The prefix to use in help"""
 
+    history_depth = ValidatedAttribute('history_depth', int, default=10)
+    """How many lines said by each nick in each channel, or in private
+    messages, are kept in ``bot.history``, for modules such as find and
+    quote. Commands and ``s/`` substitutions aren't kept. 0 disables it."""
+
+    history_idle_time = ValidatedAttribute('history_idle_time', int,
+                                           default=86400)
+    """Seconds after which the lines of a nick who hasn't said anything since
+    are dropped from ``bot.history``. 0 keeps them."""
+
     @property
     def homedir(self):
         """The directory in which various files are stored at runtime.
@@ -120,6 +217,25 @@ class CoreSection(StaticSection):
     log_raw = ValidatedAttribute('log_raw', bool, default=True)
     """Whether a log of raw lines as sent and recieved should be kept."""
 
+    log_raw_backups = ValidatedAttribute('log_raw_backups', int, default=5)
+    """How many rotated raw logs to keep."""
+
+    log_raw_compress = ValidatedAttribute('log_raw_compress', bool,
+                                          default=False)
+    """Whether rotated raw logs should be compressed with gzip."""
+
+    log_raw_interval = ValidatedAttribute('log_raw_interval', float, default=0)
+    """How often, in seconds, the raw log is rotated. 0 means never."""
+
+    log_raw_max_bytes = ValidatedAttribute('log_raw_max_bytes', int, default=0)
+    """The size, in bytes, at which the raw log is rotated. 0 means never."""
+
+    log_raw_queue_size = ValidatedAttribute('log_raw_queue_size', int,
+                                            default=10000)
+    """How many lines may be waiting to be written to the raw log.
+
+    Lines are dropped, rather than slowing the bot down, past this."""
+
     logdir = FilenameAttribute('logdir', directory=True, default='logs')
     """Directory in which to place logs."""
 
@@ -178,6 +294,11 @@ class CoreSection(StaticSection):
     It is a regular expression (so the default, ``\.``, means commands start
     with a period), though using capturing groups will create problems."""
 
+    quit_drain_timeout = ValidatedAttribute('quit_drain_timeout', float,
+                                            default=10.0)
+    """How long, in seconds, to wait for queued messages to be sent before
+    quitting."""
+
     reply_errors = ValidatedAttribute('reply_errors', bool, default=True)
     """Whether to message the sender of a message that triggered an error with the exception."""
 
@@ -198,3 +319,19 @@ class CoreSection(StaticSection):
 
     verify_ssl = ValidatedAttribute('verify_ssl', bool, default=True)
     """Whether to require a trusted SSL certificate for SSL connections."""
+
+    worker_overflow = ChoiceAttribute('worker_overflow', OVERFLOW_POLICIES,
+                                      'inline')
+    """What to do with a threaded call when the worker queue is full.
+
+    Can be ``drop`` (discard the call), ``block`` (wait for room in the queue)
+    or ``inline`` (run the call right away, outside of the worker pool)."""
+
+    worker_queue_size = ValidatedAttribute('worker_queue_size', int,
+                                           default=100)
+    """How many threaded calls may wait for a free worker thread.
+
+    0 means no limit."""
+
+    worker_threads = ValidatedAttribute('worker_threads', int, default=10)
+    """The number of threads used to run threaded callables and jobs."""
@@ -96,8 +96,9 @@ def startup(bot, trigger):
                 time.sleep(1)
             bot.join(channel)
     else:
-        for channel in bot.config.core.channels:
-            bot.join(channel)
+        with bot.batched_writes():
+            for channel in bot.config.core.channels:
+                bot.join(channel)
 
     if (not bot.config.core.owner_account and
             'account-tag' in bot.enabled_capabilities and
@@ -170,8 +171,9 @@ def handle_names(bot, trigger):
     if not channels:
         return
     channel = Identifier(channels.group(1))
-    if channel not in bot.privileges:
-        bot.privileges[channel] = dict()
+    if channel not in bot.channels:
+        bot.channels[channel] = Channel(channel)
+    privileges = bot.channels[channel].privileges
 
     # This could probably be made flexible in the future, but I don't think
     # it'd be worth it.
@@ -187,7 +189,7 @@ def handle_names(bot, trigger):
             if prefix in name:
                 priv = priv | value
         nick = Identifier(name.lstrip(''.join(mapping.keys())))
-        bot.privileges[channel][nick] = priv
+        privileges[nick] = priv
 
 
 @sopel.module.rule('(.*)')
@@ -229,14 +231,15 @@ def track_modes(bot, trigger):
         else:
             arg = Identifier(arg)
             for mode in modes:
-                priv = bot.privileges[channel].get(arg, 0)
+                privileges = bot.channels[channel].privileges
+                priv = privileges.get(arg, 0)
                 value = mapping.get(mode[1])
                 if value is not None:
                     if mode[0] == '+':
                         priv = priv | value
                     else:
                         priv = priv & ~value
-                    bot.privileges[channel][arg] = priv
+                    privileges[arg] = priv
 
 
 @sopel.module.rule('.*')
@@ -266,12 +269,6 @@ def track_nicks(bot, trigger):
         bot.msg(bot.config.core.owner, privmsg)
         return
 
-    for channel in bot.privileges:
-        channel = Identifier(channel)
-        if old in bot.privileges[channel]:
-            value = bot.privileges[channel].pop(old)
-            bot.privileges[channel][new] = value
-
     for channel in bot.channels.values():
         channel.rename_user(old, new)
     if old in bot.users:
@@ -302,7 +299,6 @@ def track_kick(bot, trigger):
 
 def _remove_from_channel(bot, nick, channel):
     if nick == bot.nick:
-        bot.privileges.pop(channel, None)
         bot.channels.pop(channel, None)
 
         lost_users = []
@@ -313,13 +309,11 @@ def _remove_from_channel(bot, nick, channel):
         for nick_ in lost_users:
             bot.users.pop(nick_, None)
     else:
-        bot.privileges[channel].pop(nick, None)
-
         user = bot.users.get(nick)
-        if user and channel in user.channels:
+        if channel in bot.channels:
             bot.channels[channel].clear_user(nick)
-            if not user.channels:
-                bot.users.pop(nick, None)
+        if user and not user.channels:
+            bot.users.pop(nick, None)
 
 
 def _whox_enabled(bot):
@@ -356,17 +350,14 @@ def track_join(bot, trigger):
     if trigger.nick == bot.nick and trigger.sender not in bot.channels:
         bot.write(('TOPIC', trigger.sender))
 
-        bot.privileges[trigger.sender] = dict()
         bot.channels[trigger.sender] = Channel(trigger.sender)
         _send_who(bot, trigger.sender)
 
-    bot.privileges[trigger.sender][trigger.nick] = 0
-
     user = bot.users.get(trigger.nick)
     if user is None:
         user = User(trigger.nick, trigger.user, trigger.host)
-        bot.users[trigger.nick] = user
-    bot.channels[trigger.sender].add_user(user)
+        bot.users[user.nick] = user
+    bot.channels[trigger.sender].add_user(user, privileges=0)
 
     if len(trigger.args) > 1 and trigger.args[1] != '*' and (
             'account-notify' in bot.enabled_capabilities and
@@ -380,8 +371,6 @@ def track_join(bot, trigger):
 @sopel.module.thread(False)
 @sopel.module.unblockable
 def track_quit(bot, trigger):
-    for chanprivs in bot.privileges.values():
-        chanprivs.pop(trigger.nick, None)
     for channel in bot.channels.values():
         channel.clear_user(trigger.nick)
     bot.users.pop(trigger.nick, None)
@@ -636,7 +625,8 @@ def blocks(bot, trigger):
 @sopel.module.rule('.*')
 def account_notify(bot, trigger):
     if trigger.nick not in bot.users:
-        bot.users[trigger.nick] = User(trigger.nick, trigger.user, trigger.host)
+        user = User(trigger.nick, trigger.user, trigger.host)
+        bot.users[user.nick] = user
     account = trigger.args[0]
     if account == '*':
         account = None
@@ -662,7 +652,8 @@ def _record_who(bot, channel, user, host, nick, account=None, away=None):
     nick = Identifier(nick)
     channel = Identifier(channel)
     if nick not in bot.users:
-        bot.users[nick] = User(nick, user, host)
+        user = User(nick, user, host)
+        bot.users[user.nick] = user
     user = bot.users[nick]
     if account == '0':
         user.account = None
@@ -699,7 +690,8 @@ def end_who(bot, trigger):
 @sopel.module.unblockable
 def track_notify(bot, trigger):
     if trigger.nick not in bot.users:
-        bot.users[trigger.nick] = User(trigger.nick, trigger.user, trigger.host)
+        user = User(trigger.nick, trigger.user, trigger.host)
+        bot.users[user.nick] = user
     user = bot.users[trigger.nick]
     user.away = bool(trigger.args)
 
@@ -5,8 +5,13 @@ import json
 import os.path
 import sys
 import sqlite3
+import threading
 
+from sopel.logger import get_logger
 from sopel.tools import Identifier
+from sopel.tools.cache import LRUCache
+
+LOGGER = get_logger(__name__)
 
 if sys.version_info.major >= 3:
     unicode = str
@@ -28,6 +33,9 @@ def _deserialize(value):
     return value
 
 
+_MISSING = object()
+
+
 class SopelDB(object):
     """*Availability: 5.0+*
 
@@ -36,7 +44,20 @@ class SopelDB(object):
     to the database, wherever the user has configured it to be.
 
     When configured with a relative filename, it is assumed to be in the same
-    directory as the config."""
+    directory as the config.
+
+    Each thread keeps one connection open for the queries made through this
+    class, so SQLite's prepared statement cache is reused across calls. The
+    ``db_journal_mode``, ``db_synchronous`` and ``db_cache_size`` core settings
+    are applied to every connection.
+
+    Writes to frequently updated nick values can be buffered in memory, and
+    flushed to the database in batches; see :meth:`enable_write_behind`.
+
+    Nick IDs and nick and channel values are cached in memory, up to
+    ``db_lru_size`` of each, and the cache is kept up to date by the methods
+    of this class which change them. Changes made with raw queries are not
+    seen by the cache; call :meth:`clear_cache` after making any."""
 
     def __init__(self, config):
         path = config.core.db_filename
@@ -48,21 +69,118 @@ class SopelDB(object):
         if not os.path.isabs(path):
             path = os.path.normpath(os.path.join(config_dir, path))
         self.filename = path
+        self._synchronous = config.core.db_synchronous
+        self._cache_size = config.core.db_cache_size
+        self._local = threading.local()
+
+        self._flush_interval = config.core.db_flush_interval
+        self._flush_size = config.core.db_flush_size
+        self._write_behind = set()
+        # nick_id -> {key: serialized value}. Values being written out by
+        # flush() move to _flushing until they are committed, so reads can
+        # still find them in the meantime.
+        self._pending = {}
+        self._pending_count = 0
+        self._flushing = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._flusher = None
+
+        # slug -> nick_id (None if the nick has none), and ('nick', nick_id,
+        # key) or ('channel', channel, key) -> serialized value. Every
+        # invalidation bumps _generation, so a read which raced with a write
+        # doesn't put the old value back into the cache.
+        self._nick_ids = LRUCache(config.core.db_lru_size)
+        self._values = LRUCache(config.core.db_lru_size)
+        self._generation = 0
+        self._cache_lock = threading.Lock()
+
+        journal_mode = config.core.db_journal_mode
+        if journal_mode:
+            # The journal mode sticks to the database file, so this only needs
+            # doing once.
+            self._connection().execute(
+                'PRAGMA journal_mode = {}'.format(journal_mode))
         self._create()
 
     def connect(self):
-        """Return a raw database connection object."""
-        return sqlite3.connect(self.filename, timeout=10)
+        """Return a raw database connection object.
+
+        The connection is a new one, which the caller may close."""
+        conn = sqlite3.connect(self.filename, timeout=10,
+                               cached_statements=256)
+        conn.execute('PRAGMA synchronous = {}'.format(self._synchronous))
+        conn.execute('PRAGMA cache_size = {}'.format(int(self._cache_size)))
+        return conn
+
+    def _connection(self):
+        """Return the calling thread's persistent connection."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        return conn
+
+    def close(self):
+        """Close the calling thread's persistent connection, if it has one.
+
+        A new one will be opened if the thread uses the database again."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
 
     def execute(self, *args, **kwargs):
         """Execute an arbitrary SQL query against the database.
 
         Returns a cursor object, on which things like `.fetchall()` can be
         called per PEP 249."""
-        with self.connect() as conn:
+        with self._connection() as conn:
             cur = conn.cursor()
             return cur.execute(*args, **kwargs)
 
+    def executemany(self, sql, seq_of_parameters):
+        """Execute an SQL query once for each of the given parameters.
+
+        All the queries run in a single transaction."""
+        with self._connection() as conn:
+            cur = conn.cursor()
+            return cur.executemany(sql, seq_of_parameters)
+
+    # CACHE
+
+    def _fill(self, cache, key, value, generation):
+        """Cache a value read from the database, unless it is outdated.
+
+        ``generation`` must be taken before running the query."""
+        with self._cache_lock:
+            if generation == self._generation:
+                cache.set(key, value)
+
+    def _invalidate(self, cache, *keys):
+        """Drop ``keys`` from ``cache``, after changing them in the database."""
+        with self._cache_lock:
+            self._generation += 1
+            for key in keys:
+                cache.pop(key)
+
+    def clear_cache(self):
+        """Forget all cached nick IDs and values."""
+        with self._cache_lock:
+            self._generation += 1
+            self._nick_ids.clear()
+            self._values.clear()
+
+    def cache_stats(self):
+        """Return the size and hit and miss counters of the caches.
+
+        The result is a dict with a ``nick_ids`` and a ``values`` dict, as
+        returned by :meth:`sopel.tools.cache.LRUCache.stats`."""
+        return {
+            'nick_ids': self._nick_ids.stats(),
+            'values': self._values.stats(),
+        }
+
     def _create(self):
         """Create the basic database structure."""
         # Do nothing if the db already exists.
@@ -110,12 +228,19 @@ class SopelDB(object):
         user's aliases. If create is True, a new ID will be created if one does
         not already exist"""
         slug = nick.lower()
-        nick_id = self.execute('SELECT nick_id from nicknames where slug = ?',
-                               [slug]).fetchone()
+        nick_id = self._nick_ids.get(slug, _MISSING)
+        if nick_id is _MISSING:
+            generation = self._generation
+            nick_id = self.execute(
+                'SELECT nick_id from nicknames where slug = ?',
+                [slug]).fetchone()
+            if nick_id is not None:
+                nick_id = nick_id[0]
+            self._fill(self._nick_ids, slug, nick_id, generation)
         if nick_id is None:
             if not create:
                 raise ValueError('No ID exists for the given nick')
-            with self.connect() as conn:
+            with self._connection() as conn:
                 cur = conn.cursor()
                 cur.execute('INSERT INTO nick_ids VALUES (NULL)')
                 nick_id = cur.execute('SELECT last_insert_rowid()').fetchone()[0]
@@ -125,8 +250,16 @@ class SopelDB(object):
                     [nick_id, slug, nick]
                 )
             nick_id = self.execute('SELECT nick_id from nicknames where slug = ?',
-                                   [slug]).fetchone()
-        return nick_id[0]
+                                   [slug]).fetchone()[0]
+            self._invalidate(self._nick_ids, slug)
+        return nick_id
+
+    def _find_nick_id(self, nick):
+        """Return the ID of ``nick``, or None if it doesn't have one."""
+        try:
+            return self.get_nick_id(nick, create=False)
+        except ValueError:
+            return None
 
     def alias_nick(self, nick, alias):
         """Create an alias for a nick.
@@ -142,28 +275,200 @@ class SopelDB(object):
             self.execute(sql, values)
         except sqlite3.IntegrityError:
             raise ValueError('Alias already exists.')
+        self._invalidate(self._nick_ids, alias.lower())
 
     def set_nick_value(self, nick, key, value):
         """Sets the value for a given key to be associated with the nick."""
         nick = Identifier(nick)
         value = json.dumps(value, ensure_ascii=False)
         nick_id = self.get_nick_id(nick)
+        if key in self._write_behind:
+            self._buffer(nick_id, {key: value})
+            return
         self.execute('INSERT OR REPLACE INTO nick_values VALUES (?, ?, ?)',
                      [nick_id, key, value])
+        self._invalidate(self._values, ('nick', nick_id, key))
 
     def get_nick_value(self, nick, key):
         """Retrieves the value for a given key associated with a nick."""
-        nick = Identifier(nick)
-        result = self.execute(
-            'SELECT value FROM nicknames JOIN nick_values '
-            'ON nicknames.nick_id = nick_values.nick_id '
-            'WHERE slug = ? AND key = ?',
-            [nick.lower(), key]
-        ).fetchone()
-        if result is not None:
-            result = result[0]
+        nick_id = self._find_nick_id(Identifier(nick))
+        if nick_id is None:
+            return None
+        buffered = self._get_buffered(nick_id, [key])
+        if key in buffered:
+            return _deserialize(buffered[key])
+        cache_key = ('nick', nick_id, key)
+        result = self._values.get(cache_key, _MISSING)
+        if result is _MISSING:
+            generation = self._generation
+            result = self.execute(
+                'SELECT value FROM nick_values WHERE nick_id = ? AND key = ?',
+                [nick_id, key]
+            ).fetchone()
+            if result is not None:
+                result = result[0]
+            if key not in self._write_behind:
+                self._fill(self._values, cache_key, result, generation)
         return _deserialize(result)
 
+    def set_nick_values(self, nick, values):
+        """Sets the values for several keys associated with the nick.
+
+        ``values`` is a dict of keys to values. The nick is only looked up
+        once, and all values are written in a single transaction."""
+        nick = Identifier(nick)
+        nick_id = self.get_nick_id(nick)
+        rows = []
+        buffered = {}
+        for key, value in values.items():
+            value = json.dumps(value, ensure_ascii=False)
+            if key in self._write_behind:
+                buffered[key] = value
+            else:
+                rows.append((nick_id, key, value))
+        if buffered:
+            self._buffer(nick_id, buffered)
+        if rows:
+            with self._connection() as conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO nick_values VALUES (?, ?, ?)',
+                    rows)
+            self._invalidate(self._values,
+                             *[('nick', nick_id, row[1]) for row in rows])
+
+    def get_nick_values(self, nick, keys):
+        """Retrieves the values for several keys associated with a nick.
+
+        Returns a dict of each of the given keys to its value, which is None
+        for keys which are not set."""
+        keys = list(keys)
+        result = dict.fromkeys(keys)
+        if not keys:
+            return result
+        nick_id = self._find_nick_id(Identifier(nick))
+        if nick_id is None:
+            return result
+        buffered = self._get_buffered(nick_id, keys)
+        missing = []
+        for key in keys:
+            if key in buffered:
+                result[key] = _deserialize(buffered[key])
+                continue
+            value = self._values.get(('nick', nick_id, key), _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                result[key] = _deserialize(value)
+        if not missing:
+            return result
+
+        generation = self._generation
+        rows = dict(self.execute(
+            'SELECT key, value FROM nick_values '
+            'WHERE nick_id = ? AND key IN ({})'.format(
+                ','.join('?' * len(missing))),
+            [nick_id] + missing
+        ).fetchall())
+        for key in missing:
+            value = rows.get(key)
+            result[key] = _deserialize(value)
+            if key not in self._write_behind:
+                self._fill(self._values, ('nick', nick_id, key), value,
+                           generation)
+        return result
+
+    # WRITE-BEHIND BUFFER
+
+    def enable_write_behind(self, *keys):
+        """Buffer writes of the given nick value keys in memory.
+
+        Values set for these keys are written to the database in batches: every
+        ``db_flush_interval`` seconds, once ``db_flush_size`` values are
+        pending, and when the bot shuts down. Repeated writes to the same key
+        for the same nick in between only cost one row. Reads through this
+        class see buffered values right away, but queries made directly on the
+        database will not see them until they are flushed.
+
+        This is meant for values which change very often, and which it is
+        acceptable to lose a few seconds of in case of a crash."""
+        self._write_behind.update(keys)
+        # Buffered values are never cached, so drop any which already are.
+        self.clear_cache()
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop,
+                                             name='sopel-db-flush')
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def _buffer(self, nick_id, values):
+        with self._pending_lock:
+            pending = self._pending.setdefault(nick_id, {})
+            for key, value in values.items():
+                if key not in pending:
+                    self._pending_count += 1
+                pending[key] = value
+            full = self._pending_count >= self._flush_size
+        if full:
+            self._flush_requested.set()
+
+    def _get_buffered(self, nick_id, keys):
+        """Return the buffered, still serialized, values of ``keys``."""
+        if not (self._pending or self._flushing):
+            return {}
+        keys = [key for key in keys if key in self._write_behind]
+        if not keys:
+            return {}
+        result = {}
+        with self._pending_lock:
+            for source in (self._flushing, self._pending):
+                values = source.get(nick_id)
+                if values:
+                    for key in keys:
+                        if key in values:
+                            result[key] = values[key]
+        return result
+
+    def _flush_loop(self):
+        while True:
+            self._flush_requested.wait(self._flush_interval)
+            self._flush_requested.clear()
+            try:
+                self.flush()
+            except Exception:
+                LOGGER.exception('Could not write buffered values to the '
+                                 'database')
+
+    def flush(self):
+        """Write all buffered nick values to the database."""
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                self._flushing = self._pending
+                self._pending = {}
+                self._pending_count = 0
+            rows = [(nick_id, key, value)
+                    for nick_id, values in self._flushing.items()
+                    for key, value in values.items()]
+            try:
+                with self._connection() as conn:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO nick_values VALUES (?, ?, ?)',
+                        rows)
+            except Exception:
+                # Put the values back, unless they've been replaced already.
+                with self._pending_lock:
+                    for nick_id, values in self._flushing.items():
+                        pending = self._pending.setdefault(nick_id, {})
+                        for key, value in values.items():
+                            if key not in pending:
+                                pending[key] = value
+                                self._pending_count += 1
+                raise
+            finally:
+                with self._pending_lock:
+                    self._flushing = {}
+
     def unalias_nick(self, alias):
         """Removes an alias.
 
@@ -177,14 +482,17 @@ class SopelDB(object):
         if count <= 1:
             raise ValueError('Given alias is the only entry in its group.')
         self.execute('DELETE FROM nicknames WHERE slug = ?', [alias.lower()])
+        self._invalidate(self._nick_ids, alias.lower())
 
     def delete_nick_group(self, nick):
         """Removes a nickname, and all associated aliases and settings.
         """
         nick = Identifier(nick)
         nick_id = self.get_nick_id(nick, False)
+        self.flush()
         self.execute('DELETE FROM nicknames WHERE nick_id = ?', [nick_id])
         self.execute('DELETE FROM nick_values WHERE nick_id = ?', [nick_id])
+        self.clear_cache()
 
     def merge_nick_groups(self, first_nick, second_nick):
         """Merges the nick groups for the specified nicks.
@@ -199,12 +507,14 @@ class SopelDB(object):
         will need to have their merging done separately."""
         first_id = self.get_nick_id(Identifier(first_nick))
         second_id = self.get_nick_id(Identifier(second_nick))
+        self.flush()
         self.execute(
             'UPDATE OR IGNORE nick_values SET nick_id = ? WHERE nick_id = ?',
             [first_id, second_id])
         self.execute('DELETE FROM nick_values WHERE nick_id = ?', [second_id])
         self.execute('UPDATE nicknames SET nick_id = ? WHERE nick_id = ?',
                      [first_id, second_id])
+        self.clear_cache()
 
     # CHANNEL FUNCTIONS
 
@@ -213,18 +523,70 @@ class SopelDB(object):
         value = json.dumps(value, ensure_ascii=False)
         self.execute('INSERT OR REPLACE INTO channel_values VALUES (?, ?, ?)',
                      [channel, key, value])
+        self._invalidate(self._values, ('channel', channel, key))
 
     def get_channel_value(self, channel, key):
         """Retrieves the value for a given key associated with a channel."""
         channel = Identifier(channel).lower()
-        result = self.execute(
-            'SELECT value FROM channel_values WHERE channel = ? AND key = ?',
-            [channel, key]
-        ).fetchone()
-        if result is not None:
-            result = result[0]
+        cache_key = ('channel', channel, key)
+        result = self._values.get(cache_key, _MISSING)
+        if result is _MISSING:
+            generation = self._generation
+            result = self.execute(
+                'SELECT value FROM channel_values WHERE channel = ? AND key = ?',
+                [channel, key]
+            ).fetchone()
+            if result is not None:
+                result = result[0]
+            self._fill(self._values, cache_key, result, generation)
         return _deserialize(result)
 
+    def set_channel_values(self, channel, values):
+        """Sets the values for several keys associated with the channel.
+
+        ``values`` is a dict of keys to values, which are all written in a
+        single transaction."""
+        channel = Identifier(channel).lower()
+        rows = [(channel, key, json.dumps(value, ensure_ascii=False))
+                for key, value in values.items()]
+        with self._connection() as conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO channel_values VALUES (?, ?, ?)', rows)
+        self._invalidate(self._values,
+                         *[('channel', channel, key) for key in values])
+
+    def get_channel_values(self, channel, keys):
+        """Retrieves the values for several keys associated with a channel.
+
+        Returns a dict of each of the given keys to its value, which is None
+        for keys which are not set."""
+        channel = Identifier(channel).lower()
+        keys = list(keys)
+        result = dict.fromkeys(keys)
+        missing = []
+        for key in keys:
+            value = self._values.get(('channel', channel, key), _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                result[key] = _deserialize(value)
+        if not missing:
+            return result
+
+        generation = self._generation
+        rows = dict(self.execute(
+            'SELECT key, value FROM channel_values '
+            'WHERE channel = ? AND key IN ({})'.format(
+                ','.join('?' * len(missing))),
+            [channel] + missing
+        ).fetchall())
+        for key in missing:
+            value = rows.get(key)
+            result[key] = _deserialize(value)
+            self._fill(self._values, ('channel', channel, key), value,
+                       generation)
+        return result
+
     # NICK AND CHANNEL FUNCTIONS
 
     def get_nick_or_channel_value(self, name, key):
@@ -12,6 +12,7 @@ from __future__ import unicode_literals, absolute_import, print_function, divisi
 
 import sys
 import time
+import select
 import socket
 import asyncore
 import asynchat
@@ -20,6 +21,9 @@ import codecs
 import traceback
 from sopel.logger import get_logger
 from sopel.tools import stderr, Identifier
+from sopel.tools.cache import LRUCache
+from sopel.tools.rawlog import RawLog
+from sopel.tools.throttle import monotonic
 from sopel.trigger import PreTrigger
 try:
     import ssl
@@ -33,6 +37,7 @@ except ImportError:
     # no SSL support
     has_ssl = False
 
+import contextlib
 import errno
 import threading
 from datetime import datetime
@@ -43,12 +48,36 @@ LOGGER = get_logger(__name__)
 
 
 class Bot(asynchat.async_chat):
+    connection_events = ('PING', 'ERROR', '433')
+    """Events handled by the connection itself, which are only dispatched if
+    some callable responds to them."""
+
+    write_batch_size = 4096
+    """The most bytes of queued lines sent to the server in one go."""
+
+    stack_size = 1000
+    """How many recipients the last messages sent to are kept for."""
+
+    stack_ttl = 120
+    """Seconds after which the messages sent to a recipient are forgotten, if
+    nothing was sent to it since. Loop detection only looks this far back."""
+
     def __init__(self, config):
         ca_certs = config.core.ca_certs
 
         asynchat.async_chat.__init__(self)
         self.set_terminator(b'\n')
-        self.buffer = ''
+        self.buffer = bytearray()
+        """The bytes received so far of the line being read."""
+        self.encodings = []
+        """The encodings tried, in order, to decode lines from the server."""
+        for encoding in config.core.encodings:
+            try:
+                codecs.lookup(encoding)
+            except LookupError:
+                LOGGER.warning('Ignoring unknown encoding %s', encoding)
+            else:
+                self.encodings.append(encoding)
 
         self.nick = Identifier(config.core.nick)
         """Sopel's current ``Identifier``. Changing this while Sopel is running is
@@ -58,7 +87,8 @@ class Bot(asynchat.async_chat):
         self.name = config.core.name
         """Sopel's "real name", as used for whois."""
 
-        self.stack = {}
+        self.stack = LRUCache(self.stack_size, ttl=self.stack_ttl)
+        """The last messages sent to each recipient, for loop detection."""
         self.ca_certs = ca_certs
         self.enabled_capabilities = set()
         self.hasquit = False
@@ -66,6 +96,13 @@ class Bot(asynchat.async_chat):
         self.sending = threading.RLock()
         self.writing_lock = threading.Lock()
         self.raw = None
+        # Encoded lines waiting to be sent, and how deep each thread is in
+        # batched_writes().
+        self._outbox = bytearray()
+        self._outbox_lock = threading.Lock()
+        self._batching = threading.local()
+        self._raw_log = None
+        self._raw_log_lock = threading.Lock()
 
         # Right now, only accounting for two op levels.
         # This might be expanded later.
@@ -93,22 +130,28 @@ class Bot(asynchat.async_chat):
         """Log raw line to the raw log."""
         if not self.config.core.log_raw:
             return
-        if not os.path.isdir(self.config.core.logdir):
-            try:
-                os.mkdir(self.config.core.logdir)
-            except Exception as e:
-                stderr('There was a problem creating the logs directory.')
-                stderr('%s %s' % (str(e.__class__), str(e)))
-                stderr('Please fix this and then run Sopel again.')
-                os._exit(1)
-        f = codecs.open(os.path.join(self.config.core.logdir, 'raw.log'),
-                        'a', encoding='utf-8')
-        f.write(prefix + unicode(time.time()) + "\t")
-        temp = line.replace('\n', '')
-
-        f.write(temp)
-        f.write("\n")
-        f.close()
+        raw_log = self._raw_log
+        if raw_log is None:
+            with self._raw_log_lock:
+                if self._raw_log is None:
+                    core = self.config.core
+                    self._raw_log = RawLog(
+                        core.logdir,
+                        max_bytes=core.log_raw_max_bytes,
+                        interval=core.log_raw_interval,
+                        backups=core.log_raw_backups,
+                        compress=core.log_raw_compress,
+                        queue_size=core.log_raw_queue_size)
+                    self._raw_log.start()
+                raw_log = self._raw_log
+        raw_log.log(prefix, line)
+
+    def _close_raw_log(self):
+        """Write out and close the raw log. It is reopened if used again."""
+        with self._raw_log_lock:
+            raw_log, self._raw_log = self._raw_log, None
+        if raw_log is not None:
+            raw_log.stop()
 
     def safe(self, string):
         """Remove newlines from a string."""
@@ -122,37 +165,99 @@ class Bot(asynchat.async_chat):
         return string
 
     def write(self, args, text=None):
+        """Send a line to the server.
+
+        The line is queued, then sent along with any other queued lines,
+        unless it is written within :meth:`batched_writes`."""
         args = [self.safe(arg) for arg in args]
         if text is not None:
             text = self.safe(text)
-        try:
-            self.writing_lock.acquire()  # Blocking lock, can't send two things
-                                         # at a time
-
-            # From RFC2812 Internet Relay Chat: Client Protocol
-            # Section 2.3
-            #
-            # https://tools.ietf.org/html/rfc2812.html
-            #
-            # IRC messages are always lines of characters terminated with a
-            # CR-LF (Carriage Return - Line Feed) pair, and these messages SHALL
-            # NOT exceed 512 characters in length, counting all characters
-            # including the trailing CR-LF. Thus, there are 510 characters
-            # maximum allowed for the command and its parameters.  There is no
-            # provision for continuation of message lines.
-
-            if text is not None:
-                temp = (' '.join(args) + ' :' + text)[:510] + '\r\n'
-            else:
-                temp = ' '.join(args)[:510] + '\r\n'
+
+        # From RFC2812 Internet Relay Chat: Client Protocol
+        # Section 2.3
+        #
+        # https://tools.ietf.org/html/rfc2812.html
+        #
+        # IRC messages are always lines of characters terminated with a
+        # CR-LF (Carriage Return - Line Feed) pair, and these messages SHALL
+        # NOT exceed 512 characters in length, counting all characters
+        # including the trailing CR-LF. Thus, there are 510 characters
+        # maximum allowed for the command and its parameters.  There is no
+        # provision for continuation of message lines.
+
+        if text is not None:
+            temp = (' '.join(args) + ' :' + text)[:510] + '\r\n'
+        else:
+            temp = ' '.join(args)[:510] + '\r\n'
+        with self._outbox_lock:
             self.log_raw(temp, '>>')
-            self.send(temp.encode('utf-8'))
+            self._outbox.extend(temp.encode('utf-8'))
+        if not getattr(self._batching, 'depth', 0):
+            self.flush_writes()
+
+    @contextlib.contextmanager
+    def batched_writes(self):
+        """Hold back the lines written in this block, to send them together.
+
+        Use this when writing many lines in a row, e.g.::
+
+            with bot.batched_writes():
+                for channel in channels:
+                    bot.join(channel)
+        """
+        self._batching.depth = getattr(self._batching, 'depth', 0) + 1
+        try:
+            yield
         finally:
-            self.writing_lock.release()
+            self._batching.depth -= 1
+            if not self._batching.depth:
+                self.flush_writes()
+
+    def flush_writes(self):
+        """Send the queued lines to the server.
+
+        Only one thread sends at a time, and it takes every line queued in the
+        meantime along, in chunks of up to :attr:`write_batch_size` bytes. If
+        another thread is already sending, this returns right away and leaves
+        the lines to it."""
+        # Checking again after releasing the lock makes sure lines queued just
+        # as the last sender finished don't get stranded.
+        while self._outbox and self.writing_lock.acquire(False):
+            try:
+                while True:
+                    with self._outbox_lock:
+                        data = bytes(self._outbox[:self.write_batch_size])
+                        del self._outbox[:len(data)]
+                    if not data:
+                        break
+                    self._send_all(data)
+            finally:
+                self.writing_lock.release()
+
+    def _send_all(self, data):
+        """Send all of ``data``, waiting for the socket when it's full."""
+        while data:
+            sent = self.send(data)
+            if sent:
+                data = data[sent:]
+                continue
+            if not self.connected:
+                LOGGER.warning('Not connected, dropping %d bytes of output',
+                               len(data))
+                return
+            try:
+                select.select([], [self.socket], [], 1)
+            except (TypeError, ValueError, select.error, socket.error):
+                # The socket was closed under us.
+                return
 
     def run(self, host, port=6667):
         try:
-            self.initiate_connect(host, port)
+            if self.config.core.connection_backend == 'asyncio':
+                from sopel.irc_asyncio import AsyncioConnection
+                AsyncioConnection(self).run(host, port)
+            else:
+                self.initiate_connect(host, port)
         except socket.error as e:
             stderr('Connection error: %s' % e)
 
@@ -192,6 +297,7 @@ class Bot(asynchat.async_chat):
 
         if hasattr(self, '_shutdown'):
             self._shutdown()
+        self._close_raw_log()
         stderr('Closed!')
 
         # This will eventually call asyncore dispatchers close method, which
@@ -219,6 +325,19 @@ class Bot(asynchat.async_chat):
                     os._exit(1)
             self.set_socket(self.ssl)
 
+        self._send_registration()
+
+        stderr('Connected.')
+        self.last_ping_time = monotonic()
+        timeout_check_thread = threading.Thread(target=self._timeout_check)
+        timeout_check_thread.daemon = True
+        timeout_check_thread.start()
+        ping_thread = threading.Thread(target=self._send_ping)
+        ping_thread.daemon = True
+        ping_thread.start()
+
+    def _send_registration(self):
+        """Send the commands which register the connection with the server."""
         # Request list of server capabilities. IRCv3 servers will respond with
         # CAP * LS (which we handle in coretasks). v2 servers will respond with
         # 421 Unknown command, which we'll ignore
@@ -230,18 +349,9 @@ class Bot(asynchat.async_chat):
         self.write(('NICK', self.nick))
         self.write(('USER', self.user, '+iw', self.nick), self.name)
 
-        stderr('Connected.')
-        self.last_ping_time = datetime.now()
-        timeout_check_thread = threading.Thread(target=self._timeout_check)
-        timeout_check_thread.daemon = True
-        timeout_check_thread.start()
-        ping_thread = threading.Thread(target=self._send_ping)
-        ping_thread.daemon = True
-        ping_thread.start()
-
     def _timeout_check(self):
         while self.connected or self.connecting:
-            if (datetime.now() - self.last_ping_time).seconds > int(self.config.core.timeout):
+            if monotonic() - self.last_ping_time > int(self.config.core.timeout):
                 stderr('Ping timeout reached after %s seconds, closing connection' % self.config.core.timeout)
                 self.handle_close()
                 break
@@ -250,7 +360,7 @@ class Bot(asynchat.async_chat):
 
     def _send_ping(self):
         while self.connected or self.connecting:
-            if self.connected and (datetime.now() - self.last_ping_time).seconds > int(self.config.core.timeout) / 2:
+            if self.connected and monotonic() - self.last_ping_time > int(self.config.core.timeout) / 2:
                 try:
                     self.write(('PING', self.config.core.host))
                 except socket.error:
@@ -263,7 +373,7 @@ class Bot(asynchat.async_chat):
             result = self.socket.send(data)
             return result
         except ssl.SSLError as why:
-            if why[0] in (asyncore.EWOULDBLOCK, errno.ESRCH):
+            if why.args[0] in (asyncore.EWOULDBLOCK, errno.ESRCH):
                 return 0
             else:
                 raise why
@@ -293,46 +403,81 @@ class Bot(asynchat.async_chat):
                 raise
 
     def collect_incoming_data(self, data):
-        # We can't trust clients to pass valid unicode.
-        try:
-            data = unicode(data, encoding='utf-8')
-        except UnicodeDecodeError:
-            # not unicode, let's try cp1252
+        # Lines are only decoded once complete, so that characters split
+        # across reads come out right.
+        self.buffer.extend(data)
+
+    def decode_line(self, data):
+        """Decode a line from the server, or return None if it can't be.
+
+        We can't trust clients to pass valid unicode, so each of
+        :attr:`encodings` is tried in turn."""
+        for encoding in self.encodings:
             try:
-                data = unicode(data, encoding='cp1252')
+                return data.decode(encoding)
             except UnicodeDecodeError:
-                # Okay, let's try ISO8859-1
-                try:
-                    data = unicode(data, encoding='iso8859-1')
-                except:
-                    # Discard line if encoding is unknown
-                    return
-
-        if data:
-            self.log_raw(data, '<<')
-        self.buffer += data
+                continue
+        return None
 
     def found_terminator(self):
-        line = self.buffer
+        data, self.buffer = bytes(self.buffer), bytearray()
+        self.last_ping_time = monotonic()
+        line = self.decode_line(data)
+        if line is None:
+            # Discard line if encoding is unknown
+            return
+        if line:
+            self.log_raw(line, '<<')
         if line.endswith('\r'):
             line = line[:-1]
-        self.buffer = ''
-        self.last_ping_time = datetime.now()
-        pretrigger = PreTrigger(self.nick, line)
-        if all(cap not in self.enabled_capabilities for cap in ['account-tag', 'extended-join']):
-            pretrigger.tags.pop('account', None)
 
-        if pretrigger.event == 'PING':
-            self.write(('PONG', pretrigger.args[-1]))
-        elif pretrigger.event == 'ERROR':
-            LOGGER.error("ERROR recieved from server: %s", pretrigger.args[-1])
+        # Servers send their PINGs and ERRORs without tags or a source, and
+        # their numerics without tags, so those can be handled without parsing
+        # the line.
+        event = None
+        if line.startswith('PING ') or line.startswith('ERROR '):
+            event, _, param = line.partition(' ')
+            param = param[1:] if param.startswith(':') else param.split(' ')[-1]
+        elif line.startswith(' 433 ', line.find(' ')):
+            event, param = '433', None
+        if event is not None:
+            self._connection_event(event, param)
+            if self._handles_event(event):
+                self.dispatch(self._parse_line(line))
+            return
+
+        pretrigger = self._parse_line(line)
+        if pretrigger.event in self.connection_events:
+            self._connection_event(pretrigger.event, pretrigger.args[-1])
+            if not self._handles_event(pretrigger.event):
+                return
+        self.dispatch(pretrigger)
+
+    def _connection_event(self, event, param):
+        """Respond to one of the ``connection_events``."""
+        if event == 'PING':
+            self.write(('PONG', param))
+        elif event == 'ERROR':
+            LOGGER.error("ERROR recieved from server: %s", param)
             if self.hasquit:
                 self.close_when_done()
-        elif pretrigger.event == '433':
+        elif event == '433':
             stderr('Nickname already in use!')
             self.handle_close()
 
-        self.dispatch(pretrigger)
+    def _parse_line(self, line):
+        pretrigger = PreTrigger(self.nick, line)
+        # Only tagged lines and JOINs can have an account, so don't make the
+        # others parse their tags.
+        if ((pretrigger.line.startswith('@') or pretrigger.event == 'JOIN') and
+                all(cap not in self.enabled_capabilities
+                    for cap in ['account-tag', 'extended-join'])):
+            pretrigger.tags.pop('account', None)
+        return pretrigger
+
+    def _handles_event(self, event):
+        """Whether any callable responds to ``event``."""
+        return True
 
     def dispatch(self, pretrigger):
         pass
@@ -400,7 +545,7 @@ class Bot(asynchat.async_chat):
         logfile.write('last raw line was %s' % self.raw)
         logfile.write(trace)
         logfile.write('Buffer:\n')
-        logfile.write(self.buffer)
+        logfile.write(self.buffer.decode('utf-8', 'replace'))
         logfile.write('----------------------------------------\n\n')
         logfile.close()
         if self.error_count > 10:
@@ -0,0 +1,213 @@
+# coding=utf-8
+"""An asyncio-based connection backend for :class:`sopel.irc.Bot`.
+
+Enabled by setting ``connection_backend = asyncio`` in the ``[core]`` section.
+It drives the same ``collect_incoming_data``/``found_terminator`` and
+``write`` contract as the default asynchat backend, but uses asyncio streams
+with native TLS, and runs the ping and timeout checks as event loop timers
+instead of dedicated threads.
+
+*Availability: 6.6+, Python 3.5+ only*
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import asyncio
+import os
+import threading
+
+from sopel.logger import get_logger
+from sopel.tools import stderr
+from sopel.tools.throttle import monotonic
+
+try:
+    import ssl
+    has_ssl = True
+    CertificateError = ssl.CertificateError
+except ImportError:
+    # no SSL support
+    has_ssl = False
+
+    class CertificateError(Exception):
+        """Never raised; stands in for ``ssl.CertificateError``."""
+
+LOGGER = get_logger(__name__)
+
+
+class AsyncioConnection(object):
+    """Run an IRC connection for ``bot`` on an asyncio event loop.
+
+    While running, the bot's ``send``, ``close`` and ``close_when_done``
+    methods are replaced by ones which go through the event loop. They can be
+    called from any thread.
+    """
+    def __init__(self, bot):
+        self.bot = bot
+        self.loop = None
+        self._thread = None
+        self._reader = None
+        self._writer = None
+        self._timers = {}
+        self._closed = False
+
+    def run(self, host, port):
+        """Connect to ``host`` and handle the connection until it closes."""
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.current_thread()
+        asyncio.set_event_loop(self.loop)
+
+        self.bot.send = self.send
+        self.bot.close = self.close
+        self.bot.close_when_done = self.close_when_done
+
+        task = self.loop.create_task(self._run(host, port))
+        try:
+            self.loop.run_until_complete(task)
+        except KeyboardInterrupt:
+            print('KeyboardInterrupt')
+            self.bot.quit('KeyboardInterrupt')
+            self.close()
+            if not task.done():
+                self.loop.run_until_complete(task)
+        finally:
+            self.loop.close()
+
+    def _ssl_context(self):
+        if self.bot.config.core.verify_ssl:
+            return ssl.create_default_context(cafile=self.bot.ca_certs)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+
+    async def _run(self, host, port):
+        core = self.bot.config.core
+        stderr('Connecting to %s:%s...' % (host, port))
+
+        ssl_context = None
+        if core.use_ssl and has_ssl:
+            ssl_context = self._ssl_context()
+        elif core.use_ssl:
+            stderr('SSL is not avilable on your system, attempting connection '
+                   'without it')
+        source_address = (core.bind_host, 0) if core.bind_host else None
+
+        try:
+            self._reader, self._writer = await asyncio.open_connection(
+                host, port, ssl=ssl_context, local_addr=source_address,
+                server_hostname=core.host if ssl_context else None)
+        except CertificateError:
+            stderr("Invalid certficate, hostname mismatch!")
+            os.unlink(core.pid_file_path)
+            os._exit(1)
+
+        self.bot.connected = True
+        self.bot._send_registration()
+        stderr('Connected.')
+        self.bot.last_ping_time = monotonic()
+        timeout = int(core.timeout)
+        self._schedule('ping', timeout / 2, self._send_ping)
+        self._schedule('timeout', timeout, self._timeout_check)
+
+        overrun = False
+        while True:
+            try:
+                line = await self._reader.readuntil(b'\n')
+            except asyncio.LimitOverrunError as e:
+                # Way past any sane IRC line length; drop it, along with
+                # whatever is left of it up to the next newline.
+                await self._reader.read(e.consumed)
+                overrun = True
+                continue
+            except (asyncio.IncompleteReadError, OSError):
+                break
+            if overrun:
+                overrun = False
+                continue
+            self._handle_line(line[:-1])
+
+        if not self._closed:
+            # The server went away without us asking.
+            self.bot.handle_close()
+
+    def _handle_line(self, data):
+        try:
+            self.bot.collect_incoming_data(data)
+            self.bot.found_terminator()
+        except Exception:
+            self.bot.handle_error()
+
+    def _schedule(self, name, delay, callback):
+        self._timers[name] = self.loop.call_later(delay, callback)
+
+    def _send_ping(self):
+        timeout = int(self.bot.config.core.timeout)
+        if monotonic() - self.bot.last_ping_time > timeout / 2:
+            self.bot.write(('PING', self.bot.config.core.host))
+        self._schedule('ping', timeout / 2, self._send_ping)
+
+    def _timeout_check(self):
+        timeout = int(self.bot.config.core.timeout)
+        if monotonic() - self.bot.last_ping_time > timeout:
+            stderr('Ping timeout reached after %s seconds, closing '
+                   'connection' % timeout)
+            self.bot.handle_close()
+        else:
+            self._schedule('timeout', timeout, self._timeout_check)
+
+    def _call(self, callback, *args):
+        """Call ``callback`` on the event loop, from whatever thread."""
+        if threading.current_thread() is self._thread:
+            callback(*args)
+        elif not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def send(self, data):
+        """Queue ``data`` to be sent. Replaces ``asynchat``'s ``send``.
+
+        From any thread but the event loop's, this waits until the data has
+        been handed to the socket, or at least until the transport's buffer
+        has drained below its high-water mark, so that a slow server holds
+        back whoever is writing rather than letting output pile up.
+        """
+        if threading.current_thread() is self._thread:
+            self._write(data)
+        elif not self.loop.is_closed():
+            future = asyncio.run_coroutine_threadsafe(self._send(data),
+                                                      self.loop)
+            try:
+                # Don't wait forever if the loop stops before getting to it.
+                future.result(int(self.bot.config.core.timeout))
+            except Exception:
+                pass
+        return len(data)
+
+    def _write(self, data):
+        if self._writer is not None and not self._closed:
+            self._writer.write(data)
+
+    async def _send(self, data):
+        self._write(data)
+        if self._writer is not None and not self._closed:
+            try:
+                await self._writer.drain()
+            except (ConnectionError, OSError):
+                # Reading notices the connection is gone and closes it.
+                pass
+
+    def close_when_done(self):
+        """Close the connection once everything queued has been sent."""
+        self._call(self.bot.handle_close)
+
+    def close(self):
+        """Close the connection. Pending output is flushed first."""
+        self._call(self._close)
+
+    def _close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.bot.connected = False
+        for timer in self._timers.values():
+            timer.cancel()
+        if self._writer is not None:
+            self._writer.close()
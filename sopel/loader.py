@@ -161,6 +161,7 @@ def clean_callable(func, config):
     func.rate = getattr(func, 'rate', 0)
     func.channel_rate = getattr(func, 'channel_rate', 0)
     func.global_rate = getattr(func, 'global_rate', 0)
+    func.rate_burst = getattr(func, 'rate_burst', 1)
 
     if not hasattr(func, 'event'):
         func.event = ['PRIVMSG']
@@ -249,7 +249,7 @@ def intent(*intent_list):
     return add_attribute
 
 
-def rate(user=0, channel=0, server=0):
+def rate(user=0, channel=0, server=0, burst=1):
     """Decorate a function to limit how often it can be triggered on a per-user
     basis, in a channel, or across the server (bot). A value of zero means no
     limit. If a function is given a rate of 20, that function may only be used
@@ -257,6 +257,9 @@ def rate(user=0, channel=0, server=0):
     Users on the admin list in Sopel’s configuration are exempted from rate
     limits.
 
+    With a ``burst`` greater than 1, the function may be used up to ``burst``
+    times in a row, after which it's back to once every 20 seconds.
+
     Rate-limited functions that use scheduled future commands should import
     threading.Timer() instead of sched, or rate limiting will not work properly.
     """
@@ -264,6 +267,7 @@ def rate(user=0, channel=0, server=0):
         function.rate = user
         function.channel_rate = channel
         function.global_rate = server
+        function.rate_burst = burst
         return function
     return add_attribute
 
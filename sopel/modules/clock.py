@@ -265,10 +265,11 @@ def update_user_format(bot, trigger):
                   " http://strftime.net to make one.")
         return
 
-    tz = get_timezone(bot.db, bot.config, None, trigger.nick, trigger.sender)
-
     # Get old format as back-up
-    old_format = bot.db.get_nick_value(trigger.nick, 'time_format')
+    values = bot.db.get_nick_values(trigger.nick, ['timezone', 'time_format'])
+    old_format = values['time_format']
+    tz = get_timezone(bot.db, bot.config, values['timezone'], None,
+                      trigger.sender)
 
     # Save the new format in the database so we can test it.
     bot.db.set_nick_value(trigger.nick, 'time_format', tformat)
@@ -375,10 +376,11 @@ def update_channel_format(bot, trigger):
         bot.reply("What format do you want me to use? Try using"
                   " http://strftime.net to make one.")
 
-    tz = get_timezone(bot.db, bot.config, None, None, trigger.sender)
-
     # Get old format as back-up
-    old_format = bot.db.get_channel_value(trigger.sender, 'time_format')
+    values = bot.db.get_channel_values(trigger.sender,
+                                       ['timezone', 'time_format'])
+    old_format = values['time_format']
+    tz = get_timezone(bot.db, bot.config, values['timezone'])
 
     # Save the new format in the database so we can test it.
     bot.db.set_channel_value(trigger.sender, 'time_format', tformat)
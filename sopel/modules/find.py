@@ -11,46 +11,11 @@ using the sed notation (s///) commonly found in vi/vim.
 from __future__ import unicode_literals, absolute_import, print_function, division
 
 import re
-from sopel.tools import Identifier, SopelMemory
+from sopel.tools import Identifier
 from sopel.module import rule, priority
 from sopel.formatting import bold
 
 
-def setup(bot):
-    bot.memory['find_lines'] = SopelMemory()
-
-
-@rule('.*')
-@priority('low')
-def collectlines(bot, trigger):
-    """Create a temporary log of what people say"""
-
-    # Don't log things in PM
-    if trigger.is_privmsg:
-        return
-
-    # Add a log for the channel and nick, if there isn't already one
-    if trigger.sender not in bot.memory['find_lines']:
-        bot.memory['find_lines'][trigger.sender] = SopelMemory()
-    if Identifier(trigger.nick) not in bot.memory['find_lines'][trigger.sender]:
-        bot.memory['find_lines'][trigger.sender][Identifier(trigger.nick)] = list()
-
-    # Create a temporary list of the user's lines in a channel
-    templist = bot.memory['find_lines'][trigger.sender][Identifier(trigger.nick)]
-    line = trigger.group()
-    if line.startswith("s/"):  # Don't remember substitutions
-        return
-    elif line.startswith("\x01ACTION"):  # For /me messages
-        line = line[:-1]
-        templist.append(line)
-    else:
-        templist.append(line)
-
-    del templist[:-10]  # Keep the log to 10 lines per person
-
-    bot.memory['find_lines'][trigger.sender][Identifier(trigger.nick)] = templist
-
-
 #Match nick, s/find/replace/flags. Flags and nick are optional, nick can be
 #followed by comma or colon, anything after the first space after the third
 #slash is ignored, you can escape slashes with backslashes, and if you want to
@@ -76,11 +41,10 @@ def findandreplace(bot, trigger):
     # Correcting other person vs self.
     rnick = Identifier(trigger.group(1) or trigger.nick)
 
-    search_dict = bot.memory['find_lines']
+    # Lines are collected in bot.history, which skips substitutions
+    lines = bot.history.lines(trigger.sender, rnick)
     # only do something if there is conversation to work with
-    if trigger.sender not in search_dict:
-        return
-    if Identifier(rnick) not in search_dict[trigger.sender]:
+    if not lines:
         return
 
     #TODO rest[0] is find, rest[1] is replace. These should be made variables of
@@ -108,7 +72,7 @@ def findandreplace(bot, trigger):
     # Look back through the user's lines in the channel until you find a line
     # where the replacement works
     new_phrase = None
-    for line in reversed(search_dict[trigger.sender][rnick]):
+    for line in reversed(lines):
         if line.startswith("\x01ACTION"):
             me = True  # /me command
             line = line[8:]
@@ -123,10 +87,7 @@ def findandreplace(bot, trigger):
 
     # Save the new "edited" message.
     action = (me and '\x01ACTION ') or ''  # If /me message, prepend \x01ACTION
-    templist = search_dict[trigger.sender][rnick]
-    templist.append(action + new_phrase)
-    search_dict[trigger.sender][rnick] = templist
-    bot.memory['find_lines'] = search_dict
+    bot.history.add(trigger.sender, rnick, action + new_phrase)
 
     # output
     if not me:
@@ -14,14 +14,13 @@ import pickle
 from sopel.config import StaticSection
 from sopel.config.types import FilenameAttribute
 from sopel.logger import get_logger
-from sopel.tools import Identifier, SopelMemory
+from sopel.tools import Identifier
 from sopel.module import rule, priority, commands, require_chanmsg, example, require_privmsg
 from datetime import datetime
 import sqlite3
 
 LOGGER = get_logger(__name__)
 
-log_key = 'quote_lines'
 memory_key = 'quote_memory'
 memory_size = 10
 importer = None
@@ -43,45 +42,11 @@ def configure(config):
 
 def setup(bot):
     bot.config.define_section('quote', QuoteSection)
-    bot.memory[log_key] = SopelMemory()
     bot.memory[memory_key] = list()
 
 
-@rule('.*')
-@priority('low')
-def collect_lines(bot, trigger):
-    """Create a temporary log of what people say"""
-
-    # Don't log things in PM
-    if trigger.is_privmsg:
-        return
-
-    # Add a log for the channel and nick, if there isn't already one
-    if trigger.sender not in bot.memory[log_key]:
-        bot.memory[log_key][trigger.sender] = SopelMemory()
-    if Identifier(trigger.nick) not in bot.memory[log_key][trigger.sender]:
-        bot.memory[log_key][trigger.sender][Identifier(trigger.nick)] = list()
-
-    # Create a temporary list of the user's lines in a channel
-    templist = bot.memory[log_key][trigger.sender][Identifier(trigger.nick)]
-    line = trigger.group()
-    if line.startswith("s/") or line.startswith(bot.config.core.help_prefix):
-        # Don't remember substitutions or commands
-        return
-    elif line.startswith("\x01ACTION"):  # For /me messages
-        line = line[:-1]
-        templist.append(line)
-    else:
-        templist.append(line)
-
-    del templist[:-10]  # Keep the log to 10 lines per person
-
-    bot.memory[log_key][trigger.sender][Identifier(trigger.nick)] = templist
-
-
 def isquote(bot, nick, channel, quote):
     # TODO grey out _ matched text
-    search_dict = bot.memory[log_key]
     regex = re.sub('(?!\[|\]|_).', lambda m: re.escape(m.group()), quote)
     LOGGER.debug(regex)
     regex = re.sub('_', '(.*)', regex)
@@ -92,8 +57,11 @@ def isquote(bot, nick, channel, quote):
 
     found_quote = None
     me = False
-    if channel in search_dict and nick in search_dict[channel]:
-        for line in reversed(search_dict[channel][nick]):
+    # Lines are collected in bot.history, which skips substitutions and
+    # commands
+    lines = bot.history.lines(channel, nick)
+    if lines:
+        for line in reversed(lines):
             if line.startswith("\x01ACTION"):
                 me = True  # /me command
                 line = line[8:]
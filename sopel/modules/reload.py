@@ -45,6 +45,8 @@ def f_reload(bot, trigger):
     old_callables = {}
     for obj_name, obj in iteritems(vars(old_module)):
         bot.unregister(obj)
+    # Including the one-shot jobs it scheduled itself
+    bot.scheduler.remove_module_jobs(old_module.__name__)
 
     # Also remove all references to sopel callables from top level of the
     # module, so that they will not get loaded again if reloading the
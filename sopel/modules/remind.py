@@ -11,7 +11,6 @@ from __future__ import unicode_literals, absolute_import, print_function, divisi
 import os
 import re
 import time
-import threading
 import collections
 import codecs
 from datetime import datetime
@@ -47,38 +46,49 @@ def load_database(name):
     return data
 
 
-def dump_database(name, data):
-    f = codecs.open(name, 'w', encoding='utf-8')
-    for unixtime, reminders in sopel.tools.iteritems(data):
-        for channel, nick, message in reminders:
-            f.write('%s\t%s\t%s\t%s\n' % (unixtime, channel, nick, message))
-    f.close()
+def migrate_database(bot, name):
+    """Move the reminders from the old flat file into the database."""
+    if not os.path.isfile(name):
+        return
+    rows = [(unixtime, channel, nick, message)
+            for unixtime, reminders in sopel.tools.iteritems(load_database(name))
+            for channel, nick, message in reminders]
+    bot.db.executemany(
+        'INSERT INTO reminders (due, channel, nick, message) '
+        'VALUES (?, ?, ?, ?)', rows)
+    os.rename(name, name + '.migrated')
+
+
+def send_reminder(bot, reminder_id, channel, nick, message):
+    if message:
+        bot.msg(channel, nick + ': ' + message)
+    else:
+        bot.msg(channel, nick + '!')
+    bot.db.execute('DELETE FROM reminders WHERE id = ?', [reminder_id])
+
+
+def schedule_reminder(bot, reminder_id, due, channel, nick, message):
+    bot.scheduler.call_at(due, send_reminder, reminder_id, channel, nick,
+                          message)
 
 
 def setup(bot):
-    bot.rfn = filename(bot)
-    bot.rdb = load_database(bot.rfn)
-
-    def monitor(bot):
-        time.sleep(5)
-        while True:
-            now = int(time.time())
-            unixtimes = [int(key) for key in bot.rdb]
-            oldtimes = [t for t in unixtimes if t <= now]
-            if oldtimes:
-                for oldtime in oldtimes:
-                    for (channel, nick, message) in bot.rdb[oldtime]:
-                        if message:
-                            bot.msg(channel, nick + ': ' + message)
-                        else:
-                            bot.msg(channel, nick + '!')
-                    del bot.rdb[oldtime]
-                dump_database(bot.rfn, bot.rdb)
-            time.sleep(2.5)
-
-    targs = (bot,)
-    t = threading.Thread(target=monitor, args=targs)
-    t.start()
+    bot.db.execute(
+        'CREATE TABLE IF NOT EXISTS reminders '
+        '(id INTEGER PRIMARY KEY, due INTEGER, channel STRING, nick STRING, '
+        'message STRING)')
+    migrate_database(bot, filename(bot))
+
+    # Setting up again, e.g. on reload, must not schedule reminders twice.
+    bot.scheduler.remove_module_jobs(__name__)
+    # Give the bot some time to connect before sending anything.
+    earliest = time.time() + 5
+    rows = bot.db.execute(
+        'SELECT id, due, channel, nick, message FROM reminders').fetchall()
+    for reminder_id, due, channel, nick, message in rows:
+        schedule_reminder(bot, reminder_id, max(due, earliest), channel, nick,
+                          message)
+
 
 scaling = collections.OrderedDict([
     ('years', 365.25 * 24 * 3600),
@@ -210,13 +220,11 @@ def at(bot, trigger):
 
 def create_reminder(bot, trigger, duration, message, tz):
     t = int(time.time()) + duration
-    reminder = (trigger.sender, trigger.nick, message)
-    try:
-        bot.rdb[t].append(reminder)
-    except KeyError:
-        bot.rdb[t] = [reminder]
-
-    dump_database(bot.rfn, bot.rdb)
+    cur = bot.db.execute(
+        'INSERT INTO reminders (due, channel, nick, message) '
+        'VALUES (?, ?, ?, ?)', [t, trigger.sender, trigger.nick, message])
+    schedule_reminder(bot, cur.lastrowid, t, trigger.sender, trigger.nick,
+                      message)
 
     if duration >= 60:
         remind_at = datetime.utcfromtimestamp(t)
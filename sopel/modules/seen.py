@@ -12,10 +12,16 @@ from __future__ import unicode_literals, absolute_import, print_function, divisi
 import time
 import datetime
 from sopel.tools import Identifier
-from sopel.tools.time import get_timezone, format_time
+from sopel.tools.time import format_user_time
 from sopel.module import commands, rule, priority, thread
 
 
+def setup(bot):
+    # These are written for every line said in a channel
+    bot.db.enable_write_behind('seen_timestamp', 'seen_channel',
+                               'seen_message', 'seen_action')
+
+
 @commands('seen')
 def seen(bot, trigger):
     """Reports when and where the user was last seen."""
@@ -26,17 +32,17 @@ def seen(bot, trigger):
     if nick == bot.nick:
         bot.reply("I'm right here!")
         return
-    timestamp = bot.db.get_nick_value(nick, 'seen_timestamp')
+    values = bot.db.get_nick_values(nick, ['seen_timestamp', 'seen_channel',
+                                           'seen_message', 'seen_action'])
+    timestamp = values['seen_timestamp']
     if timestamp:
-        channel = bot.db.get_nick_value(nick, 'seen_channel')
-        message = bot.db.get_nick_value(nick, 'seen_message')
-        action = bot.db.get_nick_value(nick, 'seen_action')
+        channel = values['seen_channel']
+        message = values['seen_message']
+        action = values['seen_action']
 
-        tz = get_timezone(bot.db, bot.config, None, trigger.nick,
-                          trigger.sender)
         saw = datetime.datetime.utcfromtimestamp(timestamp)
-        timestamp = format_time(bot.db, bot.config, tz, trigger.nick,
-                                trigger.sender, saw)
+        timestamp = format_user_time(bot.db, bot.config, trigger.nick,
+                                     trigger.sender, saw)
 
         msg = "I last saw {} at {}".format(nick, timestamp)
         if Identifier(channel) == trigger.sender:
@@ -56,7 +62,9 @@ def seen(bot, trigger):
 @priority('low')
 def note(bot, trigger):
     if not trigger.is_privmsg:
-        bot.db.set_nick_value(trigger.nick, 'seen_timestamp', time.time())
-        bot.db.set_nick_value(trigger.nick, 'seen_channel', trigger.sender)
-        bot.db.set_nick_value(trigger.nick, 'seen_message', trigger)
-        bot.db.set_nick_value(trigger.nick, 'seen_action', 'intent' in trigger.tags)
+        bot.db.set_nick_values(trigger.nick, {
+            'seen_timestamp': time.time(),
+            'seen_channel': trigger.sender,
+            'seen_message': trigger,
+            'seen_action': 'intent' in trigger.tags,
+        })
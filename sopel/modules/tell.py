@@ -12,70 +12,66 @@ import os
 import time
 import threading
 import sys
-from sopel.tools import Identifier, iterkeys
-from sopel.tools.time import get_timezone, format_time
+from sopel.tools import Identifier, iteritems
+from sopel.tools.time import format_user_time
 from sopel.module import commands, nickname_commands, rule, priority, example
 
 maximum = 4
 
 
-def loadReminders(fn, lock):
-    lock.acquire()
-    try:
-        result = {}
-        f = open(fn)
-        for line in f:
-            line = line.strip()
-            if sys.version_info.major < 3:
-                line = line.decode('utf-8')
-            if line:
-                try:
-                    tellee, teller, verb, timenow, msg = line.split('\t', 4)
-                except ValueError:
-                    continue  # @@ hmm
-                result.setdefault(tellee, []).append((teller, verb, timenow, msg))
-        f.close()
-    finally:
-        lock.release()
+def loadReminders(fn):
+    result = {}
+    f = open(fn)
+    for line in f:
+        line = line.strip()
+        if sys.version_info.major < 3:
+            line = line.decode('utf-8')
+        if line:
+            try:
+                tellee, teller, verb, timenow, msg = line.split('\t', 4)
+            except ValueError:
+                continue  # @@ hmm
+            result.setdefault(tellee, []).append((teller, verb, timenow, msg))
+    f.close()
     return result
 
 
-def dumpReminders(fn, data, lock):
-    lock.acquire()
-    try:
-        f = open(fn, 'w')
-        for tellee in iterkeys(data):
-            for remindon in data[tellee]:
-                line = '\t'.join((tellee,) + remindon)
-                try:
-                    to_write = line + '\n'
-                    if sys.version_info.major < 3:
-                        to_write = to_write.encode('utf-8')
-                    f.write(to_write)
-                except IOError:
-                    break
-        try:
-            f.close()
-        except IOError:
-            pass
-    finally:
-        lock.release()
-    return True
+def migrate_reminders(bot, fn):
+    """Move the messages from the old flat file into the database."""
+    if not os.path.isfile(fn):
+        return
+    rows = [(tellee, Identifier(tellee).lower(), teller, verb, timenow, msg)
+            for tellee, reminders in iteritems(loadReminders(fn))
+            for teller, verb, timenow, msg in reminders]
+    bot.db.executemany(
+        'INSERT INTO tells (tellee, slug, teller, verb, timenow, message) '
+        'VALUES (?, ?, ?, ?, ?, ?)', rows)
+    os.rename(fn, fn + '.migrated')
+
+
+def is_wildcard(slug):
+    return slug.endswith('*')
 
 
 def setup(self):
+    self.db.execute(
+        'CREATE TABLE IF NOT EXISTS tells '
+        '(id INTEGER PRIMARY KEY, tellee STRING, slug STRING, teller STRING, '
+        'verb STRING, timenow STRING, message STRING)')
+    self.db.execute(
+        'CREATE INDEX IF NOT EXISTS tells_slug ON tells (slug)')
     fn = self.nick + '-' + self.config.core.host + '.tell.db'
-    self.tell_filename = os.path.join(self.config.core.homedir, fn)
-    if not os.path.exists(self.tell_filename):
-        try:
-            f = open(self.tell_filename, 'w')
-        except OSError:
-            pass
-        else:
-            f.write('')
-            f.close()
+    migrate_reminders(self, os.path.join(self.config.core.homedir, fn))
+
+    # Nicks with pending messages, so that checking every line doesn't have
+    # to touch the database.
+    slugs = set(row[0] for row in
+                self.db.execute('SELECT DISTINCT slug FROM tells'))
     self.memory['tell_lock'] = threading.Lock()
-    self.memory['reminders'] = loadReminders(self.tell_filename, self.memory['tell_lock'])
+    self.memory['tell_pending'] = set(
+        slug for slug in slugs if not is_wildcard(slug))
+    self.memory['tell_wildcards'] = set(
+        slug for slug in slugs if is_wildcard(slug))
 
 
 @commands('tell', 'ask')
@@ -99,25 +95,23 @@ def f_remind(bot, trigger):
 
     tellee = Identifier(tellee)
 
-    if not os.path.exists(bot.tell_filename):
-        return
-
     if len(tellee) > 20:
         return bot.reply('That nickname is too long.')
     if tellee == bot.nick:
         return bot.reply("I'm here now, you can tell me whatever you want!")
 
     if not tellee in (Identifier(teller), bot.nick, 'me'):
-        tz = get_timezone(bot.db, bot.config, None, tellee)
-        timenow = format_time(bot.db, bot.config, tz, tellee)
-        bot.memory['tell_lock'].acquire()
-        try:
-            if not tellee in bot.memory['reminders']:
-                bot.memory['reminders'][tellee] = [(teller, verb, timenow, msg)]
+        timenow = format_user_time(bot.db, bot.config, tellee)
+        slug = tellee.lower()
+        with bot.memory['tell_lock']:
+            bot.db.execute(
+                'INSERT INTO tells (tellee, slug, teller, verb, timenow, '
+                'message) VALUES (?, ?, ?, ?, ?, ?)',
+                [tellee, slug, teller, verb, timenow, msg])
+            if is_wildcard(slug):
+                bot.memory['tell_wildcards'].add(slug)
             else:
-                bot.memory['reminders'][tellee].append((teller, verb, timenow, msg))
-        finally:
-            bot.memory['tell_lock'].release()
+                bot.memory['tell_pending'].add(slug)
 
         response = "I'll pass that on when %s is around." % tellee
 
@@ -127,27 +121,27 @@ def f_remind(bot, trigger):
     else:
         bot.say("Hey, I'm not as stupid as Monty you know!")
 
-    dumpReminders(bot.tell_filename, bot.memory['reminders'], bot.memory['tell_lock'])  # @@ tell
 
+def getReminders(bot, slugs, tellee):
+    """Fetch and delete the messages for ``slugs``, formatted for ``tellee``.
 
-def getReminders(bot, channel, key, tellee):
+    Must be called with the ``tell_lock`` held.
+    """
     lines = []
     template = "%s: %s <%s> %s %s %s"
     today = time.strftime('%d %b', time.gmtime())
 
-    bot.memory['tell_lock'].acquire()
-    try:
-        for (teller, verb, datetime, msg) in bot.memory['reminders'][key]:
-            if datetime.startswith(today):
-                datetime = datetime[len(today) + 1:]
-            lines.append(template % (tellee, datetime, teller, verb, tellee, msg))
-
-        try:
-            del bot.memory['reminders'][key]
-        except KeyError:
-            bot.msg(channel, 'Er...')
-    finally:
-        bot.memory['tell_lock'].release()
+    placeholders = ', '.join('?' * len(slugs))
+    rows = bot.db.execute(
+        'SELECT id, teller, verb, timenow, message FROM tells '
+        'WHERE slug IN ({}) ORDER BY slug DESC, id'.format(placeholders),
+        slugs).fetchall()
+    for (_, teller, verb, datetime, msg) in rows:
+        if datetime.startswith(today):
+            datetime = datetime[len(today) + 1:]
+        lines.append(template % (tellee, datetime, teller, verb, tellee, msg))
+    bot.db.executemany('DELETE FROM tells WHERE id = ?',
+                       [(row[0],) for row in rows])
     return lines
 
 
@@ -156,20 +150,23 @@ def getReminders(bot, channel, key, tellee):
 def message(bot, trigger):
 
     tellee = trigger.nick
-    channel = trigger.sender
+    slug = tellee.lower()
+    pending = bot.memory['tell_pending']
+    wildcards = bot.memory['tell_wildcards']
 
-    if not os.path.exists(bot.tell_filename):
+    if slug not in pending and not wildcards:
         return
 
-    reminders = []
-    remkeys = list(reversed(sorted(bot.memory['reminders'].keys())))
-
-    for remkey in remkeys:
-        if not remkey.endswith('*') or remkey.endswith(':'):
-            if tellee == remkey:
-                reminders.extend(getReminders(bot, channel, remkey, tellee))
-        elif tellee.startswith(remkey.rstrip('*:')):
-            reminders.extend(getReminders(bot, channel, remkey, tellee))
+    with bot.memory['tell_lock']:
+        slugs = [key for key in wildcards
+                 if slug.startswith(key.rstrip('*:'))]
+        if slug in pending:
+            slugs.append(slug)
+        if not slugs:
+            return
+        reminders = getReminders(bot, slugs, tellee)
+        pending.discard(slug)
+        wildcards.difference_update(slugs)
 
     for line in reminders[:maximum]:
         bot.say(line)
@@ -178,6 +175,3 @@ def message(bot, trigger):
         bot.say('Further messages sent privately')
         for line in reminders[maximum:]:
             bot.msg(tellee, line)
-
-    if len(bot.memory['reminders'].keys()) != remkeys:
-        dumpReminders(bot.tell_filename, bot.memory['reminders'], bot.memory['tell_lock'])  # @@ tell
@@ -18,7 +18,6 @@ import requests
 from sopel import web
 from sopel.module import rule, commands, priority, example
 
-mangle_lines = {}
 if sys.version_info.major >= 3:
     unicode = str
 
@@ -160,18 +159,19 @@ def get_random_lang(long_list, short_list):
 def mangle(bot, trigger):
     """Repeatedly translate the input until it makes absolutely no sense."""
     verify_ssl = bot.config.core.verify_ssl
-    global mangle_lines
     long_lang_list = ['fr', 'de', 'es', 'it', 'no', 'he', 'la', 'ja', 'cy', 'ar', 'yi', 'zh', 'nl', 'ru', 'fi', 'hi', 'af', 'jw', 'mr', 'ceb', 'cs', 'ga', 'sv', 'eo', 'el', 'ms', 'lv']
     lang_list = []
     for __ in range(0, 8):
         lang_list = get_random_lang(long_lang_list, lang_list)
     random.shuffle(lang_list)
     if trigger.group(2) is None:
-        try:
-            phrase = (mangle_lines[trigger.sender.lower()], '')
-        except:
+        # bot.history doesn't keep commands, so this is the line before
+        recent = bot.history.recent(trigger.sender, 1)
+        if not recent:
             bot.reply("What do you want me to mangle?")
             return
+        nick, line = recent[0]
+        phrase = ("%s said '%s'" % (nick, line.strip()), '')
     else:
         phrase = (trigger.group(2).strip(), '')
     if phrase[0] == '':
@@ -200,13 +200,6 @@ def mangle(bot, trigger):
     bot.reply(phrase[0])
 
 
-@rule('(.*)')
-@priority('low')
-def collect_mangle_lines(bot, trigger):
-    global mangle_lines
-    mangle_lines[trigger.sender.lower()] = "%s said '%s'" % (trigger.nick, (trigger.group(0).strip()))
-
-
 if __name__ == "__main__":
     from sopel.test_tools import run_example_tests
     run_example_tests(__file__)
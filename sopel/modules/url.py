@@ -7,12 +7,22 @@
 # Licensed under the Eiffel Forum License 2.
 from __future__ import unicode_literals, absolute_import, print_function, division
 
+import functools
 import re
+import threading
+import time
 from sopel import web, tools, __version__
+from sopel.logger import get_logger
 from sopel.module import commands, rule, example
+from sopel.tools.cache import LRUCache
+from sopel.tools.urlrouter import URLRouter
+from sopel.tools.workers import WorkerPool
 from sopel.config.types import ValidatedAttribute, ListAttribute, StaticSection
 
 import requests
+from requests.adapters import HTTPAdapter
+
+LOGGER = get_logger(__name__)
 
 USER_AGENT = 'Sopel/{} (http://sopel.chat)'.format(__version__)
 default_headers = {'User-Agent': USER_AGENT}
@@ -23,17 +33,49 @@ title_tag_data = re.compile('<(/?)title( [^>]+)?>', re.IGNORECASE)
 quoted_title = re.compile('[\'"]<title>[\'"]', re.IGNORECASE)
 # This is another regex that presumably does something important.
 re_dcc = re.compile(r'(?i)dcc\ssend')
-# This sets the maximum number of bytes that should be read in order to find
-# the title. We don't want it too high, or a link to a big file/stream will
-# just keep downloading until there's no more memory. 640k ought to be enough
-# for anybody.
-max_bytes = 655360
+# Only these are downloaded to look for a title.
+html_types = ('text/html', 'application/xhtml+xml')
+# The session shared by every fetch, so connections to a host are reused.
+session = None
+# The threads pages are fetched and URL callbacks run on; set up in setup().
+# These are not the bot's own workers, which title_auto is already running on.
+executor = None
+# Titles by URI, with '' for pages which have none; set up in setup().
+title_cache = LRUCache(0)
+# Built from bot.memory['url_callbacks'] whenever that changes.
+router = None
 
 
 class UrlSection(StaticSection):
     # TODO some validation rules maybe?
     exclude = ListAttribute('exclude')
     exclusion_char = ValidatedAttribute('exclusion_char', default='!')
+    connect_timeout = ValidatedAttribute('connect_timeout', float, default=3.0)
+    """Seconds to wait for a connection to the server."""
+    read_timeout = ValidatedAttribute('read_timeout', float, default=5.0)
+    """Seconds to wait for the response, and to read up to its title."""
+    # We don't want it too high, or a link to a big file/stream will just keep
+    # downloading until there's no more memory. 640k ought to be enough for
+    # anybody.
+    max_bytes = ValidatedAttribute('max_bytes', int, default=655360)
+    """The most bytes of a page to read while looking for its title."""
+    fetch_threads = ValidatedAttribute('fetch_threads', int, default=4)
+    """How many URLs are fetched, or handled by other modules, at the same
+    time."""
+    host_connections = ValidatedAttribute('host_connections', int, default=2)
+    """How many connections to the same host are open at the same time."""
+    title_cache_size = ValidatedAttribute('title_cache_size', int,
+                                          default=1024)
+    """How many titles are kept in memory, so pages aren't fetched again."""
+    title_ttl = ValidatedAttribute('title_ttl', int, default=3600)
+    """Seconds a title is cached for."""
+    negative_ttl = ValidatedAttribute('negative_ttl', int, default=300)
+    """Seconds a page which has no title, or couldn't be fetched, is cached for."""
+    persist_titles = ValidatedAttribute('persist_titles', bool, default=False)
+    """Whether cached titles are stored in the database, to survive restarts."""
+    callback_timeout = ValidatedAttribute('callback_timeout', float,
+                                          default=10.0)
+    """Seconds to wait for the modules handling a URL before moving on."""
 
 
 def configure(config):
@@ -82,6 +124,53 @@ def setup(bot=None):
     url_finder = re.compile(r'(?u)(%s?(?:http|https|ftp)(?:://\S+))' %
                             (bot.config.url.exclusion_char), re.IGNORECASE)
 
+    global session
+    if session is not None:
+        session.close()
+    session = make_session(bot.config.url.host_connections)
+
+    global executor
+    if executor is not None:
+        executor.stop()
+    # When the queue is full, the caller fetches the page itself.
+    executor = WorkerPool(workers=bot.config.url.fetch_threads,
+                          queue_size=100, overflow='inline', name='sopel-url')
+    executor.start()
+
+    global title_cache
+    title_cache = LRUCache(bot.config.url.title_cache_size)
+    if bot.config.url.persist_titles:
+        bot.db.execute(
+            'CREATE TABLE IF NOT EXISTS url_titles '
+            '(uri STRING PRIMARY KEY, title STRING, expires REAL)')
+        bot.db.execute('DELETE FROM url_titles WHERE expires <= ?',
+                       [time.time()])
+
+
+def shutdown(bot):
+    global session, executor
+    if session is not None:
+        session.close()
+        session = None
+    if executor is not None:
+        executor.stop()
+        executor = None
+
+
+def make_session(host_connections):
+    """Return a session with a pool of connections for each host.
+
+    A fetch waits for one of the host's ``host_connections`` to be free,
+    rather than opening more.
+    """
+    new_session = requests.Session()
+    new_session.headers.update(default_headers)
+    adapter = HTTPAdapter(pool_maxsize=max(1, host_connections),
+                          pool_block=True)
+    new_session.mount('http://', adapter)
+    new_session.mount('https://', adapter)
+    return new_session
+
 
 @commands('title')
 @example('.title http://google.com', '[ Google ] - google.com')
@@ -146,7 +235,7 @@ def process_urls(bot, trigger, urls):
     another module.
     """
 
-    results = []
+    fetch = []
     for url in urls:
         if not url.startswith(bot.config.url.exclusion_char):
             # Magic stuff to account for international domain names
@@ -158,11 +247,22 @@ def process_urls(bot, trigger, urls):
             matched = check_callbacks(bot, trigger, url, False)
             if matched:
                 continue
-            # Finally, actually show the URL
-            title = find_title(url, verify=bot.config.core.verify_ssl)
-            if title:
-                results.append((title, get_hostname(url)))
-    return results
+            fetch.append(url)
+
+    # Finally, actually show the URLs
+    titles = fetch_titles(bot, fetch)
+    return [(title, get_hostname(url))
+            for url, title in zip(fetch, titles) if title]
+
+
+def get_router(bot):
+    """Return the router for the current ``url_callbacks``."""
+    global router
+    callbacks = bot.memory['url_callbacks']
+    current = router
+    if current is None or not current.is_current(callbacks):
+        current = router = URLRouter(callbacks)
+    return current
 
 
 def check_callbacks(bot, trigger, url, run=True):
@@ -170,35 +270,217 @@ def check_callbacks(bot, trigger, url, run=True):
     Check the given URL against the callbacks list. If it matches, and ``run``
     is given as ``True``, run the callback function, otherwise pass. Returns
     ``True`` if the url matched anything in the callbacks list.
+
+    Matching callbacks run at the same time on the URL threads; this waits
+    for them for up to ``callback_timeout`` seconds.
     """
     # Check if it matches the exclusion list first
     matched = any(regex.search(url) for regex in bot.memory['url_exclude'])
     # Then, check if there's anything in the callback list
-    for regex, function in tools.iteritems(bot.memory['url_callbacks']):
-        match = regex.search(url)
-        if match:
-            # Always run ones from @url; they don't run on their own.
-            if run or hasattr(function, 'url_regex'):
-                function(bot, trigger, match)
-            matched = True
+    calls = []
+    for function, match in get_router(bot).match(url):
+        # Always run ones from @url; they don't run on their own.
+        if run or hasattr(function, 'url_regex'):
+            calls.append((function, match))
+        matched = True
+    run_callbacks(bot, trigger, calls)
     return matched
 
 
-def find_title(url, verify=True):
-    """Return the title for the given URL."""
-    response = requests.get(url, stream=True, verify=verify,
-                            headers=default_headers)
+def run_callbacks(bot, trigger, calls):
+    """Run each ``(function, match)`` in ``calls`` concurrently.
+
+    They run on the URL threads rather than the bot's workers, which this is
+    usually called from; waiting on those could leave no worker free to run
+    the callbacks. Callbacks still running after ``callback_timeout`` seconds
+    are left to finish on their own.
+    """
+    if not calls:
+        return
+
+    def call(function, match):
+        try:
+            function(bot, trigger, match)
+        except Exception:
+            bot.error(trigger)
+
+    late = run_concurrently(
+        [functools.partial(call, function, match)
+         for function, match in calls],
+        timeout=bot.config.url.callback_timeout)
+    for partial in late:
+        function = partial.args[0]
+        LOGGER.warning('%s is taking more than %ss to handle a URL',
+                       getattr(function, '__name__', function),
+                       bot.config.url.callback_timeout)
+
+
+def get_cached_title(bot, uri):
+    """Return the cached title for ``uri``, '' if it has none, or None."""
+    title = title_cache.get(uri)
+    if title is not None or not bot.config.url.persist_titles:
+        return title
+    row = bot.db.execute(
+        'SELECT title, expires FROM url_titles WHERE uri = ?',
+        [uri]).fetchone()
+    if row is None:
+        return None
+    title, expires = row
+    ttl = expires - time.time()
+    if ttl <= 0:
+        return None
+    title_cache.set(uri, title, ttl)
+    return title
+
+
+def cache_title(bot, uri, title):
+    """Cache the ``title`` of ``uri``; ``None`` means it has none."""
+    if title:
+        ttl = bot.config.url.title_ttl
+    else:
+        title = ''
+        ttl = bot.config.url.negative_ttl
+    title_cache.set(uri, title, ttl)
+    if bot.config.url.persist_titles:
+        bot.db.execute(
+            'INSERT OR REPLACE INTO url_titles (uri, title, expires) '
+            'VALUES (?, ?, ?)', [uri, title, time.time() + ttl])
+
+
+def fetch_titles(bot, urls):
+    """Return the title for each URL (or None), fetching them concurrently.
+
+    Titles are taken from the cache when possible, and each URL which isn't
+    cached is only fetched once.
+    """
+    config = bot.config
+    titles = {}
+    missing = []
+    for url in urls:
+        if url in titles:
+            continue
+        title = get_cached_title(bot, url)
+        titles[url] = title
+        if title is None:
+            missing.append(url)
+    fetched = {}
+
+    def fetch(url):
+        try:
+            fetched[url] = find_title(
+                url, verify=config.core.verify_ssl,
+                timeout=(config.url.connect_timeout,
+                         config.url.read_timeout),
+                max_bytes=config.url.max_bytes)
+        except requests.RequestException as e:
+            LOGGER.debug('Could not fetch the title of %s: %s', url, e)
+            fetched[url] = None
+        except Exception:
+            LOGGER.exception('Error fetching the title of %s', url)
+
+    # Fetches time out on their own, so there's no need for another timeout.
+    run_concurrently([functools.partial(fetch, url) for url in missing])
+
+    # Unexpected errors aren't cached, so the page is tried again next time.
+    for url, title in fetched.items():
+        cache_title(bot, url, title)
+        titles[url] = title
+    return [titles[url] or None for url in urls]
+
+
+def run_concurrently(calls, timeout=None):
+    """Run each of ``calls`` on the URL threads, and wait for them.
+
+    Returns the calls still running after ``timeout`` seconds, which are left
+    to finish in the background. Calls are run inline when made from one of
+    the URL threads, or before :func:`setup`, so waiting never ties up the
+    threads they need.
+    """
+    pool = executor
+    if pool is None or pool.in_worker():
+        for call in calls:
+            call()
+        return []
+
+    def run(call, finished):
+        try:
+            call()
+        finally:
+            finished.set()
+
+    running = []
+    for call in calls:
+        finished = threading.Event()
+        running.append((call, finished))
+        pool.submit(run, call, finished)
+
+    deadline = None if timeout is None else time.time() + timeout
+    late = []
+    for call, finished in running:
+        remaining = None
+        if deadline is not None:
+            remaining = max(0, deadline - time.time())
+        if not finished.wait(remaining):
+            late.append(call)
+    return late
+
+
+class TitleScanner(object):
+    """Collects the start of a page, up to the end of its title.
+
+    Each chunk passed to :meth:`feed` is searched for the closing tag, along
+    with just enough of the previous one to catch a tag split between them;
+    what came before is never scanned again.
+    """
+    end_tag = b'</title>'
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.content = bytearray()
+        self.done = False
+
+    def feed(self, chunk):
+        """Add ``chunk``, and return whether there is no need for more."""
+        start = max(0, len(self.content) - len(self.end_tag) + 1)
+        self.content.extend(chunk)
+        if self.content[start:].lower().find(self.end_tag) != -1:
+            self.done = True
+        elif len(self.content) >= self.max_bytes:
+            del self.content[self.max_bytes:]
+            self.done = True
+        return self.done
+
+
+def find_title(url, verify=True, timeout=(3.0, 5.0), max_bytes=655360):
+    """Return the title for the given URL.
+
+    Pages which aren't HTML are not downloaded, and at most ``max_bytes``
+    are read from the others. ``timeout`` is the connect and read timeout;
+    reading the page stops once the read timeout has passed.
+    """
+    requester = session or requests
+    response = requester.get(url, stream=True, verify=verify,
+                             headers=default_headers, timeout=timeout)
     try:
-        content = b''
-        for byte in response.iter_content(chunk_size=512):
-            content += byte
-            if b'</title>' in content or len(content) > max_bytes:
+        content_type = response.headers.get('Content-Type', '')
+        mime_type = content_type.split(';', 1)[0].strip().lower()
+        if mime_type and mime_type not in html_types:
+            return
+        deadline = time.time() + timeout[1]
+        scanner = TitleScanner(max_bytes)
+        for chunk in response.iter_content(chunk_size=4096):
+            if scanner.feed(chunk) or time.time() > deadline:
                 break
-        content = content.decode('utf-8', errors='ignore')
+        content = bytes(scanner.content).decode('utf-8', errors='ignore')
     finally:
         # need to close the connexion because we have not read all the data
         response.close()
 
+    return parse_title(content)
+
+
+def parse_title(content):
+    """Return the title of the HTML page ``content``, or None."""
     # Some cleanup that I don't really grok, but was in the original, so
     # we'll keep it (with the compiled regexes made global) for now.
     content = title_tag_data.sub(r'<\1title>', content)
@@ -9,10 +9,13 @@ https://sopel.chat
 """
 from __future__ import unicode_literals, absolute_import, print_function, division
 
+import contextlib
 import os
 import re
 import sys
 import tempfile
+import threading
+import time
 
 try:
     import ConfigParser
@@ -88,6 +91,54 @@ class MockSopelWrapper(object):
         return getattr(self.bot, attr)
 
 
+class MockClock(object):
+    """A clock for the ``clock`` argument of Sopel's caches, limiters and
+    histories, which only moves when ``now`` is set."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class MockWorkers(object):
+    """Runs what is submitted right away, on the calling thread."""
+    def submit(self, func, *args):
+        func(*args)
+        return True
+
+
+class MockBot(object):
+    """Just enough of a bot for the helpers that send through one.
+
+    Lines written are kept in ``written`` as ``(time, args, text)`` tuples,
+    and ``done`` is set once ``expected`` of them have been written. Errors
+    reported with :meth:`error` are kept in ``errors``."""
+    def __init__(self, expected=None):
+        self.config = MockConfig()
+        self.memory = sopel.tools.SopelMemory()
+        self.workers = MockWorkers()
+        self.written = []
+        self.batches = []
+        self.errors = []
+        self.done = threading.Event()
+        self.expected = expected
+
+    @contextlib.contextmanager
+    def batched_writes(self):
+        start = len(self.written)
+        yield
+        self.batches.append(len(self.written) - start)
+
+    def write(self, args, text=None):
+        self.written.append((time.time(), args, text))
+        if len(self.written) == self.expected:
+            self.done.set()
+
+    def error(self, trigger=None):
+        self.errors.append(trigger)
+
+
 def get_example_test(tested_func, msg, results, privmsg, admin,
                      owner, repeat, use_regexp, ignore=[]):
     """Get a function that calls tested_func with fake wrapper and trigger.
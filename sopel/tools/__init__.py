@@ -20,6 +20,7 @@ import re
 import threading
 import codecs
 import traceback
+import weakref
 from collections import defaultdict
 
 from sopel.tools._events import events  # NOQA
@@ -131,6 +132,7 @@ class Identifier(unicode):
     This case insensitivity includes the case convention conventions regarding
     ``[]``, ``{}``, ``|``, ``\\``, ``^`` and ``~`` described in RFC 2812.
     """
+    __slots__ = ('_lowered', '__weakref__')
 
     def __new__(cls, identifier):
         # According to RFC2812, identifiers have to be in the ASCII range.
@@ -142,6 +144,27 @@ class Identifier(unicode):
         s._lowered = Identifier._lower(identifier)
         return s
 
+    # Lowered name to the Identifier last interned with it.
+    _interned = weakref.WeakValueDictionary()
+
+    @classmethod
+    def intern(cls, identifier):
+        """Return a shared Identifier for ``identifier``.
+
+        As long as one is in use, interning the same name, with the same case,
+        returns the same Identifier rather than a new one, so that it only
+        takes up memory once however many places it's kept in.
+        """
+        lowered = Identifier._lower(identifier)
+        existing = cls._interned.get(lowered)
+        if existing is not None and unicode.__eq__(existing, identifier):
+            return existing
+        if not isinstance(identifier, cls):
+            identifier = cls(identifier)
+        # Keyed by the Identifier's own lowered name, so it isn't stored twice
+        cls._interned[identifier._lowered] = identifier
+        return identifier
+
     def lower(self):
         """Return the identifier converted to lower-case per RFC 2812."""
         return self._lowered
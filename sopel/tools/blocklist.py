@@ -0,0 +1,86 @@
+# coding=utf-8
+"""Compiled lists of blocked nicks and hosts."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import re
+import sys
+
+from sopel.logger import get_logger
+from sopel.tools import Identifier
+from sopel.tools.cache import LRUCache
+
+LOGGER = get_logger(__name__)
+
+if sys.version_info.major >= 3:
+    unicode = str
+
+_METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+
+
+class BlockList(object):
+    """A list of blocked nicks or hosts, compiled for fast lookups.
+
+    Each entry is a regex which must match the whole value, ignoring case, as
+    the ``nick_blocks`` and ``host_blocks`` settings have always been. A value
+    equal to an entry is blocked too; if ``identifiers`` is True, values are
+    compared to entries as :class:`sopel.tools.Identifier`\\s.
+
+    Entries without any regex syntax go into a set, and the others are
+    combined into a single regex. Entries which aren't valid regexes are
+    ignored, with a warning. Verdicts are memoised for up to ``cache_size``
+    values.
+    """
+    def __init__(self, entries, identifiers=False, cache_size=4096):
+        self._literal = set()
+        self._exact = set()
+        patterns = []
+        for entry in entries:
+            entry = entry.strip()
+            if not entry:
+                continue
+            self._literal.add(Identifier(entry) if identifiers else entry)
+            if not _METACHARACTERS.intersection(entry):
+                self._exact.add(entry.lower())
+                continue
+            try:
+                re.compile(entry)
+            except re.error as e:
+                LOGGER.warning('Ignoring invalid block %r: %s', entry, e)
+                continue
+            patterns.append(entry)
+        self._regexes = self._compile(patterns)
+        self._identifiers = identifiers
+        self._cache = LRUCache(cache_size)
+
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return []
+        combined = '|'.join('(?:{})'.format(pattern) for pattern in patterns)
+        try:
+            return [re.compile('(?:{})$'.format(combined), re.IGNORECASE)]
+        except re.error:
+            # Things like backreferences don't survive being combined.
+            return [re.compile('(?:{})$'.format(pattern), re.IGNORECASE)
+                    for pattern in patterns]
+
+    def __len__(self):
+        return len(self._literal)
+
+    def __contains__(self, value):
+        """Whether ``value`` is blocked."""
+        if not self._literal or value is None:
+            return False
+        # Identifiers compare IRC-insensitively, which the regexes don't.
+        value = unicode(value)
+        verdict = self._cache.get(value)
+        if verdict is None:
+            verdict = self._check(value)
+            self._cache.set(value, verdict)
+        return verdict
+
+    def _check(self, value):
+        literal = Identifier(value) if self._identifiers else value
+        if literal in self._literal or value.lower() in self._exact:
+            return True
+        return any(regex.match(value) for regex in self._regexes)
@@ -0,0 +1,138 @@
+# coding=utf-8
+"""A bounded, thread-safe cache."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import collections
+import threading
+
+from sopel.tools.throttle import monotonic
+
+_MISSING = object()
+
+
+class LRUCache(object):
+    """A mapping which keeps at most ``maxsize`` of its most recently used items.
+
+    Entries may also expire: ``ttl`` is the default number of seconds an
+    entry is kept, and can be overridden for each entry by :meth:`set`. A
+    ``ttl`` of None means entries never expire, and a ``maxsize`` of 0
+    disables the cache entirely.
+
+    Expired entries are dropped when they're looked up, and a couple of the
+    least recently used ones are checked on every :meth:`set`, so they don't
+    linger until the cache is full.
+
+    The cache counts its hits, misses and evictions; see :meth:`stats`.
+    """
+    def __init__(self, maxsize=128, ttl=None, clock=monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the value for ``key``, or ``default`` if it isn't cached."""
+        with self._lock:
+            try:
+                expires, value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            if expires is not None and expires <= self._clock():
+                self.misses += 1
+                return default
+            # Reinserting moves it to the most recently used end.
+            self._data[key] = (expires, value)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Cache ``value`` for ``key``, for ``ttl`` seconds if given."""
+        if not self.maxsize:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._store(key, value, ttl, self._clock())
+
+    def setdefault(self, key, default=None):
+        """Return the value for ``key``, caching ``default`` if there is none.
+
+        Unlike :meth:`get` followed by :meth:`set`, this is atomic. If the
+        cache is disabled, ``default`` is returned without being cached.
+        """
+        if not self.maxsize:
+            return default
+        with self._lock:
+            entry = self._data.pop(key, None)
+            now = self._clock()
+            if entry is not None and (entry[0] is None or entry[0] > now):
+                self._data[key] = entry
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            self._store(key, default, None, now)
+            return default
+
+    def _store(self, key, value, ttl, now):
+        # Must be called with the lock held, and key not in the cache.
+        ttl = self.ttl if ttl is None else ttl
+        expires = None if ttl is None else now + ttl
+        self._data[key] = (expires, value)
+        self._expire_oldest(now)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def _expire_oldest(self, now, count=2):
+        # A little at a time, so no single call pays for a long sweep.
+        for _ in range(count):
+            if not self._data:
+                return
+            key = next(iter(self._data))
+            expires = self._data[key][0]
+            if expires is None or expires > now:
+                return
+            del self._data[key]
+
+    def pop(self, key, default=None):
+        """Remove ``key`` from the cache, returning its value if present."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        """Remove every entry. The counters are kept."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        # A snapshot, so other threads can use the cache meanwhile.
+        with self._lock:
+            return iter(list(self._data))
+
+    def stats(self):
+        """Return a dict of the cache's size and counters."""
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
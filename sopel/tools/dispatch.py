@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Indexing of triggerable callables for fast dispatch.
+
+Rather than running every registered regular expression against every line
+from the server, callables are bucketed by the IRC event they respond to and,
+for ``@commands`` rules, by the literal command word. Only the rules that
+survive those prefilters have their regular expression evaluated.
+"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import heapq
+import re
+
+from sopel.tools import get_command_regexp
+
+PRIORITIES = ('high', 'medium', 'low')
+"""The priorities of callables, in the order in which they are dispatched."""
+
+# Only plain command words can be looked up by name. Anything else (including
+# commands which are themselves regular expressions) is always evaluated.
+_literal_command = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+class RuleIndex(object):
+    """An index of the rules in a ``Sopel._callables`` mapping.
+
+    ``callables`` maps each priority to an ordered mapping of compiled rules
+    to the list of callables using that rule. ``prefix`` is the configured
+    command prefix, which must be the one used when the callables were
+    cleaned by the loader.
+
+    The index is a snapshot; it must be rebuilt when callables are registered
+    or unregistered.
+    """
+    def __init__(self, callables, prefix):
+        self.source = callables
+        """The ``_callables`` mapping from which this index was built."""
+        self._events = {}
+        self._max_command_length = 0
+
+        command_patterns = {}
+        for priority in PRIORITIES:
+            for funcs in callables[priority].values():
+                for func in funcs:
+                    for command in getattr(func, 'commands', ()):
+                        if not _literal_command.match(command):
+                            continue
+                        pattern = get_command_regexp(prefix, command).pattern
+                        command_patterns[pattern] = command.lower()
+
+        # Each entry carries its position in the original scan order, so the
+        # generic and per-command buckets can be merged back into exactly the
+        # order a linear scan would have produced.
+        sequence = 0
+        for priority in PRIORITIES:
+            for regexp, funcs in callables[priority].items():
+                by_event = {}
+                for func in funcs:
+                    for event in func.event:
+                        event_funcs = by_event.setdefault(event, [])
+                        if func not in event_funcs:
+                            event_funcs.append(func)
+                command = command_patterns.get(regexp.pattern)
+                for event, event_funcs in by_event.items():
+                    generic, commands = self._events.setdefault(event,
+                                                                ([], {}))
+                    entry = (sequence, regexp, event_funcs)
+                    if command is None:
+                        generic.append(entry)
+                    else:
+                        commands.setdefault(command, []).append(entry)
+                if command is not None:
+                    self._max_command_length = max(self._max_command_length,
+                                                   len(command))
+                sequence += 1
+
+        # Matches the prefix the same way command rules do, capturing the
+        # word that follows it. See sopel.tools.get_command_regexp.
+        prefix = re.sub(r"(\s)", r"\\\1", prefix)
+        self._command_word = re.compile(r'(?:{})(\S+)'.format(prefix),
+                                        re.IGNORECASE | re.VERBOSE)
+
+    def handles(self, event):
+        """Whether any callable responds to ``event``."""
+        return event in self._events
+
+    def candidates(self, event, text):
+        """Yield ``(regexp, funcs)`` pairs which may match the given line.
+
+        Pairs are yielded in priority order, and ``funcs`` only contains the
+        callables which respond to ``event``.
+        """
+        try:
+            generic, commands = self._events[event]
+        except KeyError:
+            return
+
+        buckets = [generic]
+        if commands:
+            match = self._command_word.match(text)
+            if match:
+                word = match.group(1).lower()
+                # A command rule needs the command to run up to whitespace or
+                # the end of the line, so it can only be a suffix of the word
+                # following the prefix.
+                start = max(0, len(word) - self._max_command_length)
+                for i in range(start, len(word)):
+                    bucket = commands.get(word[i:])
+                    if bucket:
+                        buckets.append(bucket)
+
+        if len(buckets) == 1:
+            entries = generic
+        else:
+            entries = heapq.merge(*buckets)
+        for _, regexp, funcs in entries:
+            yield regexp, funcs
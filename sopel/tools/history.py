@@ -0,0 +1,129 @@
+# coding=utf-8
+"""A short history of what was said in each channel."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import collections
+import threading
+
+from sopel.tools.throttle import monotonic
+
+
+class _Channel(object):
+    __slots__ = ('lines', 'nicks')
+
+    def __init__(self, depth):
+        self.lines = collections.deque(maxlen=depth)
+        self.nicks = {}
+
+
+class LineHistory(object):
+    """The last ``depth`` lines said by each nick in each channel.
+
+    Lines are kept in fixed-size ring buffers, one for each nick in each
+    channel and one for the channel as a whole, so adding a line never grows
+    anything. Nicks who haven't said anything for ``idle_time`` seconds are
+    forgotten, as are channels nobody has spoken in; ``idle_time`` of 0 keeps
+    them until :meth:`clear`. A ``depth`` of 0 disables the history.
+
+    Lines matched by the ``ignore`` regex, such as commands, are not kept, so
+    they don't push out the lines worth looking back at.
+
+    Channel and nick keys should be :class:`sopel.tools.Identifier`\\s, as
+    they come from triggers, so lookups are case-insensitive. Private
+    messages are kept under the nick they came from, as their channel.
+    """
+    def __init__(self, depth=10, idle_time=86400, ignore=None,
+                 clock=monotonic):
+        self.depth = depth
+        self.idle_time = idle_time
+        self.ignore = ignore
+        self._clock = clock
+        self._channels = {}
+        # When each (channel, nick) last said something, least recent first
+        self._seen = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, channel, nick, line):
+        """Remember that ``nick`` said ``line`` in ``channel``."""
+        if not self.depth:
+            return
+        if self.ignore is not None and self.ignore.match(line):
+            return
+        now = self._clock()
+        with self._lock:
+            history = self._channels.get(channel)
+            if history is None:
+                history = self._channels[channel] = _Channel(self.depth)
+            lines = history.nicks.get(nick)
+            if lines is None:
+                lines = history.nicks[nick] = collections.deque(
+                    maxlen=self.depth)
+            lines.append(line)
+            history.lines.append((nick, line))
+            if self.idle_time:
+                # Reinserting moves it to the most recently active end.
+                self._seen.pop((channel, nick), None)
+                self._seen[(channel, nick)] = now
+                self._expire_oldest(now)
+
+    def _expire_oldest(self, now, count=2):
+        # A little at a time, so no single call pays for a long sweep.
+        for _ in range(count):
+            if not self._seen:
+                return
+            key = next(iter(self._seen))
+            if now - self._seen[key] < self.idle_time:
+                return
+            del self._seen[key]
+            channel, nick = key
+            history = self._channels.get(channel)
+            if history is None:
+                # Cleared since
+                continue
+            history.nicks.pop(nick, None)
+            if not history.nicks:
+                del self._channels[channel]
+
+    def lines(self, channel, nick):
+        """Return what ``nick`` said in ``channel``, oldest first."""
+        with self._lock:
+            history = self._channels.get(channel)
+            if history is None:
+                return []
+            return list(history.nicks.get(nick, ()))
+
+    def recent(self, channel, count=None):
+        """Return the last ``count`` lines said in ``channel``, oldest first.
+
+        Each line is a ``(nick, line)`` tuple. Without ``count``, every line
+        kept for the channel is returned."""
+        with self._lock:
+            history = self._channels.get(channel)
+            if history is None:
+                return []
+            lines = list(history.lines)
+        if count is not None:
+            lines = lines[-count:] if count > 0 else []
+        return lines
+
+    def nicks(self, channel):
+        """Return the nicks with lines kept for ``channel``."""
+        with self._lock:
+            history = self._channels.get(channel)
+            return list(history.nicks) if history else []
+
+    def clear(self, channel=None):
+        """Forget everything said in ``channel``, or in every channel."""
+        with self._lock:
+            if channel is None:
+                self._channels.clear()
+                self._seen.clear()
+            else:
+                # What's left in _seen for it is dropped as it expires.
+                self._channels.pop(channel, None)
+
+    def __len__(self):
+        """The number of (channel, nick) pairs with lines kept."""
+        with self._lock:
+            return sum(len(history.nicks)
+                       for history in self._channels.values())
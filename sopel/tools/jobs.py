@@ -1,8 +1,9 @@
 # coding=utf-8
 from __future__ import unicode_literals, absolute_import, print_function, division
 
-import copy
 import datetime
+import heapq
+import itertools
 import sys
 import threading
 import time
@@ -35,60 +36,129 @@ class released(object):
 class PriorityQueue(Queue.PriorityQueue):
     """A priority queue with a peek method."""
     def peek(self):
-        """Return a copy of the first element without removing it."""
+        """Return the first element without removing it.
+
+        The element is not copied, so it must not be changed in a way which
+        affects its ordering."""
         self.not_empty.acquire()
         try:
             while not self._qsize():
                 self.not_empty.wait()
-            # Return a copy to avoid corrupting the heap. This is important
-            # for thread safety if the object is mutable.
-            return copy.deepcopy(self.queue[0])
+            return self.queue[0]
         finally:
             self.not_empty.release()
 
 
 class JobScheduler(threading.Thread):
 
-    """Calls jobs assigned to it in steady intervals.
+    """Calls jobs assigned to it at the right time.
+
+    JobScheduler is a thread that keeps track of Jobs, and calls them when
+    they are due: every X seconds for repeating jobs, where X is a property of
+    the Job, and only once for jobs added with :meth:`call_later` or
+    :meth:`call_at`. It maintains jobs in a heap, where the next job to be
+    called is always the first item, and sleeps until that job is due or the
+    jobs change.
 
-    JobScheduler is a thread that keeps track of Jobs and calls them every
-    X seconds, where X is a property of the Job. It maintains jobs in a
-    priority queue, where the next job to be called is always the first
-    item.
-    Thread safety is maintained with a mutex that is released during long
-    operations, so methods add_job and clear_jobs can be safely called from
-    the main thread.
+    The jobs returned by :meth:`add_job`, :meth:`call_later` and
+    :meth:`call_at` can be cancelled with :meth:`cancel_job`. Cancelled jobs
+    are only marked as such, and dropped when they reach the top of the heap,
+    so cancelling is cheap. All methods can be safely called from any thread.
 
     """
 
     min_reaction_time = 30.0  # seconds
-    """How often should scheduler checks for changes in the job list."""
+    """The longest the scheduler sleeps before checking the time again."""
 
     def __init__(self, bot):
         """Requires bot as argument for logging."""
         threading.Thread.__init__(self)
         self.bot = bot
-        self._jobs = PriorityQueue()
-        # While PriorityQueue it self is thread safe, this mutex is needed
-        # to stop old jobs being put into new queue after clearing the
-        # queue.
-        self._mutex = threading.Lock()
-        # self.cleared is used for more fine grained locking.
-        self._cleared = False
+        # A heap of (next_time, sequence, job). The sequence keeps jobs due at
+        # the same time in the order they were added.
+        self._jobs = []
+        self._sequence = itertools.count()
+        self._cancelled = 0
+        # Repeating jobs which are out of the heap while they're being called.
+        self._running = set()
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        """The number of pending jobs."""
+        return len(self._jobs) - self._cancelled
+
+    def _push(self, job):
+        job.queued = True
+        heapq.heappush(self._jobs, (job.next_time, next(self._sequence), job))
+        self._cond.notify()
 
     def add_job(self, job):
-        """Add a Job to the current job queue."""
-        self._jobs.put(job)
+        """Add a Job to the current job queue, and return it."""
+        with self._cond:
+            job.cancelled = False
+            self._push(job)
+        return job
+
+    def call_later(self, delay, func, *args):
+        """Call ``func(bot, *args)`` once, in ``delay`` seconds.
+
+        Returns the :class:`Job`, which can be passed to :meth:`cancel_job`."""
+        return self.add_job(Job(delay, func, args, repeat=False))
+
+    def call_at(self, timestamp, func, *args):
+        """Call ``func(bot, *args)`` once, at the given unix ``timestamp``.
+
+        Returns the :class:`Job`, which can be passed to :meth:`cancel_job`."""
+        job = Job(0, func, args, repeat=False)
+        job.next_time = timestamp
+        return self.add_job(job)
+
+    def cancel_job(self, job):
+        """Cancel a job, so it won't be called (again).
+
+        Returns False if it was already cancelled, or was a one-shot job which
+        already ran."""
+        with self._cond:
+            if job.cancelled or not (job.queued or job.repeat):
+                return False
+            job.cancelled = True
+            if job.queued:
+                self._cancelled += 1
+                # Don't let cancelled jobs take up most of the heap.
+                if self._cancelled > 64 and self._cancelled * 2 > len(self._jobs):
+                    self._jobs = [entry for entry in self._jobs
+                                  if not entry[2].cancelled]
+                    heapq.heapify(self._jobs)
+                    self._cancelled = 0
+            return True
+
+    def remove_jobs(self, func):
+        """Cancel every job which calls ``func``."""
+        self._cancel_where(lambda job: job.func is func)
+
+    def remove_module_jobs(self, module_name):
+        """Cancel every job which calls a function from the given module."""
+        self._cancel_where(
+            lambda job: getattr(job.func, '__module__', None) == module_name)
+
+    def _cancel_where(self, predicate):
+        with self._cond:
+            jobs = [entry[2] for entry in self._jobs]
+            jobs.extend(self._running)
+            for job in jobs:
+                if predicate(job):
+                    self.cancel_job(job)
 
     def clear_jobs(self):
-        """Clear current Job queue and start fresh."""
-        if self._jobs.empty():
-            # Guards against getting stuck waiting for self._mutex when
-            # thread is waiting for self._jobs to not be empty.
-            return
-        with self._mutex:
-            self._cleared = True
-            self._jobs = PriorityQueue()
+        """Cancel every job and start fresh."""
+        with self._cond:
+            for _, _, job in self._jobs:
+                job.cancelled = True
+                job.queued = False
+            for job in self._running:
+                job.cancelled = True
+            self._jobs = []
+            self._cancelled = 0
 
     def run(self):
         """Run forever."""
@@ -107,39 +177,44 @@ class JobScheduler(threading.Thread):
 
     def _do_next_job(self):
         """Wait until there is a job and do it."""
-        with self._mutex:
+        with self._cond:
             # Wait until the next job should be executed.
-            # This has to be a loop, because signals stop time.sleep().
             while True:
-                job = self._jobs.peek()
-                difference = job.next_time - time.time()
-                duration = min(difference, self.min_reaction_time)
+                while self._jobs and self._jobs[0][2].cancelled:
+                    heapq.heappop(self._jobs)[2].queued = False
+                    self._cancelled -= 1
+                if not self._jobs:
+                    self._cond.wait(self.min_reaction_time)
+                    continue
+                duration = min(self._jobs[0][0] - time.time(),
+                               self.min_reaction_time)
                 if duration <= 0:
                     break
-                with released(self._mutex):
-                    time.sleep(duration)
-
-            self._cleared = False
-            job = self._jobs.get()
-            with released(self._mutex):
-                if job.func.thread:
-                    t = threading.Thread(
-                        target=self._call, args=(job.func,)
-                    )
-                    t.start()
-                else:
-                    self._call(job.func)
-                job.next()
-            # If jobs were cleared during the call, don't put an old job
-            # into the new job queue.
-            if not self._cleared:
-                self._jobs.put(job)
-
-    def _call(self, func):
+                self._cond.wait(duration)
+
+            job = heapq.heappop(self._jobs)[2]
+            job.queued = False
+            if job.repeat:
+                self._running.add(job)
+
+        if getattr(job.func, 'thread', True):
+            self.bot.workers.submit(self._call, job)
+        else:
+            self._call(job)
+
+        if job.repeat:
+            job.next()
+            with self._cond:
+                self._running.discard(job)
+                # If the job was cancelled during the call, don't put it back.
+                if not job.cancelled:
+                    self._push(job)
+
+    def _call(self, job):
         """Wrapper for collecting errors from modules."""
         # Sopel.bot.call is way too specialized to be used instead.
         try:
-            func(self.bot)
+            job.func(self.bot, *job.args)
         except Exception:
             self.bot.error()
 
@@ -167,17 +242,26 @@ class Job(object):
     calling the same function too many times at once.
     """
 
-    def __init__(self, interval, func):
+    def __init__(self, interval, func, args=(), repeat=True):
         """Initialize Job.
 
         Args:
-            interval: number of seconds between calls to func
-            func: function to be called
+            interval: number of seconds between calls to func, or before the
+                only call if repeat is False
+            func: function to be called, with the bot and args
+            args: extra arguments for func
+            repeat: whether to call func more than once
 
         """
         self.next_time = time.time() + interval
         self.interval = interval
         self.func = func
+        self.args = tuple(args)
+        self.repeat = repeat
+        self.cancelled = False
+        """Whether the job was cancelled."""
+        self.queued = False
+        """Whether the job is waiting in a scheduler's queue."""
 
     def next(self):
         """Update self.next_time with the assumption func was just called.
@@ -224,7 +308,7 @@ class Job(object):
             <Job(2013-06-14 11:01:36.884000, 20s, <function upper at 0x02386BF0>)>
 
         """
-        iso_time = str(datetime.fromtimestamp(self.next_time))
+        iso_time = str(datetime.datetime.fromtimestamp(self.next_time))
         return "<Job(%s, %ss, %s)>" % \
             (iso_time, self.interval, self.func)
 
@@ -0,0 +1,186 @@
+# coding=utf-8
+"""A queue for throttled messages to the server."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import collections
+import threading
+
+from sopel.tools.throttle import TokenBucket, monotonic
+
+
+class OutboundQueue(threading.Thread):
+    """Sends queued messages to the server at a safe pace.
+
+    Each target (channel or nick) gets a token bucket allowing a burst of
+    ``burst`` messages, refilled at ``rate`` messages per second. Longer
+    messages cost more, to account for the extra time the server takes to
+    process them. On top of that, every message sent by the queue is taken
+    from a server-wide bucket of ``server_burst`` messages refilled at
+    ``server_rate`` messages per second.
+
+    Targets with pending messages are served round-robin, so a long backlog
+    for one target does not hold up the others, and :meth:`put` never blocks.
+    A ``rate`` or ``server_rate`` of 0 or less turns that throttle off.
+    """
+    prune_interval = 60.0
+    """How often, in seconds, buckets of idle targets are thrown away."""
+    max_batch = 50
+    """How many messages which may be sent at once are written together."""
+
+    def __init__(self, bot, burst=4, rate=1.25, server_burst=20,
+                 server_rate=5.0):
+        threading.Thread.__init__(self, name='sopel-outbound')
+        self.daemon = True
+        self.bot = bot
+        self.burst = burst
+        self.rate = rate
+        self._server = (TokenBucket(server_burst, server_rate)
+                        if server_rate > 0 else None)
+        self._queues = collections.OrderedDict()
+        self._buckets = {}
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._sending = False
+        self._sent = 0
+        self._total_latency = 0.0
+        self._max_latency = 0.0
+        self._last_prune = monotonic()
+
+    def put(self, target, args, text=None):
+        """Queue a message for ``target``, to be sent with ``bot.write``.
+
+        ``args`` and ``text`` are the same as for :meth:`sopel.bot.Sopel.write`.
+        """
+        item = (monotonic(), self._cost(text), args, text)
+        with self._cond:
+            queue = self._queues.get(target)
+            if queue is None:
+                queue = self._queues[target] = collections.deque()
+            queue.append(item)
+            self._pending += 1
+            # Wakes up the sender, and anyone waiting in drain().
+            self._cond.notify_all()
+
+    def __len__(self):
+        return self._pending
+
+    def _cost(self, text):
+        # Like the 0.8s plus penalty for each 70 bytes over 40 that Sopel
+        # used to sleep between messages.
+        if not text:
+            return 1.0
+        return 1.0 + float(max(0, len(text) - 40)) / 70 * self.rate
+
+    def _bucket(self, target):
+        if self.rate <= 0:
+            return None
+        bucket = self._buckets.get(target)
+        if bucket is None:
+            bucket = self._buckets[target] = TokenBucket(self.burst,
+                                                         self.rate)
+        return bucket
+
+    def _prune(self):
+        now = monotonic()
+        if now - self._last_prune < self.prune_interval:
+            return
+        self._last_prune = now
+        for target in list(self._buckets):
+            if (target not in self._queues and
+                    self._buckets[target].is_full()):
+                del self._buckets[target]
+
+    def _next(self):
+        """Pop the next message which may be sent.
+
+        Returns the message (or None) and how long to wait before trying
+        again if there was none. A wait of None means there is nothing queued.
+        Must be called with the lock held.
+        """
+        wait = None
+        for target, queue in self._queues.items():
+            cost = queue[0][1]
+            bucket = self._bucket(target)
+            delay = bucket.delay(cost) if bucket else 0
+            if delay:
+                wait = delay if wait is None else min(wait, delay)
+                continue
+
+            if self._server is not None:
+                server_delay = self._server.delay()
+                if server_delay:
+                    return None, server_delay
+                self._server.consume()
+            if bucket is not None:
+                bucket.consume(cost)
+
+            item = queue.popleft()
+            # Move the target to the back of the line.
+            del self._queues[target]
+            if queue:
+                self._queues[target] = queue
+            self._pending -= 1
+            return item, None
+        return None, wait
+
+    def run(self):
+        while True:
+            with self._cond:
+                self._prune()
+                item, wait = self._next()
+                while item is None:
+                    self._cond.wait(wait)
+                    item, wait = self._next()
+                # Take along whatever else the throttles let through now.
+                items = [item]
+                while item is not None and len(items) < self.max_batch:
+                    item, _ = self._next()
+                    if item is not None:
+                        items.append(item)
+                self._sending = True
+            with self.bot.batched_writes():
+                for _, _, args, text in items:
+                    try:
+                        self.bot.write(args, text)
+                    except Exception:
+                        self.bot.error()
+            now = monotonic()
+            with self._cond:
+                self._sending = False
+                self._cond.notify_all()
+                for enqueued, _, _, _ in items:
+                    latency = now - enqueued
+                    self._sent += 1
+                    self._total_latency += latency
+                    self._max_latency = max(self._max_latency, latency)
+
+    def drain(self, timeout=None):
+        """Wait until every queued message has been sent.
+
+        Gives up after ``timeout`` seconds, if given. Returns whether the
+        queue was emptied."""
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while self._pending or self._sending:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return False
+                self._cond.wait(remaining)
+        return True
+
+    def stats(self):
+        """Return a dict with the queue length and send latency.
+
+        ``latency_avg`` and ``latency_max`` are in seconds, measured from the
+        time a message is queued to the time it is written to the server."""
+        with self._cond:
+            return {
+                'queued': self._pending,
+                'targets': len(self._queues),
+                'sent': self._sent,
+                'latency_avg': (self._total_latency / self._sent
+                                if self._sent else 0.0),
+                'latency_max': self._max_latency,
+            }
@@ -0,0 +1,117 @@
+# coding=utf-8
+"""Rate limits for triggered callables."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import collections
+import threading
+
+from sopel.tools.cache import LRUCache
+from sopel.tools.throttle import TokenBucket, monotonic
+
+SCOPES = ('user', 'channel', 'global')
+"""The scopes a callable can be limited in, as set by
+:func:`sopel.module.rate`."""
+
+Reservation = collections.namedtuple('Reservation',
+                                     'limited tokens period wait')
+"""What :meth:`RateLimiter.acquire` returns: ``limited`` is the scope whose
+limit was hit, or None if the call may go ahead; ``tokens`` is what was taken
+from which bucket. When a limit was hit, ``period`` is its rate in seconds,
+and ``wait`` how many seconds are left until the callable can be used
+again."""
+_UNLIMITED = Reservation(None, (), 0, 0)
+
+_ATTRIBUTES = {
+    'user': 'rate',
+    'channel': 'channel_rate',
+    'global': 'global_rate',
+}
+
+
+class RateLimiter(object):
+    """Token buckets limiting how often each callable can be used.
+
+    A callable with a rate of ``N`` seconds in a scope gets a bucket for each
+    user, channel, or for the whole bot, holding ``rate_burst`` tokens (1 by
+    default) and refilled at one token every ``N`` seconds. With a burst of 1,
+    that's the same one call every ``N`` seconds Sopel has always allowed.
+
+    :meth:`acquire` takes a token from every bucket which applies to a call
+    in one go, before the callable runs, so threads handling calls at the
+    same time can't all get through. Buckets are kept in an LRU cache of
+    ``maxsize`` entries, and dropped once they would have refilled.
+    """
+    def __init__(self, maxsize=10000, clock=monotonic):
+        self._clock = clock
+        self._buckets = LRUCache(maxsize, clock=clock)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = collections.Counter()
+        """Calls rejected so far, by scope."""
+        self.rejected_callables = collections.Counter()
+        """Calls rejected so far, by ``module.function`` name."""
+
+    @staticmethod
+    def limits(func):
+        """Return a list of ``(scope, period)`` for the limits on ``func``."""
+        limits = []
+        for scope in SCOPES:
+            period = getattr(func, _ATTRIBUTES[scope], 0)
+            if period > 0:
+                limits.append((scope, period))
+        return limits
+
+    def _bucket(self, func, scope, key, period):
+        # Must be called with the lock held.
+        burst = max(1, getattr(func, 'rate_burst', 1))
+        bucket = self._buckets.get((scope, key, func))
+        if bucket is None:
+            bucket = TokenBucket(burst, 1.0 / period, clock=self._clock)
+        # An idle bucket is full again after this long, the same as a new one.
+        self._buckets.set((scope, key, func), bucket, burst * period)
+        return bucket
+
+    def acquire(self, func, nick, channel, bot_nick, exempt=False):
+        """Reserve a use of ``func`` by ``nick`` in ``channel``.
+
+        ``channel`` is None for private messages, which have no channel limit,
+        and ``bot_nick`` keys the global limit. Returns a :data:`Reservation`,
+        to pass to :meth:`release` if the use shouldn't count after all.
+        Exempt calls always go through, but still count against the limits of
+        others.
+        """
+        limits = self.limits(func)
+        if not limits:
+            return _UNLIMITED
+        keys = {'user': nick, 'channel': channel, 'global': bot_nick}
+        with self._lock:
+            buckets = []
+            for scope, period in limits:
+                if keys[scope] is None:
+                    continue
+                bucket = self._bucket(func, scope, keys[scope], period)
+                wait = bucket.delay()
+                if not exempt and wait:
+                    self.rejected[scope] += 1
+                    self.rejected_callables[
+                        '%s.%s' % (func.__module__, func.__name__)] += 1
+                    return Reservation(scope, (), period, wait)
+                buckets.append(bucket)
+            tokens = tuple((bucket, bucket.drain()) for bucket in buckets)
+            self.allowed += 1
+        return Reservation(None, tokens, 0, 0)
+
+    def release(self, reservation):
+        """Give back the tokens taken by :meth:`acquire`."""
+        for bucket, tokens in reservation.tokens:
+            bucket.refund(tokens)
+
+    def stats(self):
+        """Return a dict of the counters and the number of buckets."""
+        with self._lock:
+            return {
+                'allowed': self.allowed,
+                'rejected': dict(self.rejected),
+                'rejected_callables': dict(self.rejected_callables),
+                'buckets': len(self._buckets),
+            }
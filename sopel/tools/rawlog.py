@@ -0,0 +1,138 @@
+# coding=utf-8
+"""A background writer for the raw traffic log."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import gzip
+import io
+import os
+import shutil
+import sys
+import threading
+import time
+
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+
+from sopel.tools import stderr
+
+if sys.version_info.major >= 3:
+    unicode = str
+
+_STOP = object()
+
+
+class RawLog(threading.Thread):
+    """Writes lines to the raw log from a background thread.
+
+    :meth:`log` only puts the line on a queue of up to ``queue_size`` lines;
+    the file is kept open, written to in batches, and flushed whenever the
+    queue runs empty. If the queue is full, the line is dropped rather than
+    holding up the caller, and counted in :attr:`dropped`.
+
+    The log is rotated once it reaches ``max_bytes``, and every ``interval``
+    seconds (either can be 0 to disable it). Rotated logs are renamed to
+    ``raw.log.1``, ``raw.log.2`` and so on, newest first, and only
+    ``backups`` of them are kept. With ``compress``, they are gzipped.
+    """
+    def __init__(self, directory, filename='raw.log', max_bytes=0,
+                 interval=0, backups=5, compress=False, queue_size=10000):
+        threading.Thread.__init__(self, name='sopel-rawlog')
+        self.daemon = True
+        self.directory = directory
+        self.filename = os.path.join(directory, filename)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backups = backups
+        self.compress = compress
+        self.dropped = 0
+        self._queue = Queue.Queue(max(0, queue_size))
+        self._file = None
+        self._size = 0
+        self._rotate_at = None
+
+    def log(self, prefix, line):
+        """Queue ``line`` to be written, after ``prefix`` and a timestamp."""
+        entry = prefix + unicode(time.time()) + '\t' + line.replace('\n', '')
+        try:
+            self._queue.put_nowait(entry)
+        except Queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout=5):
+        """Write out the queued lines, then close the log and stop."""
+        self._queue.put(_STOP)
+        self.join(timeout)
+
+    def _open(self):
+        if not os.path.isdir(self.directory):
+            try:
+                os.mkdir(self.directory)
+            except Exception as e:
+                stderr('There was a problem creating the logs directory.')
+                stderr('%s %s' % (str(e.__class__), str(e)))
+                stderr('Please fix this and then run Sopel again.')
+                os._exit(1)
+        self._file = io.open(self.filename, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        if self.interval:
+            self._rotate_at = time.time() + self.interval
+
+    def _backup_name(self, number):
+        name = '{}.{}'.format(self.filename, number)
+        return name + '.gz' if self.compress else name
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        if self.backups > 0:
+            for number in range(self.backups - 1, 0, -1):
+                source = self._backup_name(number)
+                if os.path.exists(source):
+                    os.rename(source, self._backup_name(number + 1))
+            if self.compress:
+                with open(self.filename, 'rb') as source:
+                    with gzip.open(self._backup_name(1), 'wb') as target:
+                        shutil.copyfileobj(source, target)
+                os.remove(self.filename)
+            else:
+                os.rename(self.filename, self._backup_name(1))
+        else:
+            os.remove(self.filename)
+        self._open()
+
+    def _should_rotate(self):
+        if self.max_bytes and self._size >= self.max_bytes:
+            return True
+        return self._rotate_at is not None and time.time() >= self._rotate_at
+
+    def _write(self, entry):
+        entry += '\n'
+        self._file.write(entry)
+        # Close enough for deciding when to rotate; most lines are ASCII.
+        self._size += len(entry)
+
+    def run(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                if self._file is None:
+                    self._open()
+                # Write whatever else is already waiting before flushing.
+                while entry is not _STOP:
+                    self._write(entry)
+                    try:
+                        entry = self._queue.get_nowait()
+                    except Queue.Empty:
+                        break
+                self._file.flush()
+                if self._should_rotate():
+                    self._rotate()
+            except (IOError, OSError) as e:
+                stderr('Could not write the raw log: %s' % e)
+            if entry is _STOP:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                return
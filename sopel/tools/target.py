@@ -2,15 +2,27 @@
 from __future__ import unicode_literals, absolute_import, print_function, division
 
 import functools
+
+try:
+    from collections.abc import Mapping, MutableMapping
+except ImportError:
+    from collections import Mapping, MutableMapping
+
 from sopel.tools import Identifier
 
+# Positions in the lists Channel keeps for each nick.
+_USER = 0
+_PRIVILEGES = 1
+
 
 @functools.total_ordering
 class User(object):
     """A representation of a user Sopel is aware of."""
+    __slots__ = ('nick', 'user', 'host', 'channels', 'account', 'away')
+
     def __init__(self, nick, user, host):
         assert isinstance(nick, Identifier)
-        self.nick = nick
+        self.nick = Identifier.intern(nick)
         """The user's nickname."""
         self.user = user
         """The user's local username."""
@@ -42,42 +54,123 @@ class User(object):
         return self.nick < other.nick
 
 
+class _UsersView(Mapping):
+    """The users in a channel, by nick."""
+    __slots__ = ('_members',)
+
+    def __init__(self, members):
+        self._members = members
+
+    def __getitem__(self, nick):
+        user = self._members[nick][_USER]
+        if user is None:
+            raise KeyError(nick)
+        return user
+
+    def __iter__(self):
+        return (nick for nick, member in self._members.items()
+                if member[_USER] is not None)
+
+    def __len__(self):
+        return sum(1 for member in self._members.values()
+                   if member[_USER] is not None)
+
+    def __contains__(self, nick):
+        member = self._members.get(nick)
+        return member is not None and member[_USER] is not None
+
+
+class _PrivilegesView(MutableMapping):
+    """The privileges of the nicks in a channel.
+
+    Deleting a nick removes them from the channel, as well as from ``users``
+    if given and that was the last channel they were known to be in."""
+    __slots__ = ('_channel', '_members', '_users')
+
+    def __init__(self, channel, users=None):
+        self._channel = channel
+        self._members = channel._members
+        self._users = users
+
+    def __getitem__(self, nick):
+        return self._members[nick][_PRIVILEGES]
+
+    def __setitem__(self, nick, privileges):
+        member = self._members.get(nick)
+        if member is None:
+            self._members[Identifier.intern(nick)] = [None, privileges]
+        else:
+            member[_PRIVILEGES] = privileges
+
+    def __delitem__(self, nick):
+        user = self._members[nick][_USER]
+        self._channel.clear_user(nick)
+        if self._users is not None and user is not None and not user.channels:
+            self._users.pop(user.nick, None)
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def __len__(self):
+        return len(self._members)
+
+    def __contains__(self, nick):
+        return nick in self._members
+
+
 @functools.total_ordering
 class Channel(object):
     """A representation of a channel Sopel is in."""
+    __slots__ = ('name', 'topic', '_members')
+
     def __init__(self, name):
         assert isinstance(name, Identifier)
-        self.name = name
+        self.name = Identifier.intern(name)
         """The name of the channel."""
-        self.users = {}
+        self.topic = ''
+        """The topic of the channel."""
+        # Nick to a [user, privileges] list, so each nick is only stored once.
+        # The user is None for nicks known from NAMES but not yet from WHO.
+        self._members = {}
+
+    @property
+    def users(self):
         """The users in the channel.
 
-        This maps username ``Identifier``\s to channel objects."""
-        self.privileges = {}
+        This maps username ``Identifier``\s to ``User`` objects."""
+        return _UsersView(self._members)
+
+    @property
+    def privileges(self):
         """The permissions of the users in the channel.
 
         This maps username ``Identifier``s to bitwise integer values. This can
         be compared to appropriate constants from ``sopel.module``."""
-        self.topic = ''
-        """The topic of the channel."""
+        return _PrivilegesView(self)
 
     def clear_user(self, nick):
-        user = self.users.pop(nick, None)
-        self.privileges.pop(nick, None)
-        if user != None:
-            user.channels.pop(self.name, None)
+        member = self._members.pop(nick, None)
+        if member is not None and member[_USER] is not None:
+            member[_USER].channels.pop(self.name, None)
 
-    def add_user(self, user):
+    def add_user(self, user, privileges=None):
+        """Add ``user`` to the channel.
+
+        Their privileges are set to ``privileges`` if given, and otherwise
+        kept if already known, or 0.
+        """
         assert isinstance(user, User)
-        self.users[user.nick] = user
-        self.privileges[user.nick] = 0
+        member = self._members.pop(user.nick, None)
+        if privileges is None:
+            privileges = member[_PRIVILEGES] if member else 0
+        # Reinserted under the user's own nick, so it's the one kept.
+        self._members[user.nick] = [user, privileges]
         user.channels[self.name] = self
 
     def rename_user(self, old, new):
-        if old in self.users:
-            self.users[new] = self.users.pop(old)
-        if old in self.privileges:
-            self.privileges[new] = self.privileges.pop(old)
+        member = self._members.pop(old, None)
+        if member is not None:
+            self._members[Identifier.intern(new)] = member
 
     def __eq__(self, other):
         if not isinstance(other, Channel):
@@ -88,3 +181,59 @@ class Channel(object):
         if not isinstance(other, Channel):
             return NotImplemented
         return self.name < other.name
+
+
+class PrivilegeMap(MutableMapping):
+    """The privileges in every channel, as ``bot.privileges`` has them.
+
+    This maps channel names to the :attr:`Channel.privileges` of the
+    :class:`Channel`\s in ``channels``, so there's only one copy of them.
+    Setting a channel's privileges replaces those of its nicks, adding the
+    channel if it's new; nicks left out keep their user, with no privileges.
+    Deleting a channel removes it from ``channels``, and deleting a nick
+    removes them from their channel. Users no longer in any channel after
+    either are removed from ``users``, if given.
+    """
+    __slots__ = ('_channels', '_users')
+
+    def __init__(self, channels, users=None):
+        self._channels = channels
+        self._users = users
+
+    def __getitem__(self, channel):
+        return _PrivilegesView(self._channels[channel], self._users)
+
+    def __setitem__(self, channel, privileges):
+        channel = Identifier(channel)
+        channel_obj = self._channels.get(channel)
+        if channel_obj is None:
+            channel_obj = self._channels[channel] = Channel(channel)
+        privileges = dict((Identifier(nick), value)
+                          for nick, value in privileges.items())
+        members = channel_obj._members
+        for nick in list(members):
+            if nick in privileges:
+                continue
+            if members[nick][_USER] is None:
+                del members[nick]
+            else:
+                members[nick][_PRIVILEGES] = 0
+        view = channel_obj.privileges
+        for nick, value in privileges.items():
+            view[nick] = value
+
+    def __delitem__(self, channel):
+        channel_obj = self._channels.pop(channel)
+        for user in channel_obj.users.values():
+            user.channels.pop(channel_obj.name, None)
+            if self._users is not None and not user.channels:
+                self._users.pop(user.nick, None)
+
+    def __iter__(self):
+        return iter(self._channels)
+
+    def __len__(self):
+        return len(self._channels)
+
+    def __contains__(self, channel):
+        return channel in self._channels
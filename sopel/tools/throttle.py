@@ -0,0 +1,87 @@
+# coding=utf-8
+"""Token buckets, for throttling things which happen too often."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+
+try:
+    monotonic = time.monotonic
+except AttributeError:
+    # Python 2
+    monotonic = time.time
+
+
+class TokenBucket(object):
+    """A thread-safe token bucket.
+
+    The bucket holds up to ``capacity`` tokens, and gains ``rate`` tokens per
+    second. Starting out full, it allows a burst of ``capacity`` tokens before
+    settling to ``rate``. Costs larger than the capacity are treated as a
+    full bucket, so they can always be paid eventually.
+    """
+    def __init__(self, capacity, rate, clock=monotonic):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self._updated)
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self):
+        """The number of tokens currently in the bucket."""
+        with self._lock:
+            self._refill(self._clock())
+            return self._tokens
+
+    def delay(self, cost=1):
+        """Return how many seconds until ``cost`` tokens are available."""
+        cost = min(cost, self.capacity)
+        with self._lock:
+            self._refill(self._clock())
+            missing = cost - self._tokens
+        if missing <= 0:
+            return 0.0
+        if self.rate <= 0:
+            return float('inf')
+        return missing / self.rate
+
+    def consume(self, cost=1):
+        """Take ``cost`` tokens if they are available.
+
+        Returns ``True`` if they were taken, and ``False`` (leaving the bucket
+        untouched) otherwise. Checking and taking is atomic."""
+        cost = min(cost, self.capacity)
+        with self._lock:
+            self._refill(self._clock())
+            if self._tokens < cost:
+                return False
+            self._tokens -= cost
+            return True
+
+    def drain(self, cost=1):
+        """Take up to ``cost`` tokens, however many there are.
+
+        Returns the number of tokens taken."""
+        cost = min(cost, self.capacity)
+        with self._lock:
+            self._refill(self._clock())
+            taken = min(cost, self._tokens)
+            self._tokens -= taken
+            return taken
+
+    def refund(self, tokens):
+        """Put back ``tokens`` taken earlier, up to the bucket's capacity."""
+        with self._lock:
+            self._refill(self._clock())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def is_full(self):
+        """Whether the bucket is full, meaning it has been idle a while."""
+        return self.tokens >= self.capacity
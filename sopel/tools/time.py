@@ -50,6 +50,13 @@ def validate_format(tformat):
     return tformat
 
 
+def _check_timezone(zone):
+    try:
+        return validate_timezone(zone)
+    except ValueError:
+        return None
+
+
 def get_timezone(db=None, config=None, zone=None, nick=None, channel=None):
     """Find, and return, the approriate timezone
 
@@ -76,27 +83,21 @@ def get_timezone(db=None, config=None, zone=None, nick=None, channel=None):
     This function relies on `pytz` being available. If it is not available,
     `None` will always be returned.
     """
-    def _check(zone):
-        try:
-            return validate_timezone(zone)
-        except ValueError:
-            return None
-
     if not pytz:
         return None
     tz = None
 
     if zone:
-        tz = _check(zone)
+        tz = _check_timezone(zone)
         if not tz:
-            tz = _check(
+            tz = _check_timezone(
                 db.get_nick_or_channel_value(zone, 'timezone'))
     if not tz and nick:
-        tz = _check(db.get_nick_value(nick, 'timezone'))
+        tz = _check_timezone(db.get_nick_value(nick, 'timezone'))
     if not tz and channel:
-        tz = _check(db.get_channel_value(channel, 'timezone'))
+        tz = _check_timezone(db.get_channel_value(channel, 'timezone'))
     if not tz and config and config.core.default_timezone:
-        tz = _check(config.core.default_timezone)
+        tz = _check_timezone(config.core.default_timezone)
     return tz
 
 
@@ -126,6 +127,35 @@ def format_time(db=None, config=None, zone=None, nick=None, channel=None,
             tformat = db.get_nick_value(nick, 'time_format')
         if not tformat and channel:
             tformat = db.get_channel_value(channel, 'time_format')
+    return _format(config, zone, tformat, time)
+
+
+def format_user_time(db, config=None, nick=None, channel=None, time=None):
+    """Return a formatted string of the given time for `nick` in `channel`.
+
+    This gives the same result as calling `get_timezone` with `nick` and
+    `channel` and then passing the zone to `format_time`, but the time zone
+    and format preferences of `nick` and of `channel` are each read in a single
+    query, rather than one query per setting."""
+    keys = ['timezone', 'time_format']
+    nick_values = channel_values = {}
+    if db and nick:
+        nick_values = db.get_nick_values(nick, keys)
+    if db and channel:
+        channel_values = db.get_channel_values(channel, keys)
+
+    zone = None
+    if pytz:
+        zone = (_check_timezone(nick_values.get('timezone')) or
+                _check_timezone(channel_values.get('timezone')))
+        if not zone and config and config.core.default_timezone:
+            zone = _check_timezone(config.core.default_timezone)
+    tformat = (nick_values.get('time_format') or
+               channel_values.get('time_format'))
+    return _format(config, zone, tformat, time)
+
+
+def _format(config, zone, tformat, time):
     if not tformat and config and config.core.default_time_format:
         tformat = config.core.default_time_format
     if not tformat:
@@ -0,0 +1,128 @@
+# coding=utf-8
+"""An index of URL callbacks by the hosts they handle."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import collections
+import re
+import sys
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+if sys.version_info.major >= 3:
+    unichr = chr
+
+# A host name spelled out in a pattern, ending where the path or port starts.
+# A single slash before it would make it part of the path.
+_HOST = re.compile(r'(?:^|//|\.)([a-z0-9-]+(?:\.[a-z0-9-]+)+)[/:]')
+
+
+def _hosts(parsed, text=''):
+    """Return the hosts one of which any match of ``parsed`` contains.
+
+    ``parsed`` is a sequence from :func:`sre_parse.parse`, and ``text`` the
+    literal text right before it, starting with a space if it may start in
+    the middle of a host name. Returns None if there is no such set of
+    hosts. Unescaped dots are taken to be literal, since that's how they're
+    used in URL patterns.
+    """
+    for op, av in list(parsed) + [(None, None)]:
+        if op == sre_parse.LITERAL:
+            text += unichr(av)
+            continue
+        if op == sre_parse.ANY:
+            text += '.'
+            continue
+        found = _HOST.search(text.lower())
+        if found:
+            return set([found.group(1)])
+
+        # The parser moves prefixes shared by all branches out of them, so
+        # the text so far goes on into groups.
+        hosts = None
+        if op == sre_parse.SUBPATTERN:
+            hosts = _hosts(av[-1], text)
+        elif op == sre_parse.BRANCH:
+            branches = [_hosts(branch, text) for branch in av[1]]
+            if all(branches):
+                hosts = set().union(*branches)
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0]:
+            hosts = _hosts(av[2], text)
+        if hosts:
+            return hosts
+        # Text after something optional, like "(www\.)?", starts a host name
+        # as far as we can tell; after anything else, it may not.
+        optional = op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+        text = '' if optional and not av[0] else ' '
+    return None
+
+
+def pattern_hosts(regex):
+    """Return the hosts one of which any URL matched by ``regex`` is on.
+
+    Returns None if they can't be worked out from the pattern, in which case
+    the pattern could match URLs on any host.
+    """
+    try:
+        return _hosts(sre_parse.parse(regex.pattern, regex.flags))
+    except Exception:
+        return None
+
+
+class URLRouter(object):
+    """Finds the callbacks for a URL, without trying every pattern on it.
+
+    ``callbacks`` maps compiled regexes to callables, like the
+    ``url_callbacks`` in the bot's memory. Each pattern is filed under the
+    hosts it spells out, such as ``youtube.com/`` or ``reddit\\.com/``, and
+    is only tried on URLs on those hosts or their subdomains. Patterns whose
+    hosts can't be worked out are tried on every URL.
+    """
+    def __init__(self, callbacks):
+        self.source = list(callbacks.items())
+        self._by_host = collections.defaultdict(list)
+        self._anywhere = []
+        for regex, function in self.source:
+            hosts = pattern_hosts(regex)
+            if hosts is None:
+                self._anywhere.append((regex, function))
+                continue
+            for host in hosts:
+                self._by_host[host].append((regex, function))
+
+    def is_current(self, callbacks):
+        """Whether this router was built from ``callbacks`` as they are now."""
+        if len(callbacks) != len(self.source):
+            return False
+        return all(callbacks.get(regex) is function
+                   for regex, function in self.source)
+
+    def candidates(self, url):
+        """Return the (regex, callable) pairs which may match ``url``."""
+        try:
+            host = (urlsplit(url).hostname or '').rstrip('.')
+        except ValueError:
+            return list(self._anywhere) + [
+                entry for entries in self._by_host.values()
+                for entry in entries]
+        found = list(self._anywhere)
+        labels = host.split('.')
+        for start in range(len(labels)):
+            found.extend(self._by_host.get('.'.join(labels[start:]), ()))
+        return found
+
+    def match(self, url):
+        """Return a list of (callable, match) for the patterns matching ``url``."""
+        matches = []
+        for regex, function in self.candidates(url):
+            match = regex.search(url)
+            if match:
+                matches.append((function, match))
+        return matches
@@ -0,0 +1,142 @@
+# coding=utf-8
+"""A bounded pool of worker threads for running triggered callables."""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+
+from sopel.logger import get_logger
+
+LOGGER = get_logger(__name__)
+
+OVERFLOW_POLICIES = ['drop', 'block', 'inline']
+"""What to do with a call submitted while the pool's queue is full.
+
+``drop`` discards the call, ``block`` waits for room in the queue, and
+``inline`` runs the call immediately in the submitting thread."""
+
+_STOP = object()
+
+
+class WorkerPool(object):
+    """A fixed number of threads consuming calls from a bounded queue.
+
+    A ``queue_size`` of 0 makes the queue unbounded, in which case the
+    overflow policy never applies.
+
+    The pool keeps a few counters, available through :meth:`stats`, which can
+    be used to size it: the current queue depth, how many calls were dropped
+    or run inline because the queue was full, and how long calls waited in
+    the queue before a worker picked them up.
+    """
+    def __init__(self, workers=10, queue_size=100, overflow='inline',
+                 name='sopel-worker'):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(
+                'Overflow policy must be in {}'.format(OVERFLOW_POLICIES))
+        self.workers = max(1, workers)
+        self.overflow = overflow
+        self.name = name
+        self._queue = Queue.Queue(max(0, queue_size))
+        self._threads = []
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._started = 0
+        self._completed = 0
+        self._dropped = 0
+        self._inline = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def start(self):
+        """Start the worker threads."""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._work,
+                name='{}-{}'.format(self.name, len(self._threads)))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        """Stop the worker threads once they're done with the queued calls."""
+        threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put((None, _STOP, ()))
+
+    def in_worker(self):
+        """Whether the current thread is one of the pool's workers.
+
+        A worker waiting on calls it submitted to its own pool can tie up
+        every worker, so such calls should be run inline instead."""
+        return threading.current_thread() in self._threads
+
+    def submit(self, func, *args):
+        """Schedule ``func(*args)`` to be called by a worker thread.
+
+        Returns ``False`` if the call was dropped because the queue was full,
+        and ``True`` otherwise.
+        """
+        with self._lock:
+            self._submitted += 1
+        task = (time.time(), func, args)
+        if self.overflow == 'block':
+            self._queue.put(task)
+            return True
+
+        try:
+            self._queue.put_nowait(task)
+        except Queue.Full:
+            if self.overflow == 'drop':
+                with self._lock:
+                    self._dropped += 1
+                LOGGER.warning('Worker queue full, dropping call to %s',
+                               getattr(func, '__name__', func))
+                return False
+            with self._lock:
+                self._inline += 1
+            func(*args)
+        return True
+
+    def _work(self):
+        while True:
+            enqueued, func, args = self._queue.get()
+            if func is _STOP:
+                self._queue.task_done()
+                return
+            wait = time.time() - enqueued
+            with self._lock:
+                self._started += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+            try:
+                func(*args)
+            except Exception:
+                LOGGER.exception('Unhandled error in worker thread')
+            finally:
+                with self._lock:
+                    self._completed += 1
+                self._queue.task_done()
+
+    def stats(self):
+        """Return a dict of the pool's counters.
+
+        ``wait_avg`` and ``wait_max`` are in seconds, and only account for
+        calls which went through the queue."""
+        with self._lock:
+            started = self._started
+            return {
+                'workers': len(self._threads),
+                'queue_depth': self._queue.qsize(),
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'dropped': self._dropped,
+                'inline': self._inline,
+                'wait_avg': self._total_wait / started if started else 0.0,
+                'wait_max': self._max_wait,
+            }
@@ -4,90 +4,284 @@ from __future__ import unicode_literals, absolute_import, print_function, divisi
 import re
 import sys
 import datetime
+import time
 
 import sopel.tools
+from sopel.tools.cache import LRUCache
 
 if sys.version_info.major >= 3:
     unicode = str
     basestring = str
 
 
+class PrivilegeMatcher(object):
+    """Decides whether users are the bot's owner or one of its admins.
+
+    The owner's and admins' hostmasks are compiled once: those without
+    wildcards go into a set, and the others into a single regex. Results are
+    then memoised for each nick, host and account, up to ``cache_size`` of
+    them.
+    """
+    def __init__(self, owner, owner_account, admins, admin_accounts,
+                 cache_size=1024):
+        self.owner_account = owner_account
+        self.admin_accounts = frozenset(admin_accounts)
+        self._owner = self._compile([] if owner_account else [owner])
+        self._admins = self._compile(admins)
+        self._cache = LRUCache(cache_size)
+
+    @staticmethod
+    def _compile(masks):
+        """Return a set of exact masks, and a regex for the others (or None).
+
+        Like :func:`sopel.tools.get_hostmask_regex`, matching ignores case."""
+        exact = set()
+        patterns = []
+        for mask in masks:
+            if not mask:
+                continue
+            if '*' in mask:
+                patterns.append(sopel.tools.get_hostmask_regex(mask).pattern)
+            else:
+                exact.add(mask.lower())
+        regex = None
+        if patterns:
+            regex = re.compile('|'.join('(?:{})'.format(pattern)
+                                        for pattern in patterns), re.I)
+        return exact, regex
+
+    @staticmethod
+    def _matches(compiled, candidates):
+        exact, regex = compiled
+        for candidate in candidates:
+            if candidate.lower() in exact:
+                return True
+            if regex is not None and regex.match(candidate):
+                return True
+        return False
+
+    def check(self, nick, host, account):
+        """Return whether the user is the owner, and whether it's an admin."""
+        key = (nick, host, account)
+        result = self._cache.get(key)
+        if result is not None:
+            return result
+
+        # Identifier.lower() is IRC-specific, so use plain strings.
+        nick = unicode(nick or '')
+        candidates = (nick, '@'.join((nick, host or '')))
+        if self.owner_account:
+            owner = self.owner_account == account
+        else:
+            owner = self._matches(self._owner, candidates)
+        admin = (
+            owner or
+            account in self.admin_accounts or
+            self._matches(self._admins, candidates)
+        )
+        result = (owner, admin)
+        self._cache.set(key, result)
+        return result
+
+
+def _raw_option(config, name):
+    if config.parser.has_option('core', name):
+        return config.parser.get('core', name)
+    return None
+
+
+def get_privilege_matcher(config):
+    """Return the :class:`PrivilegeMatcher` for the current ``config``.
+
+    It is built on first use, and rebuilt whenever the owner or admin settings
+    have changed since."""
+    key = tuple(_raw_option(config, name) for name in
+                ('owner', 'owner_account', 'admins', 'admin_accounts'))
+    matcher = getattr(config, '_privilege_matcher', None)
+    if matcher is None or matcher[0] != key:
+        core = config.core
+        matcher = (key, PrivilegeMatcher(core.owner, core.owner_account,
+                                         core.admins, core.admin_accounts))
+        config._privilege_matcher = matcher
+    return matcher[1]
+
+
+_UNSET = object()
+
+
 class PreTrigger(object):
     """A parsed message from the server, which has not been matched against
-    any rules."""
+    any rules.
+
+    Only the event and its arguments are parsed up front. The tags, time,
+    nick, user, host and sender are parsed the first time they're used, since
+    most lines (e.g. numerics and PINGs) never need them."""
     component_regex = re.compile(r'([^!]*)!?([^@]*)@?(.*)')
     intent_regex = re.compile('\x01(\\S+) ?(.*)\x01')
 
+    __slots__ = ('line', 'hostmask', 'event', 'args', 'text', '_own_nick',
+                 '_tagstring', '_received', '_intent', '_tags', '_time',
+                 '_nick', '_user', '_host', '_sender')
+
     def __init__(self, own_nick, line):
         """own_nick is the bot's nick, needed to correctly parse sender.
         line is the full line from the server."""
         line = line.strip('\r')
         self.line = line
+        self._own_nick = own_nick
+        self._received = time.time()
+        self._tags = None
+        self._time = None
+        self._nick = _UNSET
+        self._user = _UNSET
+        self._host = _UNSET
+        self._sender = _UNSET
+        self._intent = None
 
         # Break off IRCv3 message tags, if present
-        self.tags = {}
+        self._tagstring = None
         if line.startswith('@'):
-            tagstring, line = line.split(' ', 1)
-            for tag in tagstring[1:].split(';'):
-                tag = tag.split('=', 1)
-                if len(tag) > 1:
-                    self.tags[tag[0]] = tag[1]
-                else:
-                    self.tags[tag[0]] = None
-
-        self.time = datetime.datetime.utcnow()
-        if 'time' in self.tags:
-            try:
-                self.time = datetime.datetime.strptime(self.tags['time'], '%Y-%m-%dT%H:%M:%S.%fZ')
-            except ValueError:
-                pass  # Server isn't conforming to spec, ignore the server-time
-
-        # TODO note what this is doing and why
+            self._tagstring, line = line.split(' ', 1)
+
+        # Break off the source of the message, if present
         if line.startswith(':'):
             self.hostmask, line = line[1:].split(' ', 1)
         else:
             self.hostmask = None
 
-        # TODO note what this is doing and why
+        # The last argument may contain spaces, if it's preceded by a colon
         if ' :' in line:
             argstr, text = line.split(' :', 1)
-            self.args = argstr.split(' ')
-            self.args.append(text)
-        else:
-            self.args = line.split(' ')
-            self.text = self.args[-1]
-
-        self.event = self.args[0]
-        self.args = self.args[1:]
-        components = PreTrigger.component_regex.match(self.hostmask or '').groups()
-        self.nick, self.user, self.host = components
-        self.nick = sopel.tools.Identifier(self.nick)
-
-        # If we have arguments, the first one is the sender
-        # Unless it's a QUIT event
-        if self.args and self.event != 'QUIT':
-            target = sopel.tools.Identifier(self.args[0])
+            args = argstr.split(' ')
+            args.append(text)
         else:
-            target = None
+            args = line.split(' ')
+            self.text = args[-1]
 
-        # Unless we're messaging the bot directly, in which case that second
-        # arg will be our bot's name.
-        if target and target.lower() == own_nick.lower():
-            target = self.nick
-        self.sender = target
+        self.event = args[0]
+        self.args = args[1:]
 
-        # Parse CTCP into a form consistent with IRCv3 intents
-        if self.event == 'PRIVMSG' or self.event == 'NOTICE':
+        # Parse CTCP into a form consistent with IRCv3 intents. This changes
+        # the arguments, so it can't wait.
+        if ((self.event == 'PRIVMSG' or self.event == 'NOTICE') and
+                self.args[-1].startswith('\x01')):
             intent_match = PreTrigger.intent_regex.match(self.args[-1])
             if intent_match:
                 intent, message = intent_match.groups()
-                self.tags['intent'] = intent
+                self._intent = intent
                 self.args[-1] = message or ''
 
-        # Populate account from extended-join messages
-        if self.event == 'JOIN' and len(self.args) == 3:
-            # Account is the second arg `...JOIN #Sopel account :realname`
-            self.tags['account'] = self.args[1]
+    @property
+    def tags(self):
+        """A dict of the IRCv3 message tags on the message."""
+        if self._tags is None:
+            tags = {}
+            if self._tagstring is not None:
+                for tag in self._tagstring[1:].split(';'):
+                    tag = tag.split('=', 1)
+                    if len(tag) > 1:
+                        tags[tag[0]] = tag[1]
+                    else:
+                        tags[tag[0]] = None
+            if self._intent is not None:
+                tags['intent'] = self._intent
+            # Populate account from extended-join messages
+            if self.event == 'JOIN' and len(self.args) == 3:
+                # Account is the second arg `...JOIN #Sopel account :realname`
+                tags['account'] = self.args[1]
+            self._tags = tags
+        return self._tags
+
+    @tags.setter
+    def tags(self, value):
+        self._tags = value
+
+    @property
+    def time(self):
+        """When the server received the message, or if it doesn't support
+        server-time, when Sopel did."""
+        if self._time is None:
+            servertime = self.tags.get('time')
+            if servertime:
+                try:
+                    self._time = datetime.datetime.strptime(
+                        servertime, '%Y-%m-%dT%H:%M:%S.%fZ')
+                except ValueError:
+                    pass  # Server isn't conforming to spec, ignore the server-time
+            if self._time is None:
+                self._time = datetime.datetime.utcfromtimestamp(self._received)
+        return self._time
+
+    @time.setter
+    def time(self, value):
+        self._time = value
+
+    def _parse_hostmask(self):
+        components = PreTrigger.component_regex.match(self.hostmask or '')
+        nick, user, host = components.groups()
+        # Leave alone whatever was already set.
+        if self._nick is _UNSET:
+            self._nick = sopel.tools.Identifier(nick)
+        if self._user is _UNSET:
+            self._user = user
+        if self._host is _UNSET:
+            self._host = host
+
+    @property
+    def nick(self):
+        """The nick which sent the message."""
+        if self._nick is _UNSET:
+            self._parse_hostmask()
+        return self._nick
+
+    @nick.setter
+    def nick(self, value):
+        self._nick = value
+
+    @property
+    def user(self):
+        """The username of the sender of the message."""
+        if self._user is _UNSET:
+            self._parse_hostmask()
+        return self._user
+
+    @user.setter
+    def user(self, value):
+        self._user = value
+
+    @property
+    def host(self):
+        """The host of the sender of the message."""
+        if self._host is _UNSET:
+            self._parse_hostmask()
+        return self._host
+
+    @host.setter
+    def host(self, value):
+        self._host = value
+
+    @property
+    def sender(self):
+        """The channel the message was sent to, or the nick which sent it if
+        it was sent to the bot directly."""
+        if self._sender is _UNSET:
+            # If we have arguments, the first one is the sender
+            # Unless it's a QUIT event
+            if self.args and self.event != 'QUIT':
+                target = sopel.tools.Identifier(self.args[0])
+            else:
+                target = None
+
+            # Unless we're messaging the bot directly, in which case that
+            # second arg will be our bot's name.
+            if target and target.lower() == self._own_nick.lower():
+                target = self.nick
+            self._sender = target
+        return self._sender
+
+    @sender.setter
+    def sender(self, value):
+        self._sender = value
 
 
 class Trigger(unicode):
@@ -167,21 +361,7 @@ class Trigger(unicode):
         self._match = match
         self._is_privmsg = message.sender and message.sender.is_nick()
 
-        def match_host_or_nick(pattern):
-            pattern = sopel.tools.get_hostmask_regex(pattern)
-            return bool(
-                pattern.match(self.nick) or
-                pattern.match('@'.join((self.nick, self.host)))
-            )
-
-        if config.core.owner_account:
-            self._owner = config.core.owner_account == self.account
-        else:
-            self._owner = match_host_or_nick(config.core.owner)
-        self._admin = (
-            self._owner or
-            self.account in config.core.admin_accounts or
-            any(match_host_or_nick(item) for item in config.core.admins)
-        )
+        self._owner, self._admin = get_privilege_matcher(config).check(
+            self.nick, self.host, self.account)
 
         return self
@@ -0,0 +1,41 @@
+# coding=utf-8
+"""Tests for sopel.tools.blocklist"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+from sopel.tools import Identifier
+from sopel.tools.blocklist import BlockList
+
+
+def test_nick_blocks():
+    blocks = BlockList(['Spammer', ' ', 'bad.*bot', 'Evil[1]'],
+                       identifiers=True)
+    assert len(blocks) == 3
+    assert Identifier('spammer') in blocks
+    assert 'SPAMMER' in blocks
+    assert 'BadBot' in blocks
+    assert 'bad_old_bot' in blocks
+    assert 'notbadbot' not in blocks
+    # Regex matching, and plain IRC-insensitive comparison, both apply
+    assert 'Evil1' in blocks
+    assert 'evil{1}' in blocks
+    assert 'Evil' not in blocks
+    assert None not in blocks
+
+
+def test_host_blocks():
+    blocks = BlockList(['example.com', r'.*\.spam\.net', '(bad', r'(a)\1'])
+    assert 'example.com' in blocks
+    assert 'EXAMPLE.COM' in blocks
+    assert 'exampleXcom' in blocks
+    assert 'foo.spam.net' in blocks
+    assert 'spam.net' not in blocks
+    # Invalid regexes are ignored, but still compared literally
+    assert '(bad' in blocks
+    assert 'bad' not in blocks
+    assert 'aa' in blocks
+
+
+def test_empty():
+    blocks = BlockList([])
+    assert len(blocks) == 0
+    assert 'anything' not in blocks
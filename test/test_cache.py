@@ -0,0 +1,77 @@
+# coding=utf-8
+"""Tests for sopel.tools.cache"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import pytest
+
+from sopel.test_tools import MockClock
+from sopel.tools.cache import LRUCache
+
+
+def test_lru_eviction():
+    cache = LRUCache(2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    # 'b' was the least recently used
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 3,
+                             'misses': 1, 'evictions': 1}
+
+
+def test_lru_ttl():
+    clock = MockClock()
+    cache = LRUCache(10, ttl=10, clock=clock)
+    cache.set('a', 1)
+    cache.set('b', 2, ttl=60)
+    clock.now = 30
+    assert cache.get('a', 'gone') == 'gone'
+    assert cache.get('b') == 2
+    assert len(cache) == 1
+
+
+def test_lru_disabled():
+    cache = LRUCache(0)
+    cache.set('a', 1)
+    assert cache.get('a') is None
+    assert cache.pop('a') is None
+
+
+def test_lru_setdefault():
+    clock = MockClock()
+    cache = LRUCache(10, ttl=10, clock=clock)
+    times = cache.setdefault('nick', {})
+    times['func'] = 1
+    assert cache.setdefault('nick', {}) is times
+    clock.now = 30
+    assert cache.setdefault('nick', {}) == {}
+    assert LRUCache(0).setdefault('nick', 'x') == 'x'
+
+
+def test_lru_expires_while_setting():
+    clock = MockClock()
+    cache = LRUCache(100, ttl=10, clock=clock)
+    for number in range(4):
+        cache.set(number, number)
+    clock.now = 30
+    # Each set drops a couple of the oldest expired entries
+    cache.set('a', 1)
+    assert len(cache) == 3
+    cache.set('b', 2)
+    assert len(cache) == 2
+    assert cache.evictions == 0
+
+
+def test_lru_mapping_access():
+    cache = LRUCache(maxsize=10)
+    cache.set('a', None)
+    cache.set('b', 2)
+    assert cache['a'] is None
+    assert 'a' in cache
+    assert 'c' not in cache
+    with pytest.raises(KeyError):
+        cache['c']
+    assert sorted(cache) == ['a', 'b']
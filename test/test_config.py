@@ -34,3 +34,16 @@ class ConfigFunctionalTest(unittest.TestCase):
     def test_validated_string_when_none(self):
         self.config.fake.attr = None
         self.assertEquals(self.config.fake.attr, None)
+
+    def test_connection_backend(self):
+        from sopel.config import core_section
+        self.config.core.connection_backend = 'asyncio'
+        has_asyncio = core_section._HAS_ASYNCIO
+        try:
+            core_section._HAS_ASYNCIO = True
+            self.assertEqual(self.config.core.connection_backend, 'asyncio')
+            core_section._HAS_ASYNCIO = False
+            with self.assertRaises(ValueError):
+                self.config.core.connection_backend
+        finally:
+            core_section._HAS_ASYNCIO = has_asyncio
@@ -12,6 +12,7 @@ import os
 import sqlite3
 import sys
 import tempfile
+import threading
 
 import pytest
 
@@ -38,7 +39,8 @@ def db():
     config.core.db_filename = db_filename
     db = SopelDB(config)
     # TODO add tests to ensure db creation works properly, too.
-    return db
+    yield db
+    db.close()
 
 
 def teardown_function(function):
@@ -255,3 +257,116 @@ def test_get_preferred_value(db):
     names = ['asdf', '#asdf']
     assert db.get_preferred_value(names, 'qwer') == 'poiu'
     assert db.get_preferred_value(names, 'lkjh') == '1234'
+
+
+def test_connection_reuse(db):
+    assert db._connection() is db._connection()
+    other = []
+    thread = threading.Thread(target=lambda: other.append(db._connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not db._connection()
+
+    # connect() still hands out connections the caller can close
+    conn = db.connect()
+    conn.close()
+    db.set_nick_value('Embolalia', 'key', 'value')
+    assert db.get_nick_value('Embolalia', 'key') == 'value'
+
+
+def test_journal_mode(db):
+    mode = db.execute('PRAGMA journal_mode').fetchone()[0]
+    assert mode.upper() == 'WAL'
+
+
+def test_nick_values(db):
+    db.set_nick_values('Embolalia', {'one': 1, 'two': [2], 'three': 'three'})
+    assert db.get_nick_value('embolalia', 'two') == [2]
+    assert db.get_nick_values('EMBOLALIA', ['one', 'three', 'four']) == {
+        'one': 1, 'three': 'three', 'four': None}
+    assert db.get_nick_values('Embolalia', []) == {}
+    assert db.get_nick_values('nobody', ['one']) == {'one': None}
+
+
+def test_channel_values(db):
+    db.set_channel_values('#Sopel', {'one': 1, 'two': {'2': 2}})
+    assert db.get_channel_value('#sopel', 'one') == 1
+    assert db.get_channel_values('#SOPEL', ['two', 'three']) == {
+        'two': {'2': 2}, 'three': None}
+
+
+def test_write_behind(db):
+    db.enable_write_behind('seen')
+    db.set_nick_value('Embolalia', 'seen', 1)
+    db.set_nick_values('Embolalia', {'seen': 2, 'other': 'direct'})
+
+    def stored(key):
+        return db.execute(
+            'SELECT value FROM nick_values JOIN nicknames '
+            'ON nick_values.nick_id = nicknames.nick_id '
+            'WHERE slug = ? AND key = ?', ['embolalia', key]).fetchone()
+
+    # Unbuffered keys are written right away, buffered ones are not...
+    assert stored('other') is not None
+    assert stored('seen') is None
+    # ...but can still be read back
+    assert db.get_nick_value('Embolalia', 'seen') == 2
+    assert db.get_nick_values('embolalia', ['seen', 'other']) == {
+        'seen': 2, 'other': 'direct'}
+
+    db.flush()
+    assert stored('seen') is not None
+    assert db.get_nick_value('Embolalia', 'seen') == 2
+
+
+def test_write_behind_delete(db):
+    db.enable_write_behind('seen')
+    db.set_nick_value('Embolalia', 'seen', 1)
+    db.delete_nick_group('Embolalia')
+    assert db.get_nick_value('Embolalia', 'seen') is None
+
+
+def test_cache(db):
+    db.set_nick_value('Embolalia', 'foo', 'bar')
+    db.set_channel_value('#sopel', 'foo', 'baz')
+    assert db.get_nick_value('Embolalia', 'foo') == 'bar'
+    assert db.get_channel_value('#sopel', 'foo') == 'baz'
+
+    hits = db.cache_stats()['values']['hits']
+    assert db.get_nick_value('EMBOLALIA', 'foo') == 'bar'
+    assert db.get_nick_values('embolalia', ['foo']) == {'foo': 'bar'}
+    assert db.get_channel_values('#SOPEL', ['foo']) == {'foo': 'baz'}
+    assert db.cache_stats()['values']['hits'] == hits + 3
+
+    # Writes through the API are seen right away
+    db.set_nick_values('Embolalia', {'foo': 'spam'})
+    db.set_channel_values('#sopel', {'foo': 'eggs'})
+    assert db.get_nick_value('Embolalia', 'foo') == 'spam'
+    assert db.get_channel_value('#sopel', 'foo') == 'eggs'
+
+
+def test_cache_aliases(db):
+    # Unknown nicks are cached too, and must be forgotten once they exist
+    assert db.get_nick_value('Embo', 'foo') is None
+    db.set_nick_value('Embolalia', 'foo', 'bar')
+    db.alias_nick('Embolalia', 'Embo')
+    assert db.get_nick_value('Embo', 'foo') == 'bar'
+
+    db.unalias_nick('Embo')
+    assert db.get_nick_value('Embo', 'foo') is None
+
+    db.set_nick_value('Embo', 'foo', 'baz')
+    db.merge_nick_groups('Embolalia', 'Embo')
+    assert db.get_nick_value('Embo', 'foo') == 'bar'
+
+    db.delete_nick_group('Embo')
+    assert db.get_nick_value('Embolalia', 'foo') is None
+    with pytest.raises(ValueError):
+        db.get_nick_id('Embolalia', create=False)
+
+
+def test_executemany(db):
+    db.execute('CREATE TABLE things (id INTEGER PRIMARY KEY, name STRING)')
+    db.executemany('INSERT INTO things (name) VALUES (?)',
+                   [('spam',), ('eggs',)])
+    assert db.execute('SELECT COUNT(*) FROM things').fetchone()[0] == 2
@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Tests for the dispatch rule index"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import collections
+
+import pytest
+
+from sopel import loader
+from sopel.test_tools import MockConfig
+from sopel.tools.dispatch import RuleIndex, PRIORITIES
+
+
+@pytest.fixture
+def config():
+    return MockConfig()
+
+
+def make_callables(config, *funcs):
+    callables = dict((priority, collections.defaultdict(list))
+                     for priority in PRIORITIES)
+    for func in funcs:
+        loader.clean_callable(func, config)
+        for rule in func.rule:
+            callables[func.priority][rule].append(func)
+    return callables
+
+
+def linear_scan(callables, event, text):
+    """The behavior the index must reproduce."""
+    for priority in PRIORITIES:
+        for regexp, funcs in callables[priority].items():
+            if not regexp.match(text):
+                continue
+            for func in funcs:
+                if event in func.event:
+                    yield func
+
+
+def indexed_scan(index, event, text):
+    for regexp, funcs in index.candidates(event, text):
+        if regexp.match(text):
+            for func in funcs:
+                yield func
+
+
+def test_commands_and_rules_keep_priority_order(config):
+    def low_rule(bot, trigger):
+        pass
+    low_rule.rule = '.*'
+    low_rule.priority = 'low'
+
+    def hello(bot, trigger):
+        pass
+    hello.commands = ['hello', 'hi']
+
+    def high_hello(bot, trigger):
+        pass
+    high_hello.commands = ['hello']
+    high_hello.priority = 'high'
+
+    def other(bot, trigger):
+        pass
+    other.commands = ['other']
+
+    def regex_command(bot, trigger):
+        pass
+    regex_command.commands = ['hel+o']
+
+    callables = make_callables(config, low_rule, hello, high_hello, other,
+                               regex_command)
+    index = RuleIndex(callables, config.core.prefix)
+
+    for text in ['.hello', '.HeLLo world', '.hi', '.other', '.hellllo',
+                 'hello', '. hello', '.hellothere', '']:
+        expected = list(linear_scan(callables, 'PRIVMSG', text))
+        assert list(indexed_scan(index, 'PRIVMSG', text)) == expected
+
+    assert list(indexed_scan(index, 'PRIVMSG', '.hello')) == [
+        high_hello, hello, regex_command, low_rule]
+
+
+def test_event_buckets(config):
+    def on_join(bot, trigger):
+        pass
+    on_join.rule = '.*'
+    on_join.event = ['JOIN', 'PART']
+
+    def on_message(bot, trigger):
+        pass
+    on_message.rule = '.*'
+
+    callables = make_callables(config, on_join, on_message)
+    index = RuleIndex(callables, config.core.prefix)
+
+    assert list(indexed_scan(index, 'JOIN', '#sopel')) == [on_join]
+    assert list(indexed_scan(index, 'PRIVMSG', 'hi')) == [on_message]
+    assert list(index.candidates('PING', 'irc.example.net')) == []
+
+
+def test_prefix_with_alternatives(config):
+    config.core.prefix = r'\.|!'
+
+    def hello(bot, trigger):
+        pass
+    hello.commands = ['hello']
+
+    callables = make_callables(config, hello)
+    index = RuleIndex(callables, config.core.prefix)
+
+    assert list(indexed_scan(index, 'PRIVMSG', '!hello')) == [hello]
+    assert list(indexed_scan(index, 'PRIVMSG', '.hello you')) == [hello]
+    assert list(indexed_scan(index, 'PRIVMSG', '?hello')) == []
@@ -0,0 +1,87 @@
+# coding=utf-8
+"""Tests for sopel.tools.history"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import re
+
+from sopel.test_tools import MockClock
+from sopel.tools import Identifier
+from sopel.tools.history import LineHistory
+
+
+def test_history():
+    history = LineHistory(depth=3)
+    channel = Identifier('#Sopel')
+    for number in range(5):
+        history.add(channel, Identifier('Alice'), 'alice %d' % number)
+    history.add(channel, Identifier('Bob'), 'bob')
+
+    assert history.lines(Identifier('#sopel'), Identifier('ALICE')) == [
+        'alice 2', 'alice 3', 'alice 4']
+    assert history.lines(channel, Identifier('Carol')) == []
+    assert history.lines(Identifier('#other'), Identifier('Bob')) == []
+    assert history.recent(channel, 2) == [('Alice', 'alice 4'), ('Bob', 'bob')]
+    assert len(history.recent(channel)) == 3
+    assert history.recent(channel, 0) == []
+    assert sorted(history.nicks(channel)) == ['Alice', 'Bob']
+    assert len(history) == 2
+
+    history.clear(channel)
+    assert len(history) == 0
+
+
+def test_history_idle():
+    clock = MockClock()
+    history = LineHistory(depth=10, idle_time=100, clock=clock)
+    history.add(Identifier('#a'), Identifier('Alice'), 'hello')
+    history.add(Identifier('#b'), Identifier('Bob'), 'hello')
+    clock.now = 60
+    history.add(Identifier('#b'), Identifier('Bob'), 'still here')
+    clock.now = 120
+    history.add(Identifier('#b'), Identifier('Carol'), 'hi')
+    assert history.lines(Identifier('#a'), Identifier('Alice')) == []
+    assert history.nicks(Identifier('#a')) == []
+    assert history.lines(Identifier('#b'), Identifier('Bob')) == [
+        'hello', 'still here']
+    assert len(history) == 2
+
+
+def test_history_disabled():
+    history = LineHistory(depth=0)
+    history.add(Identifier('#a'), Identifier('Alice'), 'hello')
+    assert history.lines(Identifier('#a'), Identifier('Alice')) == []
+    assert len(history) == 0
+
+
+def test_history_ignore():
+    history = LineHistory(depth=2, ignore=re.compile(r's/|\.'))
+    channel = Identifier('#Sopel')
+    for line in ['hello', 'world', 's/world/there/', '.mangle']:
+        history.add(channel, Identifier('Alice'), line)
+    # Ignored lines don't push out the others.
+    assert history.lines(channel, Identifier('Alice')) == ['hello', 'world']
+    assert history.recent(channel, 1) == [('Alice', 'world')]
+
+
+def test_history_expiry_is_amortized():
+    clock = MockClock()
+    history = LineHistory(depth=10, idle_time=100, clock=clock)
+    for number in range(10):
+        history.add(Identifier('#a'), Identifier('Nick%d' % number), 'hello')
+    clock.now = 100
+    # Each line added only expires a couple of the idle nicks.
+    history.add(Identifier('#b'), Identifier('Alice'), 'hello')
+    assert len(history) == 9
+    for _ in range(4):
+        history.add(Identifier('#b'), Identifier('Alice'), 'hello')
+    assert history.nicks(Identifier('#a')) == []
+    assert len(history) == 1
+
+    # Clearing a channel doesn't leave its nicks to expire from a new one.
+    history.add(Identifier('#c'), Identifier('Bob'), 'hello')
+    history.clear(Identifier('#c'))
+    clock.now = 150
+    history.add(Identifier('#c'), Identifier('Bob'), 'again')
+    clock.now = 200
+    history.add(Identifier('#b'), Identifier('Alice'), 'hello')
+    assert history.lines(Identifier('#c'), Identifier('Bob')) == ['again']
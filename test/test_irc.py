@@ -8,13 +8,14 @@ import asynchat
 import os
 import shutil
 import socket
+import sys
 import select
 import tempfile
 import threading
 import time
 import asyncore
 
-from sopel import irc
+from sopel import coretasks, irc
 from sopel.tools import stderr, Identifier
 import sopel.config as conf
 
@@ -145,3 +146,197 @@ def test_bot_connect(bot):
 
     # Do main run
     test_bot.run(HOST, s.address[1])
+
+
+@pytest.mark.skipif(sys.version_info < (3, 5),
+                    reason='The asyncio backend needs Python 3.5 or later')
+def test_bot_connect_asyncio(bot):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind((HOST, 0))
+    listener.listen(1)
+    received = []
+
+    def serve():
+        conn, _ = listener.accept()
+        data = b''
+        while b'USER' not in data:
+            chunk = conn.recv(512)
+            if not chunk:
+                break
+            data += chunk
+            if b'NICK' in chunk:
+                conn.sendall(b':fake.server 001 Foo :Hello\r\n'
+                             b'PING :fake.server\r\n')
+        # Wait for the PONG, then hang up.
+        while b'PONG' not in data:
+            chunk = conn.recv(512)
+            if not chunk:
+                break
+            data += chunk
+        received.extend(data.decode('utf-8').splitlines())
+        conn.close()
+        listener.close()
+
+    server_thread = threading.Thread(target=serve)
+    server_thread.start()
+
+    test_bot = bot(
+        '[core]\n'
+        'owner=Baz\n'
+        'nick=Foo\n'
+        'user=Bar\n'
+        'name=Sopel\n'
+        'host=127.0.0.1\n'
+        'timeout=10\n'
+        'log_raw=false\n'
+        'connection_backend=asyncio\n'
+    )
+    test_bot.run(HOST, listener.getsockname()[1])
+    server_thread.join(5)
+
+    assert 'NICK Foo' in received
+    assert 'USER Bar +iw Foo :Sopel' in received
+    assert 'PONG fake.server' in received
+    assert not test_bot.connected
+
+
+def test_connection_events_fast_path(bot):
+    test_bot = bot(
+        '[core]\n'
+        'owner=Baz\n'
+        'nick=Foo\n'
+    )
+    written = []
+    dispatched = []
+    handled = set()
+    test_bot.write = lambda args, text=None: written.append(args)
+    test_bot.dispatch = lambda pretrigger: dispatched.append(pretrigger.event)
+    test_bot._handles_event = lambda event: event in handled
+
+    def feed(line):
+        test_bot.collect_incoming_data(line.encode('utf-8'))
+        test_bot.found_terminator()
+
+    feed('PING :fake.server\r')
+    feed(':fake.server PING :other.server')
+    feed(':fake.server 001 Foo :Hello')
+    assert written == [('PONG', 'fake.server'), ('PONG', 'other.server')]
+    assert dispatched == ['001']
+    assert isinstance(test_bot.last_ping_time, float)
+
+    handled.add('PING')
+    feed('PING :fake.server')
+    assert dispatched == ['001', 'PING']
+    assert len(written) == 3
+
+    closed = []
+    parsed = []
+    parse_line = test_bot._parse_line
+    test_bot._parse_line = lambda line: parsed.append(line) or parse_line(line)
+    test_bot.handle_close = lambda: closed.append('433')
+    test_bot.hasquit = True
+    test_bot.close_when_done = lambda: closed.append('ERROR')
+    feed('ERROR :Closing Link: Foo (Quit: bye)')
+    feed(':fake.server 433 * Foo :Nickname is already in use.')
+    assert closed == ['ERROR', '433']
+    assert parsed == []
+    assert dispatched == ['001', 'PING']
+
+
+def test_line_decoding(bot):
+    test_bot = bot(
+        '[core]\n'
+        'owner=Baz\n'
+        'nick=Foo\n'
+        'log_raw=False\n'
+        'encodings=utf-8,unknown-encoding,cp1252\n'
+    )
+    assert test_bot.encodings == ['utf-8', 'cp1252']
+    lines = []
+    test_bot.dispatch = lambda pretrigger: lines.append(pretrigger.args[-1])
+
+    # A character split across reads
+    data = ':Bar!bar@example.com PRIVMSG #Sopel :h\u00e9llo\r'.encode('utf-8')
+    split = data.index(b'\xa9')
+    test_bot.collect_incoming_data(data[:split])
+    test_bot.collect_incoming_data(data[split:])
+    test_bot.found_terminator()
+    # Falling back to the next encoding, for that line only
+    test_bot.collect_incoming_data(
+        ':Bar!bar@example.com PRIVMSG #Sopel :h\u00e9llo'.encode('cp1252'))
+    test_bot.found_terminator()
+    # No encoding works
+    test_bot.collect_incoming_data(b':Bar PRIVMSG #Sopel :\x81')
+    test_bot.found_terminator()
+    test_bot.collect_incoming_data(b':Bar PRIVMSG #Sopel :ok')
+    test_bot.found_terminator()
+    assert lines == ['h\u00e9llo', 'h\u00e9llo', 'ok']
+
+
+def test_write_coalescing(bot):
+    test_bot = bot(
+        '[core]\n'
+        'owner=Baz\n'
+        'nick=Foo\n'
+        'log_raw=False\n'
+    )
+    sends = []
+
+    def send(data):
+        # Accept at most 10 bytes at a time, and nothing every other call.
+        sends.append(data)
+        if len(sends) % 2:
+            return 0
+        return min(len(data), 10)
+
+    # Something to wait on when send() returns 0
+    sock, other = socket.socketpair()
+    test_bot.send = send
+    test_bot.connected = True
+    test_bot.socket = sock
+
+    test_bot.write(('PING', 'fake.server'))
+    assert b''.join(data[:10] for data in sends[1::2]) == b'PING fake.server\r\n'
+
+    del sends[:]
+    with test_bot.batched_writes():
+        for number in range(3):
+            test_bot.write(('JOIN', '#chan{}'.format(number)))
+        assert sends == []
+    assert sends[0] == b'JOIN #chan0\r\nJOIN #chan1\r\nJOIN #chan2\r\n'
+    assert b''.join(data[:10] for data in sends[1::2]) == sends[0]
+    sock.close()
+    other.close()
+
+
+def test_writes_sent_before_sleeping(bot, monkeypatch):
+    test_bot = bot(
+        '[core]\n'
+        'owner=Baz\n'
+        'nick=Foo\n'
+        'log_raw=False\n'
+        'channels=#one,#two,#three\n'
+        'throttle_join=2\n'
+    )
+    sends = []
+    sent_by_sleep = []
+
+    def send(data):
+        sends.append(data)
+        return len(data)
+
+    test_bot.send = send
+    test_bot.recv = lambda size: b':fake.server 001 Foo :Hello\r\n'
+    test_bot.connected = True
+    test_bot.memory = {}
+    test_bot.join = lambda channel: test_bot.write(('JOIN', channel))
+    test_bot.dispatch = lambda pretrigger: coretasks.startup(test_bot,
+                                                             pretrigger)
+    monkeypatch.setattr(coretasks.time, 'sleep',
+                        lambda seconds: sent_by_sleep.append(b''.join(sends)))
+    # Unthreaded callables run while the read is handled; what they write
+    # isn't held back until they are done.
+    test_bot.handle_read()
+    assert len(sent_by_sleep) == 1
+    assert sent_by_sleep[0].endswith(b'JOIN #one\r\n')
+    assert b''.join(sends).endswith(b'JOIN #two\r\nJOIN #three\r\n')
@@ -0,0 +1,80 @@
+# coding=utf-8
+"""Tests for sopel.tools.jobs"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import time
+
+from sopel.test_tools import MockBot
+from sopel.tools.jobs import Job, JobScheduler
+
+
+def make_scheduler():
+    bot = MockBot()
+    scheduler = JobScheduler(bot)
+    scheduler.daemon = True
+    scheduler.start()
+    return bot, scheduler
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_one_shot_jobs():
+    bot, scheduler = make_scheduler()
+    calls = []
+
+    def record(bot, name):
+        calls.append(name)
+
+    scheduler.call_later(0.2, record, 'second')
+    cancelled = scheduler.call_later(0.1, record, 'cancelled')
+    scheduler.call_at(time.time() + 0.05, record, 'first')
+    assert len(scheduler) == 3
+    assert scheduler.cancel_job(cancelled)
+    assert not scheduler.cancel_job(cancelled)
+    assert len(scheduler) == 2
+
+    assert wait_for(lambda: len(calls) == 2)
+    time.sleep(0.1)
+    assert calls == ['first', 'second']
+    assert len(scheduler) == 0
+    assert bot.errors == []
+
+
+def test_repeating_job():
+    bot, scheduler = make_scheduler()
+    calls = []
+    job = scheduler.add_job(Job(0.05, lambda bot: calls.append(1)))
+    assert wait_for(lambda: len(calls) >= 3)
+    assert scheduler.cancel_job(job)
+    count = len(calls)
+    time.sleep(0.2)
+    # A call may have been under way while cancelling
+    assert len(calls) <= count + 1
+    assert len(scheduler) == 0
+
+
+def test_remove_jobs():
+    bot, scheduler = make_scheduler()
+
+    def func(bot):
+        pass
+
+    def other(bot):
+        pass
+
+    for _ in range(100):
+        scheduler.call_later(60, func)
+    scheduler.call_later(60, other)
+    scheduler.add_job(Job(60, other))
+    scheduler.remove_jobs(func)
+    assert len(scheduler) == 2
+    scheduler.remove_module_jobs(__name__)
+    assert len(scheduler) == 0
+    scheduler.call_later(60, func)
+    scheduler.clear_jobs()
+    assert len(scheduler) == 0
@@ -136,6 +136,7 @@ def test_rate():
     def mock(bot, trigger, match):
         return True
     assert mock.rate == 5
+    assert mock.rate_burst == 1
 
 
 def test_require_privmsg(bot, trigger, trigger_pm):
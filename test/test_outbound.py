@@ -0,0 +1,111 @@
+# coding=utf-8
+"""Tests for the outbound message queue and token buckets"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+
+from sopel.bot import Sopel
+from sopel.test_tools import MockBot, MockClock
+from sopel.tools.cache import LRUCache
+from sopel.tools.outbound import OutboundQueue
+from sopel.tools.throttle import TokenBucket
+
+
+def test_token_bucket():
+    clock = MockClock()
+    bucket = TokenBucket(2, 0.5, clock=clock)
+    assert bucket.consume()
+    assert bucket.consume()
+    assert not bucket.consume()
+    assert bucket.delay() == 2.0
+    clock.now = 1.0
+    assert bucket.delay() == 1.0
+    clock.now = 10.0
+    assert bucket.is_full()
+    # Costs over the capacity only need a full bucket.
+    assert bucket.consume(5)
+    assert bucket.tokens == 0
+
+
+def test_queue_throttles_per_target():
+    bot = MockBot(expected=5)
+    queue = OutboundQueue(bot, burst=2, rate=20, server_burst=100,
+                          server_rate=100)
+    queue.start()
+
+    start = time.time()
+    for i in range(4):
+        queue.put('#slow', ('PRIVMSG', '#slow'), 'slow %d' % i)
+    queue.put('#other', ('PRIVMSG', '#other'), 'other')
+    # put() never waits for the throttle
+    assert time.time() - start < 0.05
+
+    assert bot.done.wait(5)
+    slow = [w for w in bot.written if w[1][1] == '#slow']
+    assert [w[2] for w in slow] == ['slow 0', 'slow 1', 'slow 2', 'slow 3']
+    # The burst goes out right away, then one message every 1/20s
+    assert slow[3][0] - slow[1][0] >= 0.09
+    # The other target did not have to wait for the backlog on #slow
+    other = [w for w in bot.written if w[1][1] == '#other'][0]
+    assert other[0] < slow[3][0]
+
+    stats = queue.stats()
+    assert stats['sent'] == 5
+    assert stats['queued'] == 0
+    assert stats['latency_max'] >= 0.09
+
+
+def test_zero_rate_is_unthrottled():
+    bot = MockBot(expected=10)
+    queue = OutboundQueue(bot, burst=1, rate=0, server_burst=1,
+                          server_rate=0)
+    queue.start()
+    for i in range(10):
+        queue.put('#sopel', ('PRIVMSG', '#sopel'), 'message %d' % i)
+    assert bot.done.wait(5)
+    assert queue.is_alive()
+    assert len(bot.written) == 10
+
+
+def test_drain():
+    bot = MockBot(expected=3)
+    queue = OutboundQueue(bot, burst=1, rate=20, server_burst=100,
+                          server_rate=100)
+    assert queue.drain(0)
+    for i in range(3):
+        queue.put('#sopel', ('PRIVMSG', '#sopel'), 'message %d' % i)
+    # Nothing is sent until the queue is started.
+    assert not queue.drain(0.05)
+    queue.start()
+    assert queue.drain(5)
+    assert [w[2] for w in bot.written] == [
+        'message 0', 'message 1', 'message 2']
+
+
+def test_ready_messages_are_batched():
+    bot = MockBot(expected=6)
+    queue = OutboundQueue(bot, burst=3, rate=1, server_burst=100,
+                          server_rate=100)
+    for target in ('#one', '#two'):
+        for i in range(3):
+            queue.put(target, ('PRIVMSG', target), 'message %d' % i)
+    queue.start()
+    assert bot.done.wait(5)
+    assert bot.batches == [6]
+
+
+def test_notices_keep_their_place():
+    fake = MockBot(expected=3)
+    bot = Sopel.__new__(Sopel)
+    bot.sending = threading.RLock()
+    bot.stack = LRUCache(10)
+    bot.outbound = OutboundQueue(fake, burst=1, rate=20, server_burst=100,
+                                 server_rate=100)
+    bot.say('first', '#sopel')
+    bot.notice('second', '#Sopel')
+    bot.say('third', '#sopel')
+    bot.outbound.start()
+    assert fake.done.wait(5)
+    assert [(w[1][0], w[2]) for w in fake.written] == [
+        ('PRIVMSG', 'first'), ('NOTICE', 'second'), ('PRIVMSG', 'third')]
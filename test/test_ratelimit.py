@@ -0,0 +1,133 @@
+# coding=utf-8
+"""Tests for sopel.tools.ratelimit"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import time
+
+from sopel import module
+from sopel.bot import Sopel
+from sopel.test_tools import MockClock
+from sopel.tools import Identifier
+from sopel.tools.cache import LRUCache
+from sopel.tools.ratelimit import RateLimiter
+
+
+ALICE = Identifier('Alice')
+BOB = Identifier('Bob')
+BOT = Identifier('Sopel')
+CHANNEL = Identifier('#sopel')
+
+
+def test_user_limit():
+    clock = MockClock()
+    limiter = RateLimiter(clock=clock)
+
+    @module.rate(10)
+    def func(bot, trigger):
+        pass
+
+    assert not limiter.acquire(func, ALICE, CHANNEL, BOT).limited
+    assert limiter.acquire(func, ALICE, CHANNEL, BOT).limited == 'user'
+    assert not limiter.acquire(func, BOB, CHANNEL, BOT).limited
+    clock.now = 10
+    assert not limiter.acquire(func, ALICE, CHANNEL, BOT).limited
+    assert limiter.stats()['rejected'] == {'user': 1}
+    assert limiter.stats()['rejected_callables'] == {
+        '%s.func' % __name__: 1}
+
+
+def test_scopes_and_burst():
+    clock = MockClock()
+    limiter = RateLimiter(clock=clock)
+
+    @module.rate(channel=10, server=60, burst=2)
+    def func(bot, trigger):
+        pass
+
+    assert not limiter.acquire(func, ALICE, CHANNEL, BOT).limited
+    assert not limiter.acquire(func, BOB, CHANNEL, BOT).limited
+    assert limiter.acquire(func, ALICE, CHANNEL, BOT).limited == 'channel'
+    # Private messages have no channel limit, but count towards the global one
+    assert limiter.acquire(func, ALICE, None, BOT).limited == 'global'
+    clock.now = 30
+    assert limiter.acquire(func, ALICE, Identifier('#other'), BOT).limited == (
+        'global')
+    clock.now = 60
+    assert not limiter.acquire(func, ALICE, Identifier('#other'), BOT).limited
+    assert limiter.acquire(func, ALICE, None, BOT).limited == 'global'
+
+
+def test_release_and_exempt():
+    clock = MockClock()
+    limiter = RateLimiter(clock=clock)
+
+    @module.rate(10)
+    def func(bot, trigger):
+        pass
+
+    reservation = limiter.acquire(func, ALICE, CHANNEL, BOT)
+    limiter.release(reservation)
+    assert not limiter.acquire(func, ALICE, CHANNEL, BOT).limited
+    # Admins get through, and still count
+    assert not limiter.acquire(func, ALICE, CHANNEL, BOT, exempt=True).limited
+    clock.now = 10
+    assert not limiter.acquire(func, ALICE, CHANNEL, BOT, exempt=True).limited
+    assert limiter.acquire(func, ALICE, CHANNEL, BOT).limited == 'user'
+
+
+def test_unlimited():
+    limiter = RateLimiter()
+
+    def func(bot, trigger):
+        pass
+
+    for _ in range(5):
+        assert not limiter.acquire(func, ALICE, CHANNEL, BOT).limited
+    assert limiter.stats()['buckets'] == 0
+
+
+def test_rejection_details():
+    clock = MockClock()
+    limiter = RateLimiter(clock=clock)
+
+    @module.rate(10)
+    def func(bot, trigger):
+        pass
+
+    limiter.acquire(func, ALICE, CHANNEL, BOT)
+    clock.now = 3
+    reservation = limiter.acquire(func, ALICE, CHANNEL, BOT)
+    assert reservation.limited == 'user'
+    assert reservation.period == 10
+    assert abs(reservation.wait - 7) < 1e-6
+
+
+class FakeTrigger(object):
+    nick = ALICE
+    sender = CHANNEL
+    is_privmsg = False
+    admin = False
+
+
+def test_deprecated_times():
+    bot = Sopel.__new__(Sopel)
+    bot.nick = BOT
+    bot._times = LRUCache(10)
+    bot.rate_limiter = RateLimiter()
+    results = [module.NOLIMIT, None]
+
+    @module.rate(10)
+    def func(bot, trigger):
+        return results.pop(0)
+
+    def unlimited(bot, trigger):
+        pass
+
+    func.unblockable = unlimited.unblockable = False
+    bot.call(func, bot, FakeTrigger())
+    bot.call(unlimited, bot, FakeTrigger())
+    assert ALICE not in bot.times
+    bot.call(func, bot, FakeTrigger())
+    assert set(bot.times) == set([ALICE, BOT, CHANNEL])
+    assert list(bot.times[CHANNEL]) == [func]
+    assert bot.times[ALICE][func] <= time.time()
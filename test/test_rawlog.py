@@ -0,0 +1,61 @@
+# coding=utf-8
+"""Tests for sopel.tools.rawlog"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import gzip
+import io
+import os
+import time
+
+from sopel.tools.rawlog import RawLog
+
+
+def read(filename):
+    with io.open(filename, encoding='utf-8') as f:
+        return f.read().splitlines()
+
+
+def test_raw_log(tmpdir):
+    directory = os.path.join(str(tmpdir), 'logs')
+    log = RawLog(directory)
+    log.start()
+    log.log('>>', 'NICK Sopel\r\n')
+    log.log('<<', ':fake.server 001 Sopel :Hellö')
+    log.stop()
+    assert not log.is_alive()
+
+    lines = read(os.path.join(directory, 'raw.log'))
+    assert len(lines) == 2
+    assert lines[0].startswith('>>')
+    assert '\tNICK Sopel' in lines[0]
+    assert lines[1].endswith('\t:fake.server 001 Sopel :Hellö')
+
+
+def newest_backup(filename, compress):
+    try:
+        if compress:
+            with gzip.open(filename + '.1.gz') as f:
+                return f.read().decode('utf-8').strip()
+        return read(filename + '.1')[0]
+    except (EOFError, IOError, OSError, IndexError):
+        return None
+
+
+def test_raw_log_rotation(tmpdir):
+    directory = str(tmpdir)
+    filename = os.path.join(directory, 'raw.log')
+    for compress in (False, True):
+        log = RawLog(directory, max_bytes=1, backups=2, compress=compress)
+        log.start()
+        for number in range(3):
+            line = 'line {}'.format(number)
+            log.log('<<', line)
+            # Each line fills the log, so it gets rotated right away.
+            while not (newest_backup(filename, compress) or '').endswith(line):
+                time.sleep(0.01)
+        log.stop()
+
+        suffix = '.gz' if compress else ''
+        # Only two backups are kept
+        assert os.path.exists(filename + '.2' + suffix)
+        assert not os.path.exists(filename + '.3' + suffix)
@@ -0,0 +1,139 @@
+# coding=utf-8
+"""Tests for sopel.tools.target"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import pytest
+
+from sopel.tools import Identifier
+from sopel.tools.target import Channel, PrivilegeMap, User
+
+
+def test_slots():
+    user = User(Identifier('Foo'), 'foo', 'example.com')
+    channel = Channel(Identifier('#Sopel'))
+    for obj in (user, channel, Identifier('Foo')):
+        assert not hasattr(obj, '__dict__')
+        with pytest.raises(AttributeError):
+            obj.something_else = True
+
+
+def test_intern():
+    first = Identifier.intern('Foo')
+    assert Identifier.intern(Identifier('Foo')) is first
+    assert Identifier.intern('Foo') is first
+    other = Identifier.intern('FOO')
+    assert other is not first
+    assert other == first
+    assert other == 'FOO'
+    assert Identifier.intern('FOO') is other
+
+
+def test_users_share_nicks():
+    nick = Identifier('Foo')
+    user = User(nick, 'foo', 'example.com')
+    assert user.nick is nick
+    assert User(Identifier('Foo'), 'foo', 'example.com').nick is nick
+
+
+def test_privileges_kept():
+    channel = Channel(Identifier('#Sopel'))
+    channel.privileges[Identifier('Foo')] = 4
+    assert Identifier('Foo') in channel.privileges
+    assert Identifier('Foo') not in channel.users
+    assert len(channel.users) == 0
+
+    user = User(Identifier('Foo'), 'foo', 'example.com')
+    channel.add_user(user)
+    assert channel.privileges[Identifier('foo')] == 4
+    assert channel.users[Identifier('foo')] is user
+    assert user.channels[Identifier('#sopel')] is channel
+
+    channel.add_user(user, privileges=0)
+    assert channel.privileges[Identifier('Foo')] == 0
+    assert list(channel.users) == [Identifier('Foo')]
+
+
+def test_rename_and_clear():
+    channel = Channel(Identifier('#Sopel'))
+    user = User(Identifier('Foo'), 'foo', 'example.com')
+    channel.add_user(user, privileges=2)
+
+    channel.rename_user(Identifier('Foo'), Identifier('Bar'))
+    assert Identifier('Foo') not in channel.privileges
+    assert channel.privileges[Identifier('Bar')] == 2
+    assert channel.users[Identifier('Bar')] is user
+
+    channel.clear_user(Identifier('Bar'))
+    assert len(channel.privileges) == 0
+    assert user.channels == {}
+    channel.clear_user(Identifier('Bar'))
+
+
+def test_privilege_map():
+    channels = {}
+    privileges = PrivilegeMap(channels)
+    assert Identifier('#Sopel') not in privileges
+    with pytest.raises(KeyError):
+        privileges[Identifier('#Sopel')]
+
+    channel = channels[Identifier('#Sopel')] = Channel(Identifier('#Sopel'))
+    channel.add_user(User(Identifier('Foo'), 'foo', 'example.com'), 4)
+    assert list(privileges) == [Identifier('#Sopel')]
+    assert privileges[Identifier('#sopel')][Identifier('foo')] == 4
+
+    privileges[Identifier('#Sopel')][Identifier('Foo')] = 1
+    assert channel.privileges[Identifier('Foo')] == 1
+
+
+def test_privilege_map_writes():
+    channels = {}
+    privileges = PrivilegeMap(channels)
+    privileges['#Sopel'] = {'Foo': 4, 'Bar': 1}
+    channel = channels[Identifier('#sopel')]
+    assert channel.privileges[Identifier('foo')] == 4
+    assert privileges[Identifier('#SOPEL')][Identifier('Bar')] == 1
+
+    user = User(Identifier('Baz'), 'baz', 'example.com')
+    channel.add_user(user, privileges=2)
+    # Replacing the privileges keeps the channel's users.
+    privileges[Identifier('#Sopel')] = {Identifier('Foo'): 8}
+    assert dict(channel.privileges) == {
+        Identifier('Foo'): 8, Identifier('Baz'): 0}
+    assert channel.users[Identifier('Baz')] is user
+
+    assert privileges.pop(Identifier('#Sopel')) is not None
+    assert channels == {}
+    assert user.channels == {}
+    assert privileges.pop(Identifier('#Sopel'), None) is None
+
+
+def test_privilege_map_deletes():
+    channels = {}
+    users = {}
+    privileges = PrivilegeMap(channels, users)
+    one = channels[Identifier('#one')] = Channel(Identifier('#one'))
+    two = channels[Identifier('#two')] = Channel(Identifier('#two'))
+    foo = users[Identifier('Foo')] = User(Identifier('Foo'), 'foo', 'a')
+    bar = users[Identifier('Bar')] = User(Identifier('Bar'), 'bar', 'b')
+    one.add_user(foo, 4)
+    two.add_user(foo, 1)
+    one.add_user(bar, 0)
+    one.privileges[Identifier('Baz')] = 2
+
+    # Deleting a nick's privileges removes them from the channel.
+    del privileges[Identifier('#one')][Identifier('foo')]
+    assert Identifier('Foo') not in one.users
+    assert list(foo.channels) == [Identifier('#two')]
+    assert users[Identifier('Foo')] is foo
+    del privileges[Identifier('#one')][Identifier('Baz')]
+    assert Identifier('Baz') not in one.privileges
+    with pytest.raises(KeyError):
+        del privileges[Identifier('#one')][Identifier('Baz')]
+
+    # Users no longer in any channel are forgotten.
+    del privileges[Identifier('#two')][Identifier('Foo')]
+    assert foo.channels == {}
+    assert Identifier('Foo') not in users
+    del privileges[Identifier('#one')]
+    assert bar.channels == {}
+    assert users == {}
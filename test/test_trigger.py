@@ -243,3 +243,43 @@ def test_ircv3_server_time_trigger(nick):
     line = '@time=2016-01-09T04:20 :Foo!foo@example.com PRIVMSG #Sopel :Hello, world'
     pretrigger = PreTrigger(nick, line)
     assert pretrigger.time is not None
+
+
+def test_privilege_matcher_config_change(nick):
+    line = ':Foo!foo@example.com PRIVMSG #Sopel :Hello, world'
+    pretrigger = PreTrigger(nick, line)
+    fakematch = re.match('.*', line)
+
+    config = MockConfig()
+    config.core.owner = 'Bar'
+    config.core.admins = ['Baz', '*!*@other.example.com']
+    trigger = Trigger(config, pretrigger, fakematch)
+    assert trigger.owner is False
+    assert trigger.admin is False
+
+    config.core.admins = ['Baz', 'foo@*.COM']
+    trigger = Trigger(config, pretrigger, fakematch)
+    assert trigger.owner is False
+    assert trigger.admin is True
+
+    config.core.owner = 'foo@example.com'
+    trigger = Trigger(config, pretrigger, fakematch)
+    assert trigger.owner is True
+    assert trigger.admin is True
+
+
+def test_pretrigger_lazy_fields(nick):
+    line = ':Foo!foo@example.com PRIVMSG #Sopel :\x01ACTION waves\x01'
+    pretrigger = PreTrigger(nick, line)
+    # CTCP is stripped from the arguments right away
+    assert pretrigger.args == ['#Sopel', 'waves']
+    tags = pretrigger.tags
+    assert tags == {'intent': 'ACTION'}
+    tags['account'] = 'foo'
+    assert pretrigger.tags['account'] == 'foo'
+    pretrigger.nick = Identifier('Bar')
+    assert pretrigger.nick == 'Bar'
+    assert pretrigger.host == 'example.com'
+    assert isinstance(pretrigger.time, datetime.datetime)
+    with pytest.raises(AttributeError):
+        pretrigger.unknown = True
@@ -0,0 +1,260 @@
+# coding=utf-8
+"""Tests for the title fetching in sopel.modules.url"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('requests')
+
+from sopel.db import SopelDB
+from sopel.modules import url
+from sopel.test_tools import MockBot, MockClock
+from sopel.tools.cache import LRUCache
+from sopel.tools.workers import WorkerPool
+
+
+@pytest.fixture
+def bot(request, monkeypatch):
+    monkeypatch.setattr(url, 'title_cache', LRUCache(100))
+    pool = WorkerPool(workers=2, queue_size=10, overflow='inline',
+                      name='test-url')
+    pool.start()
+    request.addfinalizer(pool.stop)
+    monkeypatch.setattr(url, 'executor', pool)
+    bot = MockBot()
+    bot.config.define_section('url', url.UrlSection)
+    return bot
+
+
+def test_scanner_stops_after_title():
+    scanner = url.TitleScanner(max_bytes=1000)
+    assert not scanner.feed(b'<html><head><title>Hello')
+    assert scanner.feed(b'</title></head>')
+    assert scanner.done
+    assert bytes(scanner.content) == (
+        b'<html><head><title>Hello</title></head>')
+
+
+def test_scanner_finds_tag_split_across_chunks():
+    scanner = url.TitleScanner(max_bytes=1000)
+    assert not scanner.feed(b'<title>Split</ti')
+    assert scanner.feed(b'TLE><body>')
+
+
+def test_scanner_stops_at_max_bytes():
+    scanner = url.TitleScanner(max_bytes=10)
+    assert not scanner.feed(b'12345')
+    assert scanner.feed(b'67890abcdef')
+    assert bytes(scanner.content) == b'1234567890'
+
+
+def test_parse_title():
+    assert url.parse_title(
+        '<html><head><TITLE lang="en">  Some \n page  </TITLE>') == 'Some page'
+    assert url.parse_title('<title>Fish &amp; chips</title>') == 'Fish & chips'
+    assert url.parse_title('<title></title>') is None
+    assert url.parse_title('<html><head>') is None
+
+
+class FakeResponse(object):
+    def __init__(self, content_type, chunks):
+        self.headers = {'Content-Type': content_type}
+        self.chunks = chunks
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size=1):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession(object):
+    def __init__(self, response):
+        self.response = response
+
+    def get(self, *args, **kwargs):
+        return self.response
+
+
+@pytest.fixture
+def fake_session(monkeypatch):
+    def use(response):
+        monkeypatch.setattr(url, 'session', FakeSession(response))
+        return response
+    return use
+
+
+def test_find_title_reads_head_only(fake_session):
+    response = fake_session(FakeResponse(
+        'text/html; charset=utf-8',
+        [b'<head><title>Page</title>', b'<body>', b'more']))
+    assert url.find_title('http://example.com/') == 'Page'
+    assert response.read == 1
+    assert response.closed
+
+
+def test_find_title_skips_other_types(fake_session):
+    response = fake_session(FakeResponse(
+        'image/png', [b'<title>Not a page</title>']))
+    assert url.find_title('http://example.com/image.png') is None
+    assert response.read == 0
+    assert response.closed
+
+
+def test_fetch_titles_on_executor(bot, monkeypatch):
+    threads = []
+
+    def find_title(page, **kwargs):
+        threads.append(threading.current_thread().name)
+        return 'Title of ' + page
+
+    monkeypatch.setattr(url, 'find_title', find_title)
+    pages = ['http://a.example/', 'http://b.example/', 'http://a.example/']
+    assert url.fetch_titles(bot, pages) == [
+        'Title of http://a.example/', 'Title of http://b.example/',
+        'Title of http://a.example/']
+    # Each page is only fetched once, and not on the calling thread.
+    assert len(threads) == 2
+    assert all(name.startswith('test-url') for name in threads)
+
+
+def test_title_cache_expiry(bot, monkeypatch):
+    clock = MockClock()
+    monkeypatch.setattr(url, 'title_cache', LRUCache(100, clock=clock))
+    bot.config.url.title_ttl = 60
+    bot.config.url.negative_ttl = 10
+    url.cache_title(bot, 'http://a.example/', 'A')
+    url.cache_title(bot, 'http://b.example/', None)
+    assert url.get_cached_title(bot, 'http://a.example/') == 'A'
+    # Pages without a title are cached as ''.
+    assert url.get_cached_title(bot, 'http://b.example/') == ''
+
+    clock.now = 11
+    assert url.get_cached_title(bot, 'http://a.example/') == 'A'
+    assert url.get_cached_title(bot, 'http://b.example/') is None
+    clock.now = 61
+    assert url.get_cached_title(bot, 'http://a.example/') is None
+
+
+def test_negative_caching(bot, monkeypatch):
+    fetches = []
+
+    def find_title(page, **kwargs):
+        fetches.append(page)
+        if page == 'http://broken.example/':
+            raise ValueError('unexpected')
+        return None
+
+    monkeypatch.setattr(url, 'find_title', find_title)
+    pages = ['http://none.example/', 'http://broken.example/']
+    assert url.fetch_titles(bot, pages) == [None, None]
+    assert url.fetch_titles(bot, pages) == [None, None]
+    # Pages without a title aren't fetched again, but unexpected errors
+    # aren't cached.
+    assert sorted(fetches) == ['http://broken.example/',
+                               'http://broken.example/',
+                               'http://none.example/']
+
+
+def test_persisted_titles(bot, request, monkeypatch, tmpdir):
+    bot.config.core.db_filename = str(tmpdir.join('test.db'))
+    bot.config.url.persist_titles = True
+    bot.db = SopelDB(bot.config)
+    request.addfinalizer(bot.db.close)
+    url.setup(bot)
+    request.addfinalizer(lambda: url.shutdown(bot))
+
+    url.cache_title(bot, 'http://a.example/', 'A')
+    url.cache_title(bot, 'http://b.example/', None)
+    bot.db.execute(
+        'INSERT INTO url_titles (uri, title, expires) VALUES (?, ?, ?)',
+        ['http://old.example/', 'Old', time.time() - 1])
+
+    # As after a restart, with nothing cached in memory.
+    monkeypatch.setattr(url, 'title_cache', LRUCache(100))
+    assert url.get_cached_title(bot, 'http://a.example/') == 'A'
+    assert url.get_cached_title(bot, 'http://b.example/') == ''
+    assert url.get_cached_title(bot, 'http://old.example/') is None
+    assert url.get_cached_title(bot, 'http://new.example/') is None
+
+    # Expired titles are cleaned up when the module is set up.
+    url.setup(bot)
+    rows = bot.db.execute('SELECT uri FROM url_titles ORDER BY uri')
+    assert rows.fetchall() == [('http://a.example/',), ('http://b.example/',)]
+
+
+def test_callbacks_with_saturated_workers(bot):
+    # Every worker of the bot is busy and its queue is full, as when
+    # title_auto itself is running on one of them.
+    release = threading.Event()
+    bot.workers = WorkerPool(workers=1, queue_size=1, overflow='block',
+                             name='test-saturated')
+    bot.workers.start()
+    bot.workers.submit(release.wait, 5)
+    while bot.workers.stats()['queue_depth']:
+        pass
+    bot.workers.submit(release.wait, 5)
+
+    handled = []
+    done = threading.Event()
+
+    def callback(bot, trigger, match):
+        handled.append((threading.current_thread().name, match))
+        if len(handled) == 2:
+            done.set()
+
+    def handle():
+        url.run_callbacks(bot, None, [(callback, 1), (callback, 2)])
+        finished.set()
+
+    finished = threading.Event()
+    thread = threading.Thread(target=handle)
+    thread.daemon = True
+    thread.start()
+    try:
+        assert finished.wait(5)
+        assert done.is_set()
+        assert sorted(match for _, match in handled) == [1, 2]
+        assert all(name.startswith('test-url') for name, _ in handled)
+    finally:
+        release.set()
+        bot.workers.stop()
+
+
+def test_callbacks_on_url_threads_run_inline(bot):
+    handled = []
+    finished = threading.Event()
+
+    def callback(bot, trigger, match):
+        handled.append(threading.current_thread())
+
+    def handle():
+        url.run_callbacks(bot, None, [(callback, None)])
+        handled.append(threading.current_thread())
+        finished.set()
+
+    url.executor.submit(handle)
+    assert finished.wait(5)
+    assert handled[0] is handled[1]
+
+
+def test_slow_callbacks_time_out(bot):
+    bot.config.url.callback_timeout = 0.05
+    release = threading.Event()
+
+    def callback(bot, trigger, match):
+        release.wait(5)
+
+    start = time.time()
+    try:
+        url.run_callbacks(bot, None, [(callback, None)])
+        assert time.time() - start < 1
+    finally:
+        release.set()
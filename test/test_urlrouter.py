@@ -0,0 +1,56 @@
+# coding=utf-8
+"""Tests for sopel.tools.urlrouter"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import re
+
+from sopel.tools.urlrouter import URLRouter, pattern_hosts
+
+
+def hosts(pattern):
+    return pattern_hosts(re.compile(pattern))
+
+
+def test_pattern_hosts():
+    assert hosts(r'([a-z]+).(wikipedia.org/wiki/)([^ ]+)') == {'wikipedia.org'}
+    assert hosts(r'https?://(?:www\.|np\.)?reddit\.com/r/(.*?)') == {
+        'reddit.com'}
+    # The parser factors "youtu" out of both branches
+    assert hosts(r'(youtube.com/watch\S*v=|youtu.be/)([\w-]+)') == {
+        'youtube.com', 'youtu.be'}
+    assert hosts(r'https?://example\.com:8080/') == {'example.com'}
+    # Anything the router can't be sure of matches everywhere
+    assert hosts(r'example') is None
+    assert hosts(r'(?:example\.com/)?page') is None
+    assert hosts(r'https?://[^/]+/redirect\.php/') is None
+    assert hosts(r'[a-z]+wiki\.org/') is None
+    assert hosts(r'https?://(?:a\.com/|[^/]+/)x') is None
+
+
+def test_router():
+    def youtube(bot, trigger, match):
+        pass
+
+    def anywhere(bot, trigger, match):
+        pass
+
+    callbacks = {
+        re.compile(r'(youtube.com/watch\S*v=|youtu.be/)([\w-]+)'): youtube,
+        re.compile(r'\.pdf$'): anywhere,
+    }
+    router = URLRouter(callbacks)
+    assert router.is_current(callbacks)
+
+    assert len(router.candidates('https://example.com/')) == 1
+    assert len(router.candidates('https://m.YouTube.com/watch?v=x')) == 2
+    assert len(router.candidates('https://youtu.be:443/x')) == 2
+    assert len(router.candidates('https://notyoutube.com/watch?v=x')) == 1
+
+    matches = router.match('https://youtu.be/abc')
+    assert [(function, match.group(2)) for function, match in matches] == [
+        (youtube, 'abc')]
+    matches = router.match('https://youtube.com/paper.pdf')
+    assert [function for function, match in matches] == [anywhere]
+
+    callbacks[re.compile('foo')] = anywhere
+    assert not router.is_current(callbacks)
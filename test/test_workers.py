@@ -0,0 +1,89 @@
+# coding=utf-8
+"""Tests for the worker pool"""
+from __future__ import unicode_literals, absolute_import, print_function, division
+
+import threading
+
+import pytest
+
+from sopel.tools.workers import WorkerPool
+
+
+def test_calls_run_in_workers():
+    pool = WorkerPool(workers=2, queue_size=10)
+    pool.start()
+    done = threading.Event()
+    threads = []
+
+    def task(value):
+        threads.append((value, threading.current_thread().name))
+        done.set()
+
+    assert pool.submit(task, 1)
+    assert done.wait(5)
+    assert threads[0][0] == 1
+    assert threads[0][1].startswith('sopel-worker')
+    stats = pool.stats()
+    assert stats['workers'] == 2
+    assert stats['submitted'] == 1
+
+
+def test_overflow_policies():
+    release = threading.Event()
+
+    def blocker():
+        release.wait(5)
+
+    calls = []
+
+    def task():
+        calls.append(threading.current_thread())
+
+    dropping = WorkerPool(workers=1, queue_size=1, overflow='drop')
+    dropping.start()
+    inline = WorkerPool(workers=1, queue_size=1, overflow='inline')
+    inline.start()
+    try:
+        for pool in (dropping, inline):
+            # One call occupies the worker, the next one fills the queue.
+            pool.submit(blocker)
+            while pool.stats()['queue_depth']:
+                pass
+            pool.submit(blocker)
+
+        assert not dropping.submit(task)
+        assert dropping.stats()['dropped'] == 1
+
+        assert inline.submit(task)
+        assert calls == [threading.current_thread()]
+        assert inline.stats()['inline'] == 1
+    finally:
+        release.set()
+
+
+def test_invalid_overflow_policy():
+    with pytest.raises(ValueError):
+        WorkerPool(overflow='explode')
+
+
+def test_in_worker_and_stop():
+    pool = WorkerPool(workers=2, queue_size=10, name='test-stop')
+    pool.start()
+    threads = [thread for thread in threading.enumerate()
+               if thread.name.startswith('test-stop')]
+    seen = []
+    done = threading.Event()
+
+    def task():
+        seen.append(pool.in_worker())
+        done.set()
+
+    assert not pool.in_worker()
+    pool.submit(task)
+    assert done.wait(5)
+    assert seen == [True]
+
+    pool.stop()
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()